@@ -0,0 +1,275 @@
+"""
+Synthetic dataset generator for database benchmarks.
+
+Bulk-inserts users, wishlists, items and a power-law subscription graph with
+Core executemany inserts in batches, then recomputes the denormalized Wishlist
+counters. The defaults are the target scale of 1M users, 3M wishlists and 30M
+items; --scale shrinks all of them at once. The same --seed always produces
+the same data.
+
+Usage: python -m benchmarks.dataset --db dataset.sqlite3 [--scale 0.01] [--seed 1]
+"""
+import argparse
+import asyncio
+import math
+import os
+import random
+import sys
+import time
+import uuid
+from array import array
+from dataclasses import dataclass, fields, replace
+from datetime import datetime, timedelta, UTC
+from typing import Iterator
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from config.config import DbConfig
+from database import models
+from database.models import User, Wishlist, Item, WishlistSubscription, SubscriptionStatus, PriorityLevel
+from database.requests import repair_wishlist_counters
+
+# Telegram id of generated user N is TELEGRAM_ID_BASE + N, so benchmarks can sample them
+TELEGRAM_ID_BASE = 100_000_000
+
+PRIORITIES = (PriorityLevel.LOW, PriorityLevel.MEDIUM, PriorityLevel.HIGH)
+
+# Words of generated item names and wishlist titles, so full-text search has realistic
+# term frequencies: every word is in 1/len of the names
+GIFT_WORDS = (
+    'book', 'headphones', 'lego', 'kindle', 'scarf', 'watch', 'bike', 'camera', 'perfume', 'mug',
+    'backpack', 'sneakers', 'blanket', 'candle', 'puzzle', 'speaker', 'umbrella', 'wallet', 'tea', 'plant',
+    'книга', 'наушники', 'плед', 'кружка', 'свеча', 'рюкзак', 'часы', 'шарф', 'велосипед', 'пазл',
+)
+OCCASIONS = ('Birthday', 'New Year', 'Wedding', 'Housewarming', 'День рождения', 'Новый год')
+
+
+@dataclass
+class DatasetSpec:
+    users: int = 1_000_000
+    wishlists: int = 3_000_000  # on average; wishlists per user are exponentially distributed
+    items: int = 30_000_000  # on average; items per wishlist are exponentially distributed
+    subscriptions_per_user: float = 5.0  # mean, exponentially distributed
+    # Zipf exponent of wishlist popularity: a few wishlists get most subscribers
+    popularity_exponent: float = 1.1
+    private_ratio: float = 0.3
+    deleted_ratio: float = 0.02
+    reserved_ratio: float = 0.2
+    pending_ratio: float = 0.3  # of subscriptions to private wishlists
+    active_ratio: float = 0.3  # users seen within the last 30 days
+    ru_ratio: float = 0.4
+    history_days: int = 730
+    batch_size: int = 10_000
+    seed: int = 1
+
+    def scaled(self, scale: float) -> 'DatasetSpec':
+        return replace(
+            self,
+            users=max(1, round(self.users * scale)),
+            wishlists=max(1, round(self.wishlists * scale)),
+            items=max(0, round(self.items * scale))
+        )
+
+
+class ZipfSampler:
+    """
+    Draws ids 1..n with P(rank k) ~ 1 / k^exponent by inverting the continuous
+    CDF, so sampling is O(1) without a weights table. Ranks are spread over the
+    id space by a multiplicative permutation, so popular ids are not all old ones.
+    """
+
+    def __init__(self, n: int, exponent: float, rng: random.Random):
+        self.n = n
+        self.exponent = exponent
+        self.rng = rng
+        self._multiplier = 2_654_435_761 % n or 1
+        while math.gcd(self._multiplier, n) != 1:
+            self._multiplier += 1
+
+    def sample(self) -> int:
+        u = self.rng.random()
+        if self.exponent == 1.0:
+            rank = self.n ** u
+        else:
+            power = 1.0 - self.exponent
+            rank = ((self.n ** power - 1.0) * u + 1.0) ** (1.0 / power)
+        rank = min(self.n, max(1, int(rank)))
+        return (rank - 1) * self._multiplier % self.n + 1
+
+
+class DatasetGenerator:
+    """Generates rows table by table; ids are assigned here, starting at 1"""
+
+    def __init__(self, spec: DatasetSpec):
+        self.spec = spec
+        self.rng = random.Random(spec.seed)
+        self.now = datetime.now(UTC).replace(tzinfo=None)
+        self.start = self.now - timedelta(days=spec.history_days)
+        # Per wishlist, filled while generating wishlists: owner id and privacy
+        self.owners = array('i')
+        self.private = bytearray()
+
+    def _timestamp(self) -> datetime:
+        return self.start + timedelta(seconds=self.rng.random() * self.spec.history_days * 86400)
+
+    def _count(self, mean: float) -> int:
+        return round(self.rng.expovariate(1.0 / mean)) if mean > 0 else 0
+
+    def users(self) -> Iterator[dict]:
+        spec, rng = self.spec, self.rng
+        for user_id in range(1, spec.users + 1):
+            active = rng.random() < spec.active_ratio
+            yield {
+                'id': user_id,
+                'telegram_id': TELEGRAM_ID_BASE + user_id,
+                'username': f'user{user_id}' if rng.random() < 0.8 else None,
+                'language': 'ru' if rng.random() < spec.ru_ratio else 'en',
+                'last_active_at': self.now - timedelta(seconds=rng.random() * 30 * 86400) if active
+                else self._timestamp(),
+                'created_at': self._timestamp(),
+            }
+
+    def wishlists(self) -> Iterator[dict]:
+        spec, rng = self.spec, self.rng
+        mean = spec.wishlists / spec.users
+        wishlist_id = 0
+        for owner_id in range(1, spec.users + 1):
+            for _ in range(self._count(mean)):
+                wishlist_id += 1
+                is_private = rng.random() < spec.private_ratio
+                self.owners.append(owner_id)
+                self.private.append(is_private)
+                yield {
+                    'id': wishlist_id,
+                    'title': f'{rng.choice(OCCASIONS)} {wishlist_id}',
+                    'is_private': is_private,
+                    'description': 'Generated wishlist' if rng.random() < 0.5 else None,
+                    'event_date': self._timestamp() + timedelta(days=365) if rng.random() < 0.5 else None,
+                    'access_uuid': uuid.UUID(int=rng.getrandbits(128), version=4),
+                    'is_deleted': rng.random() < spec.deleted_ratio,
+                    'owner_id': owner_id,
+                    'created_at': self._timestamp(),
+                }
+
+    def items(self) -> Iterator[dict]:
+        spec, rng = self.spec, self.rng
+        mean = spec.items / max(1, len(self.owners))
+        item_id = 0
+        for wishlist_id in range(1, len(self.owners) + 1):
+            for position in range(1, self._count(mean) + 1):
+                item_id += 1
+                is_reserved = rng.random() < spec.reserved_ratio
+                yield {
+                    'id': item_id,
+                    'name': f'{rng.choice(GIFT_WORDS)} {position}',
+                    'photo_id': None,
+                    'link': f'https://example.com/items/{item_id}' if rng.random() < 0.6 else None,
+                    'price': round(rng.lognormvariate(8, 1), 2) if rng.random() < 0.7 else None,
+                    'description': 'Generated item' if rng.random() < 0.3 else None,
+                    'priority_level': rng.choice(PRIORITIES),
+                    'is_reserved': is_reserved,
+                    'reserved_by_id': rng.randint(1, spec.users) if is_reserved else None,
+                    'wishlist_id': wishlist_id,
+                    'created_at': self._timestamp(),
+                }
+
+    def subscriptions(self) -> Iterator[dict]:
+        spec, rng = self.spec, self.rng
+        if not self.owners:
+            return
+        popularity = ZipfSampler(len(self.owners), spec.popularity_exponent, rng)
+        subscription_id = 0
+        for subscriber_id in range(1, spec.users + 1):
+            wishlist_ids = {popularity.sample() for _ in range(self._count(spec.subscriptions_per_user))}
+            for wishlist_id in sorted(wishlist_ids):
+                owner_id = self.owners[wishlist_id - 1]
+                if owner_id == subscriber_id:
+                    continue
+                status = SubscriptionStatus.APPROVED
+                if self.private[wishlist_id - 1] and rng.random() < spec.pending_ratio:
+                    status = SubscriptionStatus.PENDING
+                subscription_id += 1
+                yield {
+                    'id': subscription_id,
+                    'status': status,
+                    'subscriber_id': subscriber_id,
+                    'wishlist_id': wishlist_id,
+                    'wishlist_owner_id': owner_id,
+                    'created_at': self._timestamp(),
+                }
+
+
+def _batches(rows: Iterator[dict], size: int) -> Iterator[list[dict]]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def _load(connection: AsyncConnection, table, rows: Iterator[dict], batch_size: int) -> int:
+    start = time.perf_counter()
+    total = 0
+    for batch in _batches(rows, batch_size):
+        await connection.execute(insert(table), batch)
+        await connection.commit()
+        total += len(batch)
+    elapsed = time.perf_counter() - start
+    print(f"{table.__tablename__}: {total} rows in {elapsed:.1f} s ({total / elapsed if elapsed else 0:.0f} rows/s)")
+    return total
+
+
+async def generate(db_path: str, spec: DatasetSpec) -> dict[str, int]:
+    """Creates the schema in a new SQLite file at db_path and fills it; returns row counts"""
+    # Durability doesn't matter for a throwaway dataset, load speed does
+    engine = models.setup_engine(DbConfig(url=f'sqlite+aiosqlite:///{db_path}', sqlite_synchronous='OFF'))
+    await models.async_main()
+
+    generator = DatasetGenerator(spec)
+    counts = {}
+    async with engine.connect() as connection:
+        counts['users'] = await _load(connection, User, generator.users(), spec.batch_size)
+        counts['wishlists'] = await _load(connection, Wishlist, generator.wishlists(), spec.batch_size)
+        counts['items'] = await _load(connection, Item, generator.items(), spec.batch_size)
+        counts['subscriptions'] = await _load(
+            connection, WishlistSubscription, generator.subscriptions(), spec.batch_size)
+
+    start = time.perf_counter()
+    async with models.async_session() as session:
+        await repair_wishlist_counters(session)
+        await session.commit()
+    print(f"wishlist counters: {time.perf_counter() - start:.1f} s")
+
+    await engine.dispose()
+    return counts
+
+
+def parse_args(argv: list[str]) -> tuple[str, DatasetSpec]:
+    defaults = DatasetSpec()
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--db', required=True, help='SQLite file to create')
+    parser.add_argument('--scale', type=float, default=1.0, help='multiplier for users, wishlists and items')
+    for field in fields(DatasetSpec):
+        parser.add_argument(f"--{field.name.replace('_', '-')}", type=type(getattr(defaults, field.name)),
+                            default=getattr(defaults, field.name))
+    args = parser.parse_args(argv)
+    spec = DatasetSpec(**{field.name: getattr(args, field.name) for field in fields(DatasetSpec)})
+    return args.db, spec.scaled(args.scale)
+
+
+def main(argv: list[str] | None = None) -> int:
+    db_path, spec = parse_args(sys.argv[1:] if argv is None else argv)
+    if os.path.exists(db_path):
+        print(f"{db_path} already exists, the generator only fills a new database")
+        return 1
+    counts = asyncio.run(generate(db_path, spec))
+    print(', '.join(f'{count} {table}' for table, count in counts.items()))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
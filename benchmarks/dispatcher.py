@@ -0,0 +1,224 @@
+"""
+Dispatcher throughput benchmark.
+
+Builds the real dispatcher from main.py (all routers and middlewares) on a
+fake Bot session that answers every API call locally, seeds a fresh SQLite
+database and replays synthetic update mixes through it. Prints updates/sec
+and latency percentiles per update type and writes them to a JSON file, so
+runs can be compared over time.
+
+Usage: python -m benchmarks.dispatcher [--scenarios 500] [--concurrency 16] [--output results.json]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import platform
+import sqlite3
+import sys
+import tempfile
+import time
+from dataclasses import replace
+from datetime import datetime, UTC
+from itertools import count
+from typing import Callable
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+
+os.environ.setdefault('BOT_TOKEN', '42:BENCHMARK')
+os.environ.setdefault('ADMIN_IDS', '1')
+
+# handlers.user imports main, so it has to be imported first to avoid a circular import
+from handlers import user  # noqa: E402,F401
+from main import create_dispatcher  # noqa: E402
+from config.config import Config, DbConfig, load_config  # noqa: E402
+from database import models  # noqa: E402
+from database import requests as rq  # noqa: E402
+from keyboards.callback_data import ViewWishlist, NextItem, PrevItem, AddItem, Subscribe, ReserveItem, \
+    UnreserveItem, ItemView, SearchResults, OpenItem  # noqa: E402
+from benchmarks.stats import latency_stats, format_latency, write_results  # noqa: E402
+from tests.fakes import FakeSession, SeededWishlist, UpdateFactory, seed  # noqa: E402
+
+# Scenario kinds replayed on their own and then all together in the 'mixed' phase
+SCENARIOS = ('start', 'view_wishlist', 'carousel', 'item_flow', 'subscribe', 'reserve', 'search')
+
+
+Step = tuple[str, Update]
+
+
+class ScenarioFactory:
+    """
+    Update sequences of one user. Worker `worker` owns one seeded wishlist and
+    a viewer account, so sequences of different workers never share FSM state.
+    """
+
+    def __init__(self, updates: UpdateFactory, wishlists: list[SeededWishlist], items: int):
+        self.updates = updates
+        self.wishlists = wishlists
+        self.items = items
+        self._subscribers = count(3_000_000)
+
+    def build(self, kind: str, worker: int, iteration: int) -> list[Step]:
+        return getattr(self, kind)(worker, iteration)
+
+    def _viewer(self, worker: int) -> int:
+        return 2_000_000 + worker
+
+    def start(self, worker: int, iteration: int) -> list[Step]:
+        return [('start', self.updates.message(self._viewer(worker), '/start'))]
+
+    def view_wishlist(self, worker: int, iteration: int) -> list[Step]:
+        wishlist = self.wishlists[iteration % len(self.wishlists)]
+        return [('view_wishlist', self.updates.callback(self._viewer(worker), ViewWishlist.pack(wishlist.access_uuid)))]
+
+    def carousel(self, worker: int, iteration: int) -> list[Step]:
+        wishlist = self.wishlists[iteration % len(self.wishlists)]
+        viewer = self._viewer(worker)
+        steps = [('next_item', self.updates.callback(viewer, NextItem.pack(wishlist.id, position)))
+                 for position in range(1, self.items)]
+        steps += [('prev_item', self.updates.callback(viewer, PrevItem.pack(wishlist.id, position)))
+                  for position in range(self.items, 1, -1)]
+        steps.append(('item_view', self.updates.callback(viewer, ItemView.pack(wishlist.id, rq.ItemOrder.PRIORITY))))
+        return steps
+
+    def item_flow(self, worker: int, iteration: int) -> list[Step]:
+        wishlist = self.wishlists[worker % len(self.wishlists)]
+        owner = wishlist.owner_telegram_id
+        return [
+            ('add_item', self.updates.callback(owner, AddItem.pack(wishlist.id))),
+            ('edit_name', self.updates.callback(owner, 'edit_name')),
+            ('item_name', self.updates.message(owner, f'Gift {iteration}')),
+            ('confirm_item', self.updates.callback(owner, 'confirm_item')),
+        ]
+
+    def subscribe(self, worker: int, iteration: int) -> list[Step]:
+        wishlist = self.wishlists[iteration % len(self.wishlists)]
+        return [('subscribe', self.updates.callback(next(self._subscribers), Subscribe.pack(wishlist.id)))]
+
+    def reserve(self, worker: int, iteration: int) -> list[Step]:
+        # All workers go through the items of the first wishlist, so they race for the same rows
+        wishlist = self.wishlists[0]
+        position = iteration % self.items + 1
+        item_id = wishlist.item_ids[position - 1]
+        viewer = self._viewer(worker)
+        return [
+            ('reserve_item', self.updates.callback(viewer, ReserveItem.pack(wishlist.id, item_id, position))),
+            ('unreserve_item', self.updates.callback(viewer, UnreserveItem.pack(wishlist.id, item_id, position))),
+        ]
+
+    def search(self, worker: int, iteration: int) -> list[Step]:
+        # Owners search their own wishlist, whose items are all named 'Item N'
+        wishlist = self.wishlists[worker % len(self.wishlists)]
+        owner = wishlist.owner_telegram_id
+        item_id = wishlist.item_ids[iteration % len(wishlist.item_ids)]
+        return [
+            ('search', self.updates.message(owner, '/search item')),
+            ('search_results', self.updates.callback(owner, SearchResults.pack(rq.SEARCH_PAGE_SIZE))),
+            ('open_item', self.updates.callback(owner, OpenItem.pack(item_id))),
+            ('inline_search', self.updates.inline_query(owner, 'ite')),
+        ]
+
+    def mixed(self, worker: int, iteration: int) -> list[Step]:
+        return self.build(SCENARIOS[iteration % len(SCENARIOS)], worker, iteration)
+
+
+def summarize(durations: dict[str, list[float]], elapsed: float) -> dict:
+    total = sum(len(values) for values in durations.values())
+    return {
+        'updates': total,
+        'seconds': round(elapsed, 3),
+        'updates_per_sec': round(total / elapsed, 1) if elapsed else 0.0,
+        'latency': {kind: latency_stats(values) for kind, values in sorted(durations.items())},
+    }
+
+
+async def run_phase(dp: Dispatcher, bot: Bot, build: Callable[[int, int], list[Step]],
+                    scenarios: int, concurrency: int) -> dict:
+    """Replays `scenarios` sequences on `concurrency` users at once"""
+    durations: dict[str, list[float]] = {}
+
+    async def worker(index: int) -> None:
+        for iteration in range(index, scenarios, concurrency):
+            for kind, update in build(index, iteration):
+                start = time.perf_counter()
+                await dp.feed_update(bot, update)
+                durations.setdefault(kind, []).append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(index) for index in range(concurrency)))
+    return summarize(durations, time.perf_counter() - start)
+
+
+async def benchmark(args: argparse.Namespace, config: Config) -> dict:
+    started_at = datetime.now(UTC)
+    engine = models.setup_engine(config.db)
+    await models.async_main()
+    wishlists = await seed(max(args.wishlists, args.concurrency), args.items)
+
+    session = FakeSession(latency=args.api_latency / 1000)
+    bot = Bot(token=config.bot.token, session=session)
+    dp = create_dispatcher(config)
+    scenarios = ScenarioFactory(UpdateFactory(), wishlists, args.items)
+
+    phases = {}
+    for kind in (*SCENARIOS, 'mixed'):
+        phases[kind] = await run_phase(dp, bot, getattr(scenarios, kind), args.scenarios, args.concurrency)
+        print_phase(kind, phases[kind])
+
+    await dp.emit_shutdown(bot=bot, dispatcher=dp, **dp.workflow_data)
+    await engine.dispose()
+    return {
+        'started_at': started_at.isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'settings': {
+            'scenarios': args.scenarios,
+            'concurrency': args.concurrency,
+            'wishlists': len(wishlists),
+            'items': args.items,
+            'api_latency_ms': args.api_latency,
+            'max_concurrency': config.updates.max_concurrency,
+        },
+        'api_requests': session.requests,
+        'phases': phases,
+    }
+
+
+def print_phase(name: str, phase: dict) -> None:
+    print(f"{name}: {phase['updates']} updates in {phase['seconds']} s, {phase['updates_per_sec']} updates/s")
+    for kind, stats in phase['latency'].items():
+        print(format_latency(kind, stats))
+
+
+def parse_args(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--scenarios', type=int, default=500, help='update sequences replayed per phase')
+    parser.add_argument('--concurrency', type=int, default=16, help='users sending updates at the same time')
+    parser.add_argument('--wishlists', type=int, default=50, help='seeded public wishlists')
+    parser.add_argument('--items', type=int, default=10, help='items per seeded wishlist')
+    parser.add_argument('--api-latency', type=float, default=0.0, help='simulated Bot API round trip, ms')
+    parser.add_argument('--output', help='JSON results file, benchmark-<timestamp>.json by default')
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    # Slow update warnings would bury the report; failures are still printed
+    logging.basicConfig(level=logging.ERROR)
+
+    with tempfile.TemporaryDirectory() as directory:
+        config = load_config()
+        config = replace(
+            config,
+            db=DbConfig(url=f"sqlite+aiosqlite:///{os.path.join(directory, 'benchmark.sqlite3')}"),
+            bot=replace(config.bot, use_redis=False)
+        )
+        results = asyncio.run(benchmark(args, config))
+
+    print(f"Results written to {write_results(results, args.output, 'benchmark')}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
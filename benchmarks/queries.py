@@ -0,0 +1,236 @@
+"""
+Times every function of database/requests.py against a database filled by
+benchmarks.dataset. Each call runs in its own session with randomly sampled
+users, wishlists and items, and is rolled back, so the dataset stays as
+generated and runs are comparable.
+
+Usage: python -m benchmarks.queries --db dataset.sqlite3 [--calls 200] [--output results.json]
+"""
+import argparse
+import asyncio
+import platform
+import random
+import sqlite3
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, UTC
+from typing import AsyncIterator, Awaitable, Callable
+
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from benchmarks.dataset import TELEGRAM_ID_BASE, GIFT_WORDS
+from benchmarks.stats import latency_stats, format_latency, write_results
+from config.config import DbConfig
+from database import models
+from database import requests as rq
+from database.models import User, Wishlist, Item, WishlistSubscription, SubscriptionStatus, Broadcast
+
+# Functions that read whole tables; they run --full-scan-calls times instead of --calls
+FULL_SCANS = {'get_stats', 'get_users_count', 'get_users_count_filtered', 'repair_wishlist_counters'}
+
+Call = Callable[[AsyncSession], Awaitable]
+
+
+@dataclass
+class Samples:
+    """Random rows of the dataset that the calls pick their arguments from"""
+    users: list[tuple[int, int]]  # (id, telegram id)
+    wishlists: list[tuple[int, str, int]]  # (id, access uuid, owner id)
+    items: list[tuple[int, int]]  # (id, wishlist id)
+    subscriptions: list[tuple[int, int, int]]  # (id, subscriber id, wishlist id)
+    broadcast_id: int
+
+
+async def _sample(session: AsyncSession, model, columns, size: int, rng: random.Random) -> list[tuple]:
+    max_id = (await session.execute(select(func.max(model.id)))).scalar() or 0
+    ids = [rng.randint(1, max_id) for _ in range(size)] if max_id else []
+    result = await session.execute(select(*columns).where(model.id.in_(ids)))
+    return [tuple(row) for row in result.all()]
+
+
+async def load_samples(size: int, rng: random.Random) -> Samples:
+    async with models.async_session() as session:
+        samples = Samples(
+            users=await _sample(session, User, (User.id, User.telegram_id), size, rng),
+            wishlists=[
+                (wishlist_id, str(access_uuid), owner_id) for wishlist_id, access_uuid, owner_id in await _sample(
+                    session, Wishlist, (Wishlist.id, Wishlist.access_uuid, Wishlist.owner_id), size, rng)
+            ],
+            items=await _sample(session, Item, (Item.id, Item.wishlist_id), size, rng),
+            subscriptions=await _sample(
+                session, WishlistSubscription,
+                (WishlistSubscription.id, WishlistSubscription.subscriber_id, WishlistSubscription.wishlist_id),
+                size, rng
+            ),
+            broadcast_id=0
+        )
+        # save_broadcast_progress needs a broadcast; it is the only row the benchmark keeps
+        broadcast = (await session.execute(select(Broadcast.id).limit(1))).scalar()
+        if broadcast is None:
+            broadcast = (await rq.create_broadcast(
+                session, from_chat_id=1, message_id=1, status_chat_id=1, status_message_id=2,
+                language='en', total=0)).id
+            await session.commit()
+        samples.broadcast_id = broadcast
+    if not (samples.users and samples.wishlists and samples.items and samples.subscriptions):
+        raise ValueError('The database has no data, fill it with python -m benchmarks.dataset first')
+    return samples
+
+
+async def _first_chunk(chunks: AsyncIterator) -> None:
+    async for _ in chunks:
+        return
+
+
+def calls(samples: Samples, rng: random.Random) -> dict[str, Call]:
+    """One call per requests.py function; arguments are sampled anew on every call"""
+    def user() -> tuple[int, int]:
+        return rng.choice(samples.users)
+
+    def wishlist() -> tuple[int, str, int]:
+        return rng.choice(samples.wishlists)
+
+    def item() -> tuple[int, int]:
+        return rng.choice(samples.items)
+
+    def subscription() -> tuple[int, int, int]:
+        return rng.choice(samples.subscriptions)
+
+    def item_position(s: AsyncSession):
+        item_id, wishlist_id = item()
+        return rq.get_item_position(s, Item(id=item_id, wishlist_id=wishlist_id))
+
+    def reserve(s: AsyncSession):
+        item_id, wishlist_id = item()
+        return rq.reserve_item(s, user()[0], wishlist_id, item_id)
+
+    def unreserve(s: AsyncSession):
+        item_id, wishlist_id = item()
+        return rq.unreserve_item(s, user()[0], wishlist_id, item_id)
+
+    def new_subscription(s: AsyncSession):
+        wishlist_id, _, owner_id = wishlist()
+        return rq.get_or_create_subscription(s, user()[0], wishlist_id, owner_id, SubscriptionStatus.APPROVED)
+
+    month_ago = datetime.now(UTC) - timedelta(days=30)
+
+    return {
+        'get_or_create_user': lambda s: rq.get_or_create_user(s, user()[1]),
+        'get_or_create_user_new': lambda s: rq.get_or_create_user(
+            s, TELEGRAM_ID_BASE - rng.randint(1, 10 ** 6), 'new_user'),
+        'get_user_identity': lambda s: rq.get_user_identity(s, user()[1]),
+        'get_wishlists': lambda s: rq.get_wishlists(s, user()[0]),
+        'get_friends_wishlists': lambda s: rq.get_friends_wishlists(s, user()[0]),
+        'create_or_update_wishlist': lambda s: rq.create_or_update_wishlist(
+            s, user_id=user()[1], title='Benchmark', is_private=False),
+        'get_wishlist': lambda s: rq.get_wishlist(s, wishlist()[0], with_owner=True, with_items=True),
+        'get_wishlist_by_uuid': lambda s: rq.get_wishlist(s, wishlist()[1]),
+        'get_wishlist_view': lambda s: rq.get_wishlist_view(s, wishlist()[1], user()[1]),
+        'get_stats': rq.get_stats,
+        'delete_wishlist_db': lambda s: rq.delete_wishlist_db(s, wishlist()[0]),
+        'get_or_create_subscription': new_subscription,
+        'get_subscription': lambda s: rq.get_subscription(s, *subscription()[1:]),
+        'update_subscription_status': lambda s: rq.update_subscription_status(
+            s, subscription()[0], SubscriptionStatus.REJECTED),
+        'delete_subscription': lambda s: rq.delete_subscription(s, subscription()[0]),
+        'get_subscription_with_details': lambda s: rq.get_subscription_with_details(s, *subscription()[1:]),
+        'get_subscribers_count': lambda s: rq.get_subscribers_count(s, wishlist()[0]),
+        'get_user_language': lambda s: rq.get_user_language(s, user()[1]),
+        'create_or_update_item': lambda s: rq.create_or_update_item(s, wishlist_id=wishlist()[0], name='Benchmark'),
+        'get_item': lambda s: rq.get_item(s, item()[0], with_wishlist=True),
+        'get_carousel_item': lambda s: rq.get_carousel_item(s, item()[1], rng.randint(1, 10), user()[1]),
+        'get_carousel_item_priority': lambda s: rq.get_carousel_item(
+            s, item()[1], rng.randint(1, 10), user()[1], rq.ItemOrder.PRIORITY),
+        'get_carousel_item_price_limit': lambda s: rq.get_carousel_item(
+            s, item()[1], rng.randint(1, 10), user()[1], rq.ItemOrder.PRICE, max_price=5000),
+        'get_carousel_item_unreserved': lambda s: rq.get_carousel_item(
+            s, item()[1], rng.randint(1, 10), user()[1], rq.ItemOrder.UNRESERVED, only_unreserved=True),
+        'get_item_position': item_position,
+        'reserve_item': reserve,
+        'unreserve_item': unreserve,
+        'search': lambda s: rq.search(s, user()[0], rng.choice(GIFT_WORDS)),
+        # Inline mode searches while the word is being typed
+        'search_prefix': lambda s: rq.search(s, user()[0], rng.choice(GIFT_WORDS)[:3]),
+        'repair_wishlist_counters': lambda s: rq.repair_wishlist_counters(s),
+        'repair_wishlist_counters_one': lambda s: rq.repair_wishlist_counters(s, wishlist()[0]),
+        'get_users_count': lambda s: rq.get_users_count(s),
+        'get_users_count_filtered': lambda s: rq.get_users_count(s, language='ru', active_since=month_ago),
+        'iter_audience_chunk': lambda s: _first_chunk(rq.iter_audience(s, after_user_id=user()[0])),
+        'iter_audience_filtered_chunk': lambda s: _first_chunk(
+            rq.iter_audience(s, language='ru', active_since=month_ago, after_user_id=user()[0])),
+        'create_broadcast': lambda s: rq.create_broadcast(
+            s, from_chat_id=1, message_id=1, status_chat_id=1, status_message_id=2, language='en', total=0),
+        'get_running_broadcasts': rq.get_running_broadcasts,
+        'save_broadcast_progress': lambda s: rq.save_broadcast_progress(
+            s, samples.broadcast_id, last_user_id=1, success=1, failed=0),
+    }
+
+
+async def time_call(call: Call) -> float:
+    async with models.async_session() as session:
+        start = time.perf_counter()
+        await call(session)
+        await session.flush()
+        elapsed = time.perf_counter() - start
+        await session.rollback()
+    rq.user_cache.clear()
+    return elapsed
+
+
+async def benchmark(args: argparse.Namespace) -> dict:
+    started_at = datetime.now(UTC)
+    engine = models.setup_engine(DbConfig(url=f'sqlite+aiosqlite:///{args.db}'))
+    rng = random.Random(args.seed)
+    samples = await load_samples(args.samples, rng)
+
+    counts = {}
+    async with models.async_session() as session:
+        for name, model in (('users', User), ('wishlists', Wishlist), ('items', Item),
+                            ('subscriptions', WishlistSubscription)):
+            counts[name] = (await session.execute(select(func.count()).select_from(model))).scalar_one()
+    print(', '.join(f'{count} {table}' for table, count in counts.items()))
+
+    results = {}
+    for name, call in calls(samples, rng).items():
+        if args.only and name not in args.only:
+            continue
+        repeat = args.full_scan_calls if name in FULL_SCANS else args.calls
+        durations = [await time_call(call) for _ in range(repeat)]
+        results[name] = latency_stats(durations)
+        print(format_latency(name, results[name]))
+
+    await engine.dispose()
+    return {
+        'started_at': started_at.isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'database': args.db,
+        'rows': counts,
+        'settings': {'calls': args.calls, 'full_scan_calls': args.full_scan_calls, 'seed': args.seed},
+        'functions': results,
+    }
+
+
+def parse_args(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--db', required=True, help='SQLite file created by benchmarks.dataset')
+    parser.add_argument('--calls', type=int, default=200, help='calls per function')
+    parser.add_argument('--full-scan-calls', type=int, default=3, help='calls per whole-table function')
+    parser.add_argument('--samples', type=int, default=1000, help='rows sampled from every table')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--only', nargs='*', help='time only these functions')
+    parser.add_argument('--output', help='JSON results file, queries-<timestamp>.json by default')
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    results = asyncio.run(benchmark(args))
+    print(f"Results written to {write_results(results, args.output, 'queries')}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
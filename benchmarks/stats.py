@@ -0,0 +1,37 @@
+"""Latency summaries and JSON result files shared by the benchmarks"""
+import json
+from datetime import datetime, UTC
+from typing import Optional
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, round(q * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def latency_stats(durations: list[float]) -> dict:
+    """Count and p50/p95/p99/max in milliseconds of durations given in seconds"""
+    values = sorted(durations)
+    return {
+        'count': len(values),
+        'p50_ms': round(percentile(values, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(values, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(values, 0.99) * 1000, 3),
+        'max_ms': round(values[-1] * 1000, 3) if values else 0.0,
+    }
+
+
+def format_latency(name: str, stats: dict) -> str:
+    return (f"    {name:<30} p50 {stats['p50_ms']:>8} ms   p95 {stats['p95_ms']:>8} ms   "
+            f"p99 {stats['p99_ms']:>8} ms   ({stats['count']})")
+
+
+def write_results(results: dict, output: Optional[str], prefix: str) -> str:
+    """Writes results to `output`, or to <prefix>-<UTC timestamp>.json; returns the path"""
+    output = output or f"{prefix}-{datetime.now(UTC).strftime('%Y%m%dT%H%M%S')}.json"
+    with open(output, 'w') as file:
+        json.dump(results, file, indent=2)
+    return output
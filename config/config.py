@@ -6,6 +6,26 @@ from typing import List, Optional
 class DbConfig:
     url: str
     echo: bool = False  # SQL query logging
+    pool_size: int = 5
+    max_overflow: int = 10
+    # SQLite connection PRAGMAs, applied on every new connection
+    sqlite_journal_mode: str = "WAL"
+    sqlite_synchronous: str = "NORMAL"
+    sqlite_mmap_size: int = 268435456  # 256 MiB
+    sqlite_cache_size: int = -65536  # negative value is KiB, i.e. 64 MiB per connection
+    sqlite_busy_timeout: int = 5000  # ms
+    query_budget: int = 10  # SQL statements per handler call before a warning is logged
+
+@dataclass
+class RedisConfig:
+    url: str = "redis://localhost:6379/0"
+    key_prefix: str = "wishlist_bot"  # shared by every worker of the same bot
+    max_connections: int = 20  # connection pool size per worker
+
+@dataclass
+class FsmConfig:
+    state_ttl: int = 86400  # seconds; abandoned forms expire after a day
+    max_states: int = 10000  # memory storage only, least recently used states are evicted
 
 @dataclass
 class TgBot:
@@ -13,10 +33,46 @@ class TgBot:
     admin_ids: List[int]
     use_redis: bool = False
 
+@dataclass
+class UpdatesConfig:
+    max_concurrency: int = 64  # updates handled at the same time, across all users
+    max_pending: int = 1000  # waiting + running updates before intake is held back
+    max_user_pending: int = 10  # waiting + running updates of one user, extra ones are dropped
+
+@dataclass
+class WebhookConfig:
+    enabled: bool = False  # long polling when disabled
+    url: str = ""  # public https base url Telegram sends updates to; required when enabled
+    path: str = "/webhook"
+    secret: Optional[str] = None  # required when enabled, checked against X-Telegram-Bot-Api-Secret-Token
+    host: str = "0.0.0.0"
+    port: int = 8080
+    workers: int = 1  # processes sharing the port via SO_REUSEPORT
+
+@dataclass
+class LogConfig:
+    level: str = "INFO"
+    json: bool = False  # one JSON object per line instead of plain text
+    sample_rate: float = 1.0  # share of fast successful updates that get logged
+    slow_ms: float = 500.0  # slower updates are always logged
+    max_field_length: int = 256  # longer string fields are cut
+    queue_size: int = 10000  # records waiting for the writer thread, extra ones are dropped
+
+@dataclass
+class MetricsConfig:
+    host: str = "127.0.0.1"
+    port: int = 0  # Prometheus /metrics endpoint, disabled when 0; webhook worker N uses port + N
+
 @dataclass
 class Config:
     bot: TgBot
     db: DbConfig
+    redis: RedisConfig
+    fsm: FsmConfig
+    webhook: WebhookConfig
+    updates: UpdatesConfig
+    log: LogConfig
+    metrics: MetricsConfig
 
 def load_config(path: Optional[str] = None) -> Config:
     env = Env()
@@ -29,7 +85,50 @@ def load_config(path: Optional[str] = None) -> Config:
             use_redis=env.bool("USE_REDIS", False)
         ),
         db=DbConfig(
-            url=env.str("DB_URL", "sqlite+aiosqlite:///database.db"),
-            echo=env.bool("DB_ECHO", False)
+            url=env.str("DB_URL", "sqlite+aiosqlite:///db.sqlite3"),
+            echo=env.bool("DB_ECHO", False),
+            pool_size=env.int("DB_POOL_SIZE", 5),
+            max_overflow=env.int("DB_MAX_OVERFLOW", 10),
+            sqlite_journal_mode=env.str("SQLITE_JOURNAL_MODE", "WAL"),
+            sqlite_synchronous=env.str("SQLITE_SYNCHRONOUS", "NORMAL"),
+            sqlite_mmap_size=env.int("SQLITE_MMAP_SIZE", 268435456),
+            sqlite_cache_size=env.int("SQLITE_CACHE_SIZE", -65536),
+            sqlite_busy_timeout=env.int("SQLITE_BUSY_TIMEOUT", 5000),
+            query_budget=env.int("DB_QUERY_BUDGET", 10)
+        ),
+        redis=RedisConfig(
+            url=env.str("REDIS_URL", "redis://localhost:6379/0"),
+            key_prefix=env.str("REDIS_KEY_PREFIX", "wishlist_bot"),
+            max_connections=env.int("REDIS_MAX_CONNECTIONS", 20)
+        ),
+        fsm=FsmConfig(
+            state_ttl=env.int("FSM_STATE_TTL", 86400),
+            max_states=env.int("FSM_MAX_STATES", 10000)
+        ),
+        webhook=WebhookConfig(
+            enabled=env.bool("USE_WEBHOOK", False),
+            url=env.str("WEBHOOK_URL", ""),
+            path=env.str("WEBHOOK_PATH", "/webhook"),
+            secret=env.str("WEBHOOK_SECRET", None),
+            host=env.str("WEBHOOK_HOST", "0.0.0.0"),
+            port=env.int("WEBHOOK_PORT", 8080),
+            workers=env.int("WEBHOOK_WORKERS", 1)
+        ),
+        updates=UpdatesConfig(
+            max_concurrency=env.int("UPDATES_MAX_CONCURRENCY", 64),
+            max_pending=env.int("UPDATES_MAX_PENDING", 1000),
+            max_user_pending=env.int("UPDATES_MAX_USER_PENDING", 10)
+        ),
+        log=LogConfig(
+            level=env.str("LOG_LEVEL", "INFO"),
+            json=env.bool("LOG_JSON", False),
+            sample_rate=env.float("LOG_SAMPLE_RATE", 1.0),
+            slow_ms=env.float("LOG_SLOW_MS", 500.0),
+            max_field_length=env.int("LOG_MAX_FIELD_LENGTH", 256),
+            queue_size=env.int("LOG_QUEUE_SIZE", 10000)
+        ),
+        metrics=MetricsConfig(
+            host=env.str("METRICS_HOST", "127.0.0.1"),
+            port=env.int("METRICS_PORT", 0)
         )
     )
@@ -0,0 +1,126 @@
+import atexit
+import json
+import logging
+import queue
+import sys
+from datetime import datetime, UTC
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Optional
+
+from config.config import LogConfig
+
+PLAIN_FORMAT = '%(filename)s:%(lineno)d #%(levelname)-8s [%(asctime)s] - %(name)s - %(message)s'
+
+# Set by setup_logging, stopped (and the queue flushed) at interpreter exit
+_listener: Optional[QueueListener] = None
+_queue_handler: Optional['DroppingQueueHandler'] = None
+
+
+def _cap(value: Any, max_length: int) -> Any:
+    if isinstance(value, str) and len(value) > max_length:
+        return value[:max_length] + '…'
+    return value
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line. Structured fields are passed as
+    ``logger.info(msg, extra={'fields': {...}})``; string values longer than
+    `max_field_length` are cut so a single record can't flood the output.
+    """
+
+    def __init__(self, max_field_length: int = 256):
+        super().__init__()
+        self.max_field_length = max_field_length
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            'ts': datetime.fromtimestamp(record.created, UTC).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': _cap(record.getMessage(), self.max_field_length * 4),
+        }
+        for key, value in getattr(record, 'fields', {}).items():
+            payload[key] = _cap(value, self.max_field_length)
+        if record.exc_info:
+            payload['exc'] = _cap(self.formatException(record.exc_info), self.max_field_length * 16)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class PlainFormatter(logging.Formatter):
+    """The bot's original text format, with structured fields appended as key=value"""
+
+    def __init__(self, max_field_length: int = 256):
+        super().__init__(PLAIN_FORMAT)
+        self.max_field_length = max_field_length
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = getattr(record, 'fields', None)
+        if fields:
+            line += ' ' + ' '.join(f'{k}={_cap(v, self.max_field_length)!r}' for k, v in fields.items())
+        return line
+
+
+class DroppingQueueHandler(QueueHandler):
+    """Drops records instead of blocking the event loop when the queue is full"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Formatting happens on the listener thread; only resolve the message here,
+        # as args may be mutable objects that change before the thread gets to them
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def setup_logging(config: LogConfig) -> QueueListener:
+    """
+    Routes every log record through a bounded queue to a background thread that
+    formats and writes it, so the event loop never waits for stdout or disk.
+    """
+    global _listener, _queue_handler
+
+    formatter = JsonFormatter(config.max_field_length) if config.json else PlainFormatter(config.max_field_length)
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(formatter)
+
+    log_queue: queue.Queue = queue.Queue(config.queue_size)
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    _queue_handler = DroppingQueueHandler(log_queue)
+    root.addHandler(_queue_handler)
+    root.setLevel(config.level)
+    logging.getLogger("aiogram.event").setLevel(logging.WARNING)
+
+    if _listener is None:
+        atexit.register(stop_logging)
+    else:
+        _listener.stop()
+    _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def dropped_records() -> int:
+    """Records dropped so far because the queue was full"""
+    return _queue_handler.dropped if _queue_handler is not None else 0
+
+
+def stop_logging() -> None:
+    """Writes out everything still queued and stops the background thread"""
+    global _listener
+
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -1,17 +1,77 @@
 import secrets
+import time
 import uuid
 from email.policy import default
+from pathlib import Path
 
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Float, Text, Enum, Boolean, UUID
+from alembic import command
+from alembic.config import Config as AlembicConfig
+
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Float, Text, Enum, Boolean, UUID, Index, event, inspect, make_url, \
+    Computed, text, table, column
 from sqlalchemy.orm import relationship, DeclarativeBase
 
 from datetime import datetime, UTC
 from enum import Enum as PyEnum
-from sqlalchemy.ext.asyncio import AsyncAttrs, async_sessionmaker, create_async_engine
+from sqlalchemy.ext.asyncio import AsyncAttrs, AsyncEngine, async_sessionmaker, create_async_engine
+
+from config.config import DbConfig
+from external_services.metrics import metrics, current_queries
+
+engine: AsyncEngine | None = None
+
+# Bound to the engine by setup_engine() on startup. Write handlers commit before their
+# Bot API calls and keep using the loaded objects afterwards, so commits don't expire them
+async_session = async_sessionmaker(expire_on_commit=False)
+
+
+def setup_engine(db: DbConfig) -> AsyncEngine:
+    """
+    Creates the engine from config and binds async_session to it.
+    SQLite connections get the PRAGMA profile from DbConfig on connect.
+    """
+    global engine
+
+    url = make_url(db.url)
+    is_sqlite = url.get_backend_name() == 'sqlite'
+    in_memory = is_sqlite and url.database in (None, '', ':memory:')
+
+    engine_kwargs = {}
+    if not in_memory:
+        # In-memory SQLite uses StaticPool, which has no pool sizing
+        engine_kwargs.update(pool_size=db.pool_size, max_overflow=db.max_overflow)
+
+    engine = create_async_engine(url, echo=db.echo, **engine_kwargs)
+
+    if is_sqlite:
+        @event.listens_for(engine.sync_engine, 'connect')
+        def set_sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            if not in_memory:
+                cursor.execute(f"PRAGMA journal_mode={db.sqlite_journal_mode}")
+            cursor.execute(f"PRAGMA synchronous={db.sqlite_synchronous}")
+            cursor.execute(f"PRAGMA mmap_size={int(db.sqlite_mmap_size)}")
+            cursor.execute(f"PRAGMA cache_size={int(db.sqlite_cache_size)}")
+            cursor.execute(f"PRAGMA busy_timeout={int(db.sqlite_busy_timeout)}")
+            cursor.close()
 
-engine = create_async_engine(url='sqlite+aiosqlite:///db.sqlite3', echo=False)
+    @event.listens_for(engine.sync_engine, 'before_cursor_execute')
+    def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+        conn.info['query_start'] = time.perf_counter()
 
-async_session = async_sessionmaker(engine)
+    @event.listens_for(engine.sync_engine, 'after_cursor_execute')
+    def observe_query_time(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info.pop('query_start', time.perf_counter())
+        metrics.sql_duration.observe(elapsed, statement.lstrip().split(' ', 1)[0].upper())
+        queries = current_queries.get()
+        if queries is not None:
+            queries.add(statement)
+
+    metrics.gauge('db_connections_checked_out', 'Pooled connections currently in use',
+                  lambda: getattr(engine.pool, 'checkedout', lambda: 0)())
+
+    async_session.configure(bind=engine)
+    return engine
 
 
 class Base(AsyncAttrs, DeclarativeBase):
@@ -32,6 +92,11 @@ class SubscriptionStatus(PyEnum):
     REJECTED = "rejected"
 
 
+class BroadcastStatus(PyEnum):
+    RUNNING = "running"
+    FINISHED = "finished"
+
+
 class User(Base):
     """User model with improved field constraints"""
     __tablename__ = "users"
@@ -39,7 +104,9 @@ class User(Base):
     id = Column(Integer, primary_key=True, index=True)
     telegram_id = Column(Integer, unique=True, index=True, nullable=False)
     username = Column(String(50))
-    language = Column(String(5), default='en')
+    language = Column(String(5), default='en', index=True)
+    # Refreshed by get_or_create_user at most once per ACTIVITY_RESOLUTION, see database/requests.py
+    last_active_at = Column(DateTime, nullable=True, index=True)
 
     wishlists = relationship("Wishlist", back_populates="owner", cascade="all, delete-orphan")
 
@@ -64,6 +131,10 @@ class User(Base):
 class Wishlist(Base):
     """Wishlist model with optimized field types"""
     __tablename__ = "wishlists"
+    __table_args__ = (
+        # get_wishlists: active wishlists of an owner, newest first
+        Index("ix_wishlists_owner_active_created", "owner_id", "is_deleted", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String(50), nullable=False)
@@ -74,10 +145,16 @@ class Wishlist(Base):
 
     is_deleted = Column(Boolean, default=False)
 
+    # Denormalized counters, maintained by database/requests.py in the same transaction
+    # as item and subscription writes (see repair_wishlist_counters)
+    items_count = Column(Integer, nullable=False, default=0, server_default="0")
+    reserved_count = Column(Integer, nullable=False, default=0, server_default="0")
+    subscribers_count = Column(Integer, nullable=False, default=0, server_default="0")
+
     owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
 
     owner = relationship("User", back_populates="wishlists")
-    items = relationship("Item", back_populates="wishlist", cascade="all, delete-orphan")
+    items = relationship("Item", back_populates="wishlist", cascade="all, delete-orphan", order_by="Item.id")
 
     subscriptions = relationship(
         "WishlistSubscription",
@@ -97,6 +174,12 @@ class Wishlist(Base):
 
 class WishlistSubscription(Base):
     __tablename__ = "wishlist_subscriptions"
+    __table_args__ = (
+        # One subscription per (subscriber, wishlist); also serves get_friends_wishlists
+        Index("uq_wishlist_subscriptions_subscriber_wishlist", "subscriber_id", "wishlist_id", unique=True),
+        # get_subscribers_count and other per-wishlist status filters
+        Index("ix_wishlist_subscriptions_wishlist_status", "wishlist_id", "status"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     status = Column(
@@ -132,6 +215,13 @@ class WishlistSubscription(Base):
 class Item(Base):
     """Item model with enhanced validation"""
     __tablename__ = "items"
+    __table_args__ = (
+        # Carousel orderings of get_carousel_item; SQLite appends the rowid (items.id) to every
+        # index entry, so each index also yields the id tie-breaker that keeps positions stable
+        Index("ix_items_wishlist_priority", "wishlist_id", "priority_rank"),
+        Index("ix_items_wishlist_price", "wishlist_id", text("price IS NULL"), "price"),
+        Index("ix_items_wishlist_reserved", "wishlist_id", "is_reserved"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(50), nullable=False)
@@ -145,16 +235,83 @@ class Item(Base):
         nullable=False,
         default=PriorityLevel.MEDIUM
     )
+    # 0 for the highest priority; the enum is stored as text, which doesn't sort by priority
+    priority_rank = Column(
+        Integer,
+        Computed("CASE priority_level WHEN 'high' THEN 0 WHEN 'medium' THEN 1 ELSE 2 END", persisted=False)
+    )
     is_reserved = Column(Boolean, default=False)
+    # Who reserved the item; set together with is_reserved by reserve_item in one conditional UPDATE
+    reserved_by_id = Column(Integer, ForeignKey("users.id"), nullable=True)
 
-    wishlist_id = Column(Integer, ForeignKey("wishlists.id"), nullable=False)
+    wishlist_id = Column(Integer, ForeignKey("wishlists.id"), nullable=False, index=True)
 
     wishlist = relationship("Wishlist", back_populates="items")
+    reserved_by = relationship("User", foreign_keys=[reserved_by_id])
 
     def __repr__(self):
         return f"<Item(id={self.id}, name='{self.name[:15]}...', priority={self.priority_level}>"
 
 
+# FTS5 indexes of item and wishlist texts, created by migration 0008 and kept in sync by triggers
+# on items and wishlists. They are not part of Base.metadata: the rowid is the id of the indexed
+# row, rank its bm25 score, and the column named after the table takes MATCH queries.
+items_fts = table("items_fts", column("rowid", Integer), column("items_fts"), column("rank", Float))
+wishlists_fts = table("wishlists_fts", column("rowid", Integer), column("wishlists_fts"), column("rank", Float))
+SEARCH_TABLES = ("items_fts", "wishlists_fts")
+
+
+class Broadcast(Base):
+    """Admin newsletter with its progress, so an interrupted run can be resumed"""
+    __tablename__ = "broadcasts"
+
+    id = Column(Integer, primary_key=True)
+    status = Column(
+        Enum(BroadcastStatus, values_callable=lambda x: [e.value for e in x]),
+        default=BroadcastStatus.RUNNING,
+        nullable=False,
+        index=True
+    )
+
+    # Message to copy to every user
+    from_chat_id = Column(Integer, nullable=False)
+    message_id = Column(Integer, nullable=False)
+
+    # Admin message that shows live progress
+    status_chat_id = Column(Integer, nullable=False)
+    status_message_id = Column(Integer, nullable=False)
+    language = Column(String(5), nullable=True)
+
+    # Audience filters, see database.requests.iter_audience
+    audience_language = Column(String(5), nullable=True)
+    active_since = Column(DateTime, nullable=True)
+
+    # Keyset cursor: every user with User.id <= last_user_id has been processed
+    last_user_id = Column(Integer, nullable=False, default=0)
+    total = Column(Integer, nullable=False, default=0)
+    success = Column(Integer, nullable=False, default=0)
+    failed = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<Broadcast(id={self.id}, status={self.status}, last_user_id={self.last_user_id})>"
+
+
+ALEMBIC_INI = Path(__file__).resolve().parent.parent / "alembic.ini"
+
+
+def run_migrations(connection) -> None:
+    """Upgrades the schema to the latest Alembic revision on the given connection"""
+    alembic_cfg = AlembicConfig(str(ALEMBIC_INI))
+    alembic_cfg.attributes['connection'] = connection
+
+    inspector = inspect(connection)
+    if inspector.has_table("users") and not inspector.has_table("alembic_version"):
+        # Database was created by Base.metadata.create_all before migrations existed
+        command.stamp(alembic_cfg, "0001")
+
+    command.upgrade(alembic_cfg, "head")
+
+
 async def async_main():
     async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(run_migrations)
@@ -0,0 +1,33 @@
+"""
+Recomputes denormalized Wishlist counters (items, reserved items, approved
+subscribers) from the items and subscriptions tables.
+
+Usage: python -m database.repair_counters [wishlist_id]
+"""
+import asyncio
+import sys
+from typing import Optional
+
+from config.config import load_config
+from database import models
+from database.requests import repair_wishlist_counters
+
+
+async def repair(wishlist_id: Optional[int] = None) -> int:
+    engine = models.setup_engine(load_config().db)
+    async with models.async_session() as session:
+        fixed = await repair_wishlist_counters(session, wishlist_id)
+        await session.commit()
+    await engine.dispose()
+    return fixed
+
+
+def main() -> int:
+    wishlist_id = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    fixed = asyncio.run(repair(wishlist_id))
+    print(f"Fixed counters of {fixed} wishlist(s)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
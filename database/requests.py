@@ -1,57 +1,225 @@
 import logging
+import re
 import uuid
-from datetime import datetime
-from typing import Optional, Union
-from sqlalchemy import select, func, update
-from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy.orm import selectinload, joinedload
-from database.models import User, Wishlist, async_session, Item, WishlistSubscription, SubscriptionStatus, PriorityLevel
+from dataclasses import dataclass
+from datetime import datetime, timedelta, UTC
+from enum import IntEnum
+from typing import AsyncIterator, Optional, Union
+from sqlalchemy import select, func, update, and_, or_, null, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload, joinedload, aliased
+from database.models import User, Wishlist, Item, WishlistSubscription, SubscriptionStatus, PriorityLevel, \
+    Broadcast, BroadcastStatus, items_fts, wishlists_fts
+from database.user_cache import UserIdentity, user_cache
 
 logger = logging.getLogger(__name__)
 
+# How stale User.last_active_at may get before get_or_create_user writes it again
+ACTIVITY_RESOLUTION = timedelta(hours=1)
 
-async def get_or_create_user(telegram_id: int, username: str | None = None) -> User:
-    async with async_session() as session:
-        user = await session.scalar(select(User).where(User.telegram_id == telegram_id))
+SEARCH_PAGE_SIZE = 10
+# Words of the search input beyond this are ignored
+SEARCH_MAX_WORDS = 8
+# Longest prefix the FTS5 prefix index of migration 0008 serves; longer words match whole
+SEARCH_MAX_PREFIX = 4
+_SEARCH_WORD_RE = re.compile(r'\w+')
 
-        if not user:
-            user = User(telegram_id=telegram_id, username=username)
-            session.add(user)
-            await session.commit()
-            await session.refresh(user)
-        elif username is not None and user.username != username:
-            user.username = username
-            await session.commit()
-            await session.refresh(user)
 
+# All functions below work inside the session opened by DatabaseMiddleware for the
+# current update. Writes are flushed, not committed: the middleware commits the
+# whole update as a single transaction (or rolls it back on error).
+
+
+@dataclass
+class WishlistView:
+    """Everything the wishlist screen needs, loaded by get_wishlist_view in one statement"""
+    wishlist: Wishlist
+    owner_username: Optional[str]
+    is_owner: bool
+    items_count: int
+    subscribers_count: int
+    subscription_status: Optional[SubscriptionStatus]
+
+
+class ItemOrder(IntEnum):
+    """Carousel orderings, each served by an index on items (see models.Item)"""
+    ADDED = 0
+    PRIORITY = 1  # highest priority first, then oldest
+    PRICE = 2  # cheapest first, items without a price last
+    UNRESERVED = 3  # free items first, then oldest
+
+
+# Sort keys of an Item entity or alias. Every ordering ends with Item.id, so positions never
+# depend on the order SQLite happens to return
+_ITEM_ORDER_KEYS = {
+    ItemOrder.ADDED: lambda item: (item.id,),
+    ItemOrder.PRIORITY: lambda item: (item.priority_rank, item.id),
+    ItemOrder.PRICE: lambda item: (item.price.is_(None), item.price, item.id),
+    ItemOrder.UNRESERVED: lambda item: (item.is_reserved, item.id),
+}
+
+
+def _item_view_filters(item, only_unreserved: bool, max_price: Optional[int]) -> list:
+    """Which items of a wishlist a carousel view shows, for an Item entity or alias"""
+    filters = []
+    if only_unreserved:
+        filters.append(item.is_reserved == False)
+    if max_price is not None:
+        filters.append(item.price <= max_price)
+    return filters
+
+
+def _sorts_before(keys: tuple, other_keys: tuple):
+    """Lexicographic keys < other_keys. IS compares the NULL prices of items without a price as equal"""
+    return or_(*(
+        and_(*(key.is_not_distinct_from(other) for key, other in zip(keys[:i], other_keys[:i])),
+             keys[i] < other_keys[i])
+        for i in range(len(keys))
+    ))
+
+
+@dataclass
+class CarouselItem:
+    """Single item of the wishlist carousel with its 1-based position in the current view"""
+    item: Item
+    position: int
+    total: int
+    is_owner: bool
+    reserved_by_viewer: bool = False
+    order: ItemOrder = ItemOrder.ADDED
+    only_unreserved: bool = False
+    max_price: Optional[int] = None
+
+
+@dataclass
+class SearchHit:
+    """Item or whole wishlist found by search(); the item fields are None for wishlists"""
+    wishlist_id: int
+    access_uuid: uuid.UUID
+    wishlist_title: str
+    item_id: Optional[int] = None
+    item_name: Optional[str] = None
+    price: Optional[float] = None
+
+
+@dataclass
+class SearchPage:
+    hits: list[SearchHit]
+    next_offset: Optional[int]  # None on the last page
+
+
+async def _bump_wishlist_counter(session: AsyncSession, wishlist_id: int, column: str, delta: int) -> None:
+    """Atomically adds delta to one of the denormalized Wishlist counters"""
+    if not delta:
+        return
+    counter = getattr(Wishlist, column)
+    await session.execute(
+        update(Wishlist)
+        .where(Wishlist.id == wishlist_id)
+        .values({column: counter + delta})
+    )
+
+
+async def get_or_create_user(
+        session: AsyncSession,
+        telegram_id: int,
+        username: str | None = None,
+        language: str | None = None
+) -> User:
+    user = await session.scalar(select(User).where(User.telegram_id == telegram_id))
+    now = datetime.now(UTC).replace(tzinfo=None)
+
+    if not user:
+        user = User(telegram_id=telegram_id, username=username, last_active_at=now)
+        if language is not None:
+            user.language = language
+        session.add(user)
+        await session.flush()
+        user_cache.invalidate(telegram_id)
         return user
 
+    username_changed = username is not None and user.username != username
+    if username_changed:
+        user.username = username
+    if language is not None and user.language != language:
+        user.language = language
+    if user.last_active_at is None or now - user.last_active_at >= ACTIVITY_RESOLUTION:
+        user.last_active_at = now
+
+    if session.is_modified(user):
+        await session.flush()
+
+    if username_changed:
+        user_cache.invalidate(telegram_id)
+    else:
+        user_cache.put(UserIdentity(id=user.id, telegram_id=user.telegram_id, username=user.username))
+
+    return user
 
-async def get_wishlists(user_id: int) -> list[Wishlist]:
+
+async def get_user_identity(
+        session: AsyncSession,
+        telegram_id: int,
+        username: str | None = None,
+        language: str | None = None
+) -> UserIdentity:
+    """
+    Resolves telegram id to the internal user identity, served from user_cache when
+    the username hasn't changed. Falls back to get_or_create_user otherwise.
+    """
+    identity = user_cache.get(telegram_id)
+    if identity and (username is None or identity.username == username):
+        return identity
+
+    user = await get_or_create_user(session, telegram_id, username, language)
+    return UserIdentity(id=user.id, telegram_id=user.telegram_id, username=user.username)
+
+
+async def find_user_identity(session: AsyncSession, telegram_id: int) -> Optional[UserIdentity]:
+    """
+    Like get_user_identity, but read-only: None for a telegram id the bot hasn't met,
+    for updates that must not create users, such as inline queries from any chat
+    """
+    identity = user_cache.get(telegram_id)
+    if identity:
+        return identity
+
+    result = await session.execute(
+        select(User.id, User.telegram_id, User.username).where(User.telegram_id == telegram_id)
+    )
+    row = result.first()
+    if row is None:
+        return None
+
+    identity = UserIdentity(id=row.id, telegram_id=row.telegram_id, username=row.username)
+    user_cache.put(identity)
+    return identity
+
+
+async def get_wishlists(session: AsyncSession, user_id: int) -> list[Wishlist]:
     """Get all active wishlists for specified user"""
-    async with async_session() as session:
-        result = await session.execute(
-            select(Wishlist)
-            .where(Wishlist.owner_id == user_id)
-            .where(Wishlist.is_deleted == False)
-            .order_by(Wishlist.created_at.desc())
-        )
-        return result.scalars().all() or []
+    result = await session.execute(
+        select(Wishlist)
+        .where(Wishlist.owner_id == user_id)
+        .where(Wishlist.is_deleted == False)
+        .order_by(Wishlist.created_at.desc())
+    )
+    return result.scalars().all() or []
 
 
-async def get_friends_wishlists(user_id: int) -> Optional[list[Wishlist]]:
-    async with async_session() as session:
-        result = await session.execute(
-            select(Wishlist)
-            .join(Wishlist.subscriptions)
-            .where(WishlistSubscription.subscriber_id == user_id)
-            .where(Wishlist.is_deleted == False)
-            .order_by(Wishlist.created_at.desc())
-        )
-        return result.scalars().unique().all() or []
+async def get_friends_wishlists(session: AsyncSession, user_id: int) -> Optional[list[Wishlist]]:
+    result = await session.execute(
+        select(Wishlist)
+        .join(Wishlist.subscriptions)
+        .where(WishlistSubscription.subscriber_id == user_id)
+        .where(Wishlist.is_deleted == False)
+        .order_by(Wishlist.created_at.desc())
+    )
+    return result.scalars().unique().all() or []
 
 
 async def create_or_update_wishlist(
+        session: AsyncSession,
         *,
         wishlist_id: Optional[int] = None,
         user_id: int,
@@ -66,50 +234,63 @@ async def create_or_update_wishlist(
     """
     Create or update wishlist
     """
-    async with async_session() as session:
-        query = select(Wishlist)
-
-        if with_owner:
-            query = query.options(joinedload(Wishlist.owner))
-        if with_items:
-            query = query.options(selectinload(Wishlist.items))
-
-        if wishlist_id is not None:
-            query = query.where(Wishlist.id == wishlist_id)
-            wishlist = await session.scalar(query)
-
-            if wishlist:
-                wishlist.title = title
-                wishlist.is_private = is_private
-                if description is not None:
-                    wishlist.description = description
-                if event_date is not None:
-                    wishlist.event_date = event_date
-                await session.commit()
-                await session.refresh(wishlist)
-                return wishlist
-
-        if title is None or is_private is None:
-            raise ValueError("Title and is_private is required for new wishlist")
-        if username:
-            user: User = await get_or_create_user(user_id, username)
-        else:
-            user: User = await get_or_create_user(user_id)
-        wishlist = Wishlist(
-            title=title,
-            is_private=is_private,
-            description=description,
-            event_date=event_date,
-            owner_id=user.id
-        )
+    query = select(Wishlist)
 
-        session.add(wishlist)
-        await session.commit()
-        await session.refresh(wishlist)
-        return wishlist
+    if with_owner:
+        query = query.options(joinedload(Wishlist.owner))
+    if with_items:
+        query = query.options(selectinload(Wishlist.items))
+
+    if wishlist_id is not None:
+        query = query.where(Wishlist.id == wishlist_id)
+        wishlist = await session.scalar(query)
+
+        if wishlist:
+            wishlist.title = title
+            wishlist.is_private = is_private
+            if description is not None:
+                wishlist.description = description
+            if event_date is not None:
+                wishlist.event_date = event_date
+            await session.flush()
+            return wishlist
+
+    if title is None or is_private is None:
+        raise ValueError("Title and is_private is required for new wishlist")
+    if username:
+        user = await get_user_identity(session, user_id, username)
+    else:
+        user = await get_user_identity(session, user_id)
+    wishlist = Wishlist(
+        title=title,
+        is_private=is_private,
+        description=description,
+        event_date=event_date,
+        owner_id=user.id
+    )
+
+    session.add(wishlist)
+    await session.flush()
+    return wishlist
+
+
+def _where_wishlist_identifier(query, wishlist_identifier: Union[int, str, uuid.UUID]):
+    """Filters query by wishlist ID or access UUID, returns None for a malformed UUID"""
+    if isinstance(wishlist_identifier, int):
+        return query.where(Wishlist.id == wishlist_identifier)
+    elif isinstance(wishlist_identifier, (str, uuid.UUID)):
+        try:
+            uuid_obj = uuid.UUID(str(wishlist_identifier)) if isinstance(wishlist_identifier,
+                                                                         str) else wishlist_identifier
+        except ValueError:
+            return None
+        return query.where(Wishlist.access_uuid == uuid_obj)
+    else:
+        raise ValueError("wishlist_identifier must be int or UUID/str")
 
 
 async def get_wishlist(
+        session: AsyncSession,
         wishlist_identifier: Union[int, str, uuid.UUID],
         *,
         with_owner: bool = False,
@@ -121,6 +302,7 @@ async def get_wishlist(
     Retrieve a wishlist by ID or UUID with optional relationships
 
     Args:
+        session: Session of the current update
         wishlist_identifier: Can be:
             - int: Wishlist ID
             - str/UUID: Wishlist access UUID
@@ -135,213 +317,240 @@ async def get_wishlist(
     Raises:
         ValueError: If invalid identifier type provided
     """
-    async with async_session() as session:
-        # Build base query
-        query = select(Wishlist)
+    # Build base query
+    query = select(Wishlist)
 
-        # Handle different identifier types
-        if isinstance(wishlist_identifier, int):
-            query = query.where(Wishlist.id == wishlist_identifier)
-        elif isinstance(wishlist_identifier, (str, uuid.UUID)):
-            try:
-                uuid_obj = uuid.UUID(str(wishlist_identifier)) if isinstance(wishlist_identifier,
-                                                                             str) else wishlist_identifier
-                query = query.where(Wishlist.access_uuid == uuid_obj)
-            except ValueError:
-                return None
-        else:
-            raise ValueError("wishlist_identifier must be int or UUID/str")
+    # Handle different identifier types
+    query = _where_wishlist_identifier(query, wishlist_identifier)
+    if query is None:
+        return None
 
-        # Filter out deleted wishlists if needed
-        if only_active:
-            query = query.where(Wishlist.is_deleted == False)
+    # Filter out deleted wishlists if needed
+    if only_active:
+        query = query.where(Wishlist.is_deleted == False)
 
-        # Eager loading for relationships
-        load_options = []
+    # Eager loading for relationships
+    load_options = []
 
-        if with_owner:
-            load_options.append(joinedload(Wishlist.owner))
-        if with_items:
-            load_options.append(selectinload(Wishlist.items))
-        if with_subscriptions:
-            load_options.append(selectinload(Wishlist.subscriptions))
+    if with_owner:
+        load_options.append(joinedload(Wishlist.owner))
+    if with_items:
+        load_options.append(selectinload(Wishlist.items))
+    if with_subscriptions:
+        load_options.append(selectinload(Wishlist.subscriptions))
 
-        if load_options:
-            query = query.options(*load_options)
+    if load_options:
+        query = query.options(*load_options)
 
-        # Execute query
-        result = await session.execute(query)
-        wishlist = result.scalars().unique().first()
+    # Execute query
+    result = await session.execute(query)
+    wishlist = result.scalars().unique().first()
 
-        return wishlist
+    return wishlist
 
 
-async def get_stats() -> tuple[int, int, int]:
+async def get_wishlist_view(
+        session: AsyncSession,
+        wishlist_identifier: Union[int, str, uuid.UUID],
+        viewer_telegram_id: int
+) -> Optional[WishlistView]:
     """
-    Counts users that use bot and their wishlists and gifts
-
-    :return: Tuple containing (users_count, wishlists_count, gifts_count)
-    :rtype: tuple[int, int, int]
+    Loads an active wishlist together with its header data in a single SELECT:
+    owner username and the viewer's subscription status. Items and subscribers
+    counts come from the denormalized Wishlist counters.
     """
-    async with async_session() as session:
-        # Count users
-        users_query = select(func.count()).select_from(User)
-        users_count = (await session.execute(users_query)).scalar_one()
+    viewer = aliased(User)
+
+    subscription_status = (
+        select(WishlistSubscription.status)
+        .join(viewer, viewer.id == WishlistSubscription.subscriber_id)
+        .where(
+            WishlistSubscription.wishlist_id == Wishlist.id,
+            viewer.telegram_id == viewer_telegram_id
+        )
+        .limit(1)
+        .scalar_subquery()
+    )
 
-        # Count wishlists
-        wishlists_query = select(func.count()).select_from(Wishlist)
-        wishlists_count = (await session.execute(wishlists_query)).scalar_one()
+    query = (
+        select(
+            Wishlist,
+            User.username,
+            User.telegram_id == viewer_telegram_id,
+            subscription_status
+        )
+        .join(Wishlist.owner)
+        .where(Wishlist.is_deleted == False)
+    )
+    query = _where_wishlist_identifier(query, wishlist_identifier)
+    if query is None:
+        return None
 
-        # Count gifts
-        gifts_query = select(func.count()).select_from(Item)
-        gifts_count = (await session.execute(gifts_query)).scalar_one()
+    row = (await session.execute(query)).first()
+    if row is None:
+        return None
 
-        return users_count, wishlists_count, gifts_count
+    wishlist, owner_username, is_owner, status = row
+    return WishlistView(
+        wishlist=wishlist,
+        owner_username=owner_username,
+        is_owner=bool(is_owner),
+        items_count=wishlist.items_count,
+        subscribers_count=wishlist.subscribers_count,
+        subscription_status=status
+    )
 
 
-async def get_all_users_id() -> list[int]:
+async def get_stats(session: AsyncSession) -> tuple[int, int, int]:
     """
-    Gets all users telegram id
+    Counts users that use bot and their wishlists and gifts
 
-    :return: List of ids
+    :return: Tuple containing (users_count, wishlists_count, gifts_count)
+    :rtype: tuple[int, int, int]
     """
-    async with async_session() as session:
-        query = select(User.telegram_id)
-        result = await session.execute(query)
-        return result.scalars().all()
+    # Count users
+    users_query = select(func.count()).select_from(User)
+    users_count = (await session.execute(users_query)).scalar_one()
+
+    # Count wishlists
+    wishlists_query = select(func.count()).select_from(Wishlist)
+    wishlists_count = (await session.execute(wishlists_query)).scalar_one()
+
+    # Count gifts
+    gifts_query = select(func.count()).select_from(Item)
+    gifts_count = (await session.execute(gifts_query)).scalar_one()
 
+    return users_count, wishlists_count, gifts_count
 
-async def delete_wishlist_db(wishlist_id: int) -> bool:
+
+async def delete_wishlist_db(session: AsyncSession, wishlist_id: int) -> bool:
     """
     Soft delete wishlist by marking it as deleted
     """
-    async with async_session() as session:
-        try:
-            result = await session.execute(
-                update(Wishlist)
-                .where(Wishlist.id == wishlist_id)
-                .values(is_deleted=True)
-            )
-            await session.commit()
-            return result.rowcount > 0  # Returns True if any row was affected
-        except SQLAlchemyError as e:
-            logger.error(f"Error deleting wishlist {wishlist_id}: {e}")
-            await session.rollback()
-            return False
+    result = await session.execute(
+        update(Wishlist)
+        .where(Wishlist.id == wishlist_id)
+        .values(is_deleted=True)
+    )
+    return result.rowcount > 0  # Returns True if any row was affected
 
 
 async def get_or_create_subscription(
+        session: AsyncSession,
         subscriber_id: int,
         wishlist_id: int,
         wishlist_owner_id: int,
         status: SubscriptionStatus = SubscriptionStatus.PENDING
 ) -> WishlistSubscription:
-    async with async_session() as session:
-        result = await session.execute(
-            select(WishlistSubscription)
-            .where(
-                WishlistSubscription.subscriber_id == subscriber_id,
-                WishlistSubscription.wishlist_id == wishlist_id
-            )
+    result = await session.execute(
+        select(WishlistSubscription)
+        .where(
+            WishlistSubscription.subscriber_id == subscriber_id,
+            WishlistSubscription.wishlist_id == wishlist_id
         )
-        subscription = result.scalar_one_or_none()
+    )
+    subscription = result.scalar_one_or_none()
 
-        if not subscription:
-            subscription = WishlistSubscription(
-                subscriber_id=subscriber_id,
-                wishlist_id=wishlist_id,
-                wishlist_owner_id=wishlist_owner_id,
-                status=status
-            )
-            session.add(subscription)
-            await session.commit()
-            await session.refresh(subscription)
+    if not subscription:
+        subscription = WishlistSubscription(
+            subscriber_id=subscriber_id,
+            wishlist_id=wishlist_id,
+            wishlist_owner_id=wishlist_owner_id,
+            status=status
+        )
+        session.add(subscription)
+        await session.flush()
+        if status == SubscriptionStatus.APPROVED:
+            await _bump_wishlist_counter(session, wishlist_id, 'subscribers_count', 1)
 
-        return subscription
+    return subscription
 
 
-async def get_subscription(subscriber_id: int, wishlist_id: int) -> Optional[WishlistSubscription]:
-    async with async_session() as session:
-        result = await session.execute(
-            select(WishlistSubscription)
-            .where(
-                WishlistSubscription.subscriber_id == subscriber_id,
-                WishlistSubscription.wishlist_id == wishlist_id
-            )
+async def get_subscription(session: AsyncSession, subscriber_id: int, wishlist_id: int) -> Optional[WishlistSubscription]:
+    result = await session.execute(
+        select(WishlistSubscription)
+        .where(
+            WishlistSubscription.subscriber_id == subscriber_id,
+            WishlistSubscription.wishlist_id == wishlist_id
         )
-        subscription = result.scalar_one_or_none()
-        if subscription:
-            await session.refresh(subscription)
-        return subscription
+    )
+    return result.scalar_one_or_none()
 
 
 async def update_subscription_status(
+        session: AsyncSession,
         subscription_id: int,
         status: SubscriptionStatus
 ) -> WishlistSubscription:
-    async with async_session() as session:
-        result = await session.execute(
-            select(WishlistSubscription)
-            .where(WishlistSubscription.id == subscription_id)
-        )
-        subscription = result.scalar_one()
-        subscription.status = status
-        await session.commit()
-        await session.refresh(subscription)
-        return subscription
+    result = await session.execute(
+        select(WishlistSubscription)
+        .where(WishlistSubscription.id == subscription_id)
+    )
+    subscription = result.scalar_one()
+    was_approved = subscription.status == SubscriptionStatus.APPROVED
+    subscription.status = status
+    await session.flush()
+    await _bump_wishlist_counter(
+        session, subscription.wishlist_id, 'subscribers_count',
+        int(status == SubscriptionStatus.APPROVED) - int(was_approved)
+    )
+    return subscription
 
 
-async def delete_subscription(subscription_id: int) -> None:
-    async with async_session() as session:
-        result = await session.execute(
-            select(WishlistSubscription)
-            .where(WishlistSubscription.id == subscription_id)
-        )
-        subscription = result.scalar_one()
-        await session.delete(subscription)
-        await session.commit()
+async def delete_subscription(session: AsyncSession, subscription_id: int) -> None:
+    result = await session.execute(
+        select(WishlistSubscription)
+        .where(WishlistSubscription.id == subscription_id)
+    )
+    subscription = result.scalar_one()
+    await session.delete(subscription)
+    await session.flush()
+    if subscription.status == SubscriptionStatus.APPROVED:
+        await _bump_wishlist_counter(session, subscription.wishlist_id, 'subscribers_count', -1)
 
 
-async def get_subscription_with_details(subscriber_id: int, wishlist_id: int) -> Optional[WishlistSubscription]:
-    async with async_session() as session:
-        result = await session.execute(
-            select(WishlistSubscription)
-            .options(
-                joinedload(WishlistSubscription.wishlist),
-                joinedload(WishlistSubscription.subscriber)
-            )
-            .where(
-                WishlistSubscription.subscriber_id == subscriber_id,
-                WishlistSubscription.wishlist_id == wishlist_id
-            )
+async def get_subscription_with_details(
+        session: AsyncSession,
+        subscriber_id: int,
+        wishlist_id: int
+) -> Optional[WishlistSubscription]:
+    result = await session.execute(
+        select(WishlistSubscription)
+        .options(
+            joinedload(WishlistSubscription.wishlist),
+            joinedload(WishlistSubscription.subscriber)
+        )
+        .where(
+            WishlistSubscription.subscriber_id == subscriber_id,
+            WishlistSubscription.wishlist_id == wishlist_id
         )
-        return result.scalar_one_or_none()
+    )
+    return result.scalar_one_or_none()
 
 
-async def get_subscribers_count(wishlist_id: int) -> int:
+async def get_subscribers_count(session: AsyncSession, wishlist_id: int) -> int:
     """Получает количество подписчиков вишлиста"""
-    async with async_session() as session:
-        result = await session.execute(
-            select(func.count(WishlistSubscription.id))
-            .where(
-                WishlistSubscription.wishlist_id == wishlist_id,
-                WishlistSubscription.status == SubscriptionStatus.APPROVED
-            )
+    result = await session.execute(
+        select(func.count(WishlistSubscription.id))
+        .where(
+            WishlistSubscription.wishlist_id == wishlist_id,
+            WishlistSubscription.status == SubscriptionStatus.APPROVED
         )
-        return result.scalar() or 0
+    )
+    return result.scalar() or 0
 
 
-async def get_user_language(user_id: int) -> str:
+async def get_user_language(session: AsyncSession, user_id: int) -> str:
     """Получает язык пользователя из базы данных"""
-    async with async_session() as session:
-        result = await session.execute(
-            select(User.language).where(User.telegram_id == user_id)
-        )
-        language = result.scalar_one_or_none()
-        return language or 'ru'  # язык по умолчанию
+    result = await session.execute(
+        select(User.language).where(User.telegram_id == user_id)
+    )
+    language = result.scalar_one_or_none()
+    return language or 'ru'  # язык по умолчанию
 
 
 async def create_or_update_item(
+        session: AsyncSession,
         *,
         item_id: Optional[int] = None,
         wishlist_id: int,
@@ -355,48 +564,506 @@ async def create_or_update_item(
     """
     Создает или обновляет подарок
     """
-    async with async_session() as session:
-        if item_id:
-            # Обновление существующего подарка
-            result = await session.execute(
-                select(Item).where(Item.id == item_id)
-            )
-            item = result.scalar_one()
-
-            item.name = name
-            item.description = description
-            item.link = link
-            item.price = price
-            item.priority_level = priority
-            if photo_id:
-                item.photo_id = photo_id
-        else:
-            # Создание нового подарка
-            item = Item(
+    if item_id:
+        # Обновление существующего подарка
+        result = await session.execute(
+            select(Item).where(Item.id == item_id)
+        )
+        item = result.scalar_one()
+
+        item.name = name
+        item.description = description
+        item.link = link
+        item.price = price
+        item.priority_level = priority
+        if photo_id:
+            item.photo_id = photo_id
+    else:
+        # Создание нового подарка
+        item = Item(
+            wishlist_id=wishlist_id,
+            name=name,
+            description=description,
+            link=link,
+            price=price,
+            priority_level=priority,
+            photo_id=photo_id
+        )
+        session.add(item)
+        await _bump_wishlist_counter(session, wishlist_id, 'items_count', 1)
+
+    await session.flush()
+    return item
+
+
+async def get_item(session: AsyncSession, item_id: int, with_wishlist: bool = False) -> Optional[Item]:
+    """Получает подарок по ID"""
+    query = select(Item)
+
+    if with_wishlist:
+        query = query.options(joinedload(Item.wishlist))
+
+    result = await session.execute(
+        query.where(Item.id == item_id)
+    )
+    return result.scalar_one_or_none()
+
+
+async def get_carousel_item(
+        session: AsyncSession,
+        wishlist_id: int,
+        position: int,
+        viewer_telegram_id: int,
+        order: ItemOrder = ItemOrder.ADDED,
+        only_unreserved: bool = False,
+        max_price: Optional[int] = None
+) -> Optional[CarouselItem]:
+    """
+    Loads only the item at the given 1-based position of an active wishlist, plus the
+    number of items in the view and whether the viewer owns the wishlist or reserved the
+    item, in a single SELECT.
+
+    The position is found in the index of the ordering: the OFFSET walks index entries
+    and only the item found is read from the table. Without a price limit the total
+    comes from the Wishlist counters, with it from a count over the price index.
+
+    :param max_price: Only items with a price not above it
+    """
+    if position < 1:
+        return None
+
+    filters = [Item.wishlist_id == wishlist_id, *_item_view_filters(Item, only_unreserved, max_price)]
+
+    item_id = (
+        select(Item.id)
+        .where(*filters)
+        .order_by(*_ITEM_ORDER_KEYS[order](Item))
+        .offset(position - 1)
+        .limit(1)
+        .scalar_subquery()
+    )
+    if max_price is not None:
+        total = select(func.count()).select_from(Item).where(*filters).scalar_subquery()
+    elif only_unreserved:
+        total = Wishlist.items_count - Wishlist.reserved_count
+    else:
+        total = Wishlist.items_count
+
+    viewer = aliased(User)
+    viewer_id = select(viewer.id).where(viewer.telegram_id == viewer_telegram_id).scalar_subquery()
+
+    result = await session.execute(
+        select(Item, total, User.telegram_id == viewer_telegram_id, Item.reserved_by_id == viewer_id)
+        .join(Item.wishlist)
+        .join(Wishlist.owner)
+        .where(
+            Item.id == item_id,
+            Wishlist.is_deleted == False
+        )
+    )
+    row = result.first()
+    if row is None:
+        return None
+
+    item, total_count, is_owner, reserved_by_viewer = row
+    return CarouselItem(
+        item=item,
+        position=position,
+        total=total_count,
+        is_owner=bool(is_owner),
+        reserved_by_viewer=bool(reserved_by_viewer),
+        order=order,
+        only_unreserved=only_unreserved,
+        max_price=max_price
+    )
+
+
+async def get_item_position(
+        session: AsyncSession,
+        item: Item,
+        order: ItemOrder = ItemOrder.ADDED,
+        only_unreserved: bool = False,
+        max_price: Optional[int] = None
+) -> Optional[int]:
+    """
+    Returns the 1-based position of the item in the carousel view that get_carousel_item
+    shows with the same arguments: one more than the number of items of the view whose
+    sort keys come before the item's. The keys are read from the item's row, so only its
+    id and wishlist_id have to be loaded.
+
+    :return: None if the view doesn't show the item
+    """
+    target = aliased(Item)
+    preceding = (
+        select(func.count(Item.id))
+        .where(
+            Item.wishlist_id == item.wishlist_id,
+            *_item_view_filters(Item, only_unreserved, max_price),
+            _sorts_before(_ITEM_ORDER_KEYS[order](Item), _ITEM_ORDER_KEYS[order](target))
+        )
+        .correlate(target)
+        .scalar_subquery()
+    )
+    result = await session.execute(
+        select(preceding + 1)
+        .where(
+            target.id == item.id,
+            *_item_view_filters(target, only_unreserved, max_price)
+        )
+    )
+    return result.scalar_one_or_none()
+
+
+async def reserve_item(session: AsyncSession, user_id: int, wishlist_id: int, item_id: int) -> bool:
+    """
+    Reserves the item for the user with a single conditional UPDATE, so concurrent
+    reservers of the same item resolve in the database without locks: exactly one
+    of them changes the row, the others see rowcount 0.
+
+    The UPDATE only matches a free item of an active wishlist that the user doesn't
+    own and may see (public, or private with an approved subscription).
+
+    :return: True if this call reserved the item, False otherwise
+    """
+    approved = (
+        select(WishlistSubscription.id)
+        .where(
+            WishlistSubscription.subscriber_id == user_id,
+            WishlistSubscription.wishlist_id == wishlist_id,
+            WishlistSubscription.status == SubscriptionStatus.APPROVED
+        )
+        .exists()
+    )
+    visible = (
+        select(Wishlist.id)
+        .where(
+            Wishlist.id == wishlist_id,
+            Wishlist.is_deleted == False,
+            Wishlist.owner_id != user_id,
+            or_(Wishlist.is_private == False, approved)
+        )
+        .exists()
+    )
+    result = await session.execute(
+        update(Item)
+        .where(
+            Item.id == item_id,
+            Item.wishlist_id == wishlist_id,
+            Item.is_reserved == False,
+            visible
+        )
+        .values(is_reserved=True, reserved_by_id=user_id)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        return False
+
+    await _bump_wishlist_counter(session, wishlist_id, 'reserved_count', 1)
+    return True
+
+
+async def unreserve_item(session: AsyncSession, user_id: int, wishlist_id: int, item_id: int) -> bool:
+    """
+    Cancels the user's own reservation with a single conditional UPDATE.
+
+    :return: True if this call released the item, False if the user didn't hold it
+    """
+    result = await session.execute(
+        update(Item)
+        .where(
+            Item.id == item_id,
+            Item.wishlist_id == wishlist_id,
+            Item.is_reserved == True,
+            Item.reserved_by_id == user_id
+        )
+        .values(is_reserved=False, reserved_by_id=None)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        return False
+
+    await _bump_wishlist_counter(session, wishlist_id, 'reserved_count', -1)
+    return True
+
+
+def search_query(text: str) -> Optional[str]:
+    """
+    FTS5 query of user input; None if it has no words. Every word is quoted, so
+    FTS5 syntax in the input is searched literally, and all words must match.
+
+    Words of two to SEARCH_MAX_PREFIX letters match as prefixes, so results come
+    while a word is being typed. A prefix without an index of its length makes
+    FTS5 merge the doclists of every matching term in the table on each lookup,
+    so longer words only match whole.
+    """
+    words = _SEARCH_WORD_RE.findall(text)[:SEARCH_MAX_WORDS]
+    return ' '.join(
+        f'"{word}"*' if 1 < len(word) <= SEARCH_MAX_PREFIX else f'"{word}"' for word in words
+    ) or None
+
+
+def _search_scope(user_id: int):
+    """Ids of the wishlists search() looks in: the user's own and the approved subscriptions"""
+    return union_all(
+        select(Wishlist.id).where(Wishlist.owner_id == user_id),
+        select(WishlistSubscription.wishlist_id).where(
+            WishlistSubscription.subscriber_id == user_id,
+            WishlistSubscription.status == SubscriptionStatus.APPROVED
+        )
+    )
+
+
+async def search(
+        session: AsyncSession,
+        user_id: int,
+        text: str,
+        offset: int = 0,
+        limit: int = SEARCH_PAGE_SIZE
+) -> SearchPage:
+    """
+    Full-text search over item names and descriptions and wishlist titles and
+    descriptions, limited to the user's own wishlists and the ones with an
+    approved subscription. Hits of both kinds are ordered by their bm25 rank
+    together; one extra row tells whether there is a next page.
+
+    The search starts from the user's scope, not from the FTS index: every item
+    of a visible wishlist is looked up in the index by rowid. A common word
+    matches a share of all items in the database, while the scope stays a few
+    dozen items however large the database grows.
+    """
+    query = search_query(text)
+    if query is None:
+        return SearchPage(hits=[], next_offset=None)
+
+    scope = _search_scope(user_id)
+    item_rank = (
+        select(items_fts.c.rank)
+        .where(items_fts.c.rowid == Item.id, items_fts.c.items_fts.op('MATCH')(query))
+        .scalar_subquery()
+    )
+    wishlist_rank = (
+        select(wishlists_fts.c.rank)
+        .where(wishlists_fts.c.rowid == Wishlist.id, wishlists_fts.c.wishlists_fts.op('MATCH')(query))
+        .scalar_subquery()
+    )
+
+    # Materialized, so the rank of every row is computed once and only read by the filter and the sort
+    hits = union_all(
+        select(Wishlist.id.label('wishlist_id'), Wishlist.access_uuid, Wishlist.title, Item.id.label('item_id'),
+               Item.name, Item.price, item_rank.label('rank'))
+        .join(Item.wishlist)
+        .where(Item.wishlist_id.in_(scope), Wishlist.is_deleted == False),
+        select(Wishlist.id, Wishlist.access_uuid, Wishlist.title, null(), null(), null(),
+               wishlist_rank.label('rank'))
+        .where(Wishlist.id.in_(scope), Wishlist.is_deleted == False)
+    ).cte('hits').prefix_with('MATERIALIZED')
+
+    result = await session.execute(
+        select(hits)
+        .where(hits.c.rank.is_not(None))
+        # Ids break ties of equal ranks, so pages don't overlap
+        .order_by(hits.c.rank, hits.c.wishlist_id, hits.c.item_id)
+        .offset(offset)
+        .limit(limit + 1)
+    )
+    rows = result.all()
+    return SearchPage(
+        hits=[
+            SearchHit(
                 wishlist_id=wishlist_id,
-                name=name,
-                description=description,
-                link=link,
-                price=price,
-                priority_level=priority,
-                photo_id=photo_id
+                access_uuid=access_uuid,
+                wishlist_title=wishlist_title,
+                item_id=item_id,
+                item_name=item_name,
+                price=price
             )
-            session.add(item)
+            for wishlist_id, access_uuid, wishlist_title, item_id, item_name, price, _ in rows[:limit]
+        ],
+        next_offset=offset + limit if len(rows) > limit else None
+    )
 
-        await session.commit()
-        await session.refresh(item)
-        return item
 
+async def get_found_item(session: AsyncSession, item_id: int, user_id: int) -> Optional[Item]:
+    """
+    The item if search() could have found it for the user: it belongs to an active
+    wishlist of the user's search scope. None otherwise, so a forged OpenItem button
+    can't open an item of somebody else's wishlist
+    """
+    result = await session.execute(
+        select(Item)
+        .join(Item.wishlist)
+        .where(
+            Item.id == item_id,
+            Item.wishlist_id.in_(_search_scope(user_id)),
+            Wishlist.is_deleted == False
+        )
+    )
+    return result.scalar_one_or_none()
 
-async def get_item(item_id: int, with_wishlist: bool = False) -> Optional[Item]:
-    """Получает подарок по ID"""
-    async with async_session() as session:
-        query = select(Item)
 
-        if with_wishlist:
-            query = query.options(joinedload(Item.wishlist))
+async def repair_wishlist_counters(session: AsyncSession, wishlist_id: Optional[int] = None) -> int:
+    """
+    Recomputes denormalized Wishlist counters from items and subscriptions.
+
+    :param wishlist_id: Repair a single wishlist, all wishlists if None
+    :return: Number of wishlists whose counters were wrong and got fixed
+    """
+    items_count = (
+        select(func.count(Item.id))
+        .where(Item.wishlist_id == Wishlist.id)
+        .scalar_subquery()
+    )
+    reserved_count = (
+        select(func.count(Item.id))
+        .where(Item.wishlist_id == Wishlist.id, Item.is_reserved == True)
+        .scalar_subquery()
+    )
+    subscribers_count = (
+        select(func.count(WishlistSubscription.id))
+        .where(
+            WishlistSubscription.wishlist_id == Wishlist.id,
+            WishlistSubscription.status == SubscriptionStatus.APPROVED
+        )
+        .scalar_subquery()
+    )
+
+    query = (
+        update(Wishlist)
+        .where(
+            (Wishlist.items_count != items_count)
+            | (Wishlist.reserved_count != reserved_count)
+            | (Wishlist.subscribers_count != subscribers_count)
+        )
+        .values(
+            items_count=items_count,
+            reserved_count=reserved_count,
+            subscribers_count=subscribers_count
+        )
+        .execution_options(synchronize_session=False)
+    )
+    if wishlist_id is not None:
+        query = query.where(Wishlist.id == wishlist_id)
+
+    result = await session.execute(query)
+    return result.rowcount
+
+
+def _where_audience(query, language: Optional[str], active_since: Optional[datetime]):
+    if language is not None:
+        query = query.where(User.language == language)
+    if active_since is not None:
+        query = query.where(User.last_active_at >= active_since)
+    return query
+
+
+async def get_users_count(
+        session: AsyncSession,
+        *,
+        language: Optional[str] = None,
+        active_since: Optional[datetime] = None
+) -> int:
+    """Counts users matching the same filters as iter_audience"""
+    query = _where_audience(select(func.count()).select_from(User), language, active_since)
+    result = await session.execute(query)
+    return result.scalar_one()
+
+
+async def iter_audience(
+        session: AsyncSession,
+        *,
+        language: Optional[str] = None,
+        active_since: Optional[datetime] = None,
+        after_user_id: int = 0,
+        chunk_size: int = 500
+) -> AsyncIterator[list[tuple[int, int]]]:
+    """
+    Streams users in keyset-paginated chunks ordered by internal id, so memory stays
+    constant however many users there are. Every chunk is a separate SELECT, the
+    caller may commit the session between chunks.
+
+    :param language: Only users with this User.language
+    :param active_since: Only users seen by the bot at or after this moment
+    :param after_user_id: Keyset cursor, resume after this User.id
+    :return: Chunks of (user id, telegram id)
+    """
+    query = _where_audience(select(User.id, User.telegram_id), language, active_since)
 
+    while True:
         result = await session.execute(
-            query.where(Item.id == item_id)
+            query
+            .where(User.id > after_user_id)
+            .order_by(User.id)
+            .limit(chunk_size)
         )
-        return result.scalar_one_or_none()
+        chunk = [(user_id, telegram_id) for user_id, telegram_id in result.all()]
+        if not chunk:
+            return
+
+        yield chunk
+        if len(chunk) < chunk_size:
+            return
+        after_user_id = chunk[-1][0]
+
+
+async def create_broadcast(
+        session: AsyncSession,
+        *,
+        from_chat_id: int,
+        message_id: int,
+        status_chat_id: int,
+        status_message_id: int,
+        language: Optional[str],
+        total: Optional[int] = None,
+        audience_language: Optional[str] = None,
+        active_since: Optional[datetime] = None
+) -> Broadcast:
+    """
+    :param language: Language of the admin's status message, not an audience filter
+    :param total: Size of the audience; counted with the audience filters if None
+    :param audience_language: Only users with this User.language, every user if None
+    :param active_since: Only users seen by the bot at or after this moment
+    """
+    if total is None:
+        total = await get_users_count(session, language=audience_language, active_since=active_since)
+    broadcast = Broadcast(
+        from_chat_id=from_chat_id,
+        message_id=message_id,
+        status_chat_id=status_chat_id,
+        status_message_id=status_message_id,
+        language=language,
+        total=total,
+        audience_language=audience_language,
+        active_since=active_since
+    )
+    session.add(broadcast)
+    await session.flush()
+    return broadcast
+
+
+async def get_running_broadcasts(session: AsyncSession) -> list[Broadcast]:
+    """Broadcasts that were interrupted before finishing"""
+    result = await session.execute(
+        select(Broadcast)
+        .where(Broadcast.status == BroadcastStatus.RUNNING)
+        .order_by(Broadcast.id)
+    )
+    return result.scalars().all()
+
+
+async def save_broadcast_progress(
+        session: AsyncSession,
+        broadcast_id: int,
+        *,
+        last_user_id: int,
+        success: int,
+        failed: int,
+        finished: bool = False
+) -> None:
+    values = dict(last_user_id=last_user_id, success=success, failed=failed)
+    if finished:
+        values['status'] = BroadcastStatus.FINISHED
+    await session.execute(
+        update(Broadcast)
+        .where(Broadcast.id == broadcast_id)
+        .values(**values)
+    )
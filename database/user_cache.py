@@ -0,0 +1,62 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+
+@dataclass(frozen=True)
+class UserIdentity:
+    """Detached snapshot of a User row, safe to keep between updates"""
+    id: int
+    telegram_id: int
+    username: Optional[str]
+
+
+class UserIdentityCache:
+    """
+    Bounded LRU cache of telegram_id -> UserIdentity with a TTL per entry.
+
+    Only rows that are already committed get cached; writes invalidate the key so
+    the next lookup reads the row again after the transaction is over.
+    """
+
+    def __init__(self, maxsize: int = 10_000, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[int, tuple[float, UserIdentity]] = OrderedDict()
+
+    def get(self, telegram_id: int) -> Optional[UserIdentity]:
+        entry = self._entries.get(telegram_id)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[telegram_id]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(telegram_id)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, identity: UserIdentity) -> None:
+        self._entries[identity.telegram_id] = (time.monotonic() + self.ttl, identity)
+        self._entries.move_to_end(identity.telegram_id)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, telegram_id: int) -> None:
+        self._entries.pop(telegram_id, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+
+user_cache = UserIdentityCache()
@@ -0,0 +1,253 @@
+import asyncio
+import logging
+from typing import Optional
+
+from aiogram import Bot
+from aiogram.types import InlineKeyboardMarkup
+from aiogram.exceptions import TelegramRetryAfter, TelegramBadRequest, TelegramForbiddenError, TelegramAPIError
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.models import Broadcast, async_session
+from database.requests import iter_audience, save_broadcast_progress, get_running_broadcasts
+from keyboards.keyboard_utils import create_static_inline_kb
+
+logger = logging.getLogger(__name__)
+
+# Telegram allows about 30 messages per second overall and 1 per second per chat
+GLOBAL_RATE = 25.0
+PER_CHAT_INTERVAL = 1.0
+CONCURRENCY = 20
+CHUNK_SIZE = 500
+SAVE_EVERY = 25  # sends between progress commits, about one per second at GLOBAL_RATE
+MAX_RETRIES = 3
+PROGRESS_INTERVAL = 5.0  # seconds between status message edits
+
+# Keeps references to running broadcast tasks so they aren't garbage collected
+_tasks: set[asyncio.Task] = set()
+
+
+class TokenBucket:
+    """Async token bucket: `rate` tokens per second, bursts up to `capacity`"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._loop = asyncio.get_running_loop()
+        self._updated = self._loop.time()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float) -> None:
+        """Stops handing out tokens for `seconds`, e.g. after a flood-wait"""
+        self._paused_until = max(self._paused_until, self._loop.time() + seconds)
+        self._updated = self._paused_until
+        self._tokens = 0
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = self._loop.time()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class Broadcaster:
+    """
+    Copies one message to every user with bounded concurrency and rate limits.
+
+    Users are streamed by iter_audience in keyset-ordered chunks. Sends within
+    a chunk run concurrently but are collected in user id order, and every
+    `save_every` collected sends the cursor and counters are committed to the
+    broadcasts table. After a crash the run continues from the last commit, so
+    at most about `save_every + concurrency` users get the message twice.
+    """
+
+    def __init__(
+            self,
+            bot: Bot,
+            broadcast: Broadcast,
+            i18n: dict,
+            *,
+            concurrency: int = CONCURRENCY,
+            rate: float = GLOBAL_RATE,
+            per_chat_interval: float = PER_CHAT_INTERVAL,
+            chunk_size: int = CHUNK_SIZE,
+            save_every: int = SAVE_EVERY,
+            progress_interval: float = PROGRESS_INTERVAL
+    ):
+        self.bot = bot
+        self.broadcast_id = broadcast.id
+        self.from_chat_id = broadcast.from_chat_id
+        self.message_id = broadcast.message_id
+        self.status_chat_id = broadcast.status_chat_id
+        self.status_message_id = broadcast.status_message_id
+        self.total = broadcast.total
+        self.cursor = broadcast.last_user_id
+        self.success = broadcast.success
+        self.failed = broadcast.failed
+        self.audience_language = broadcast.audience_language
+        self.active_since = broadcast.active_since
+        self.i18n = i18n
+
+        self.concurrency = concurrency
+        self.rate = rate
+        self.per_chat_interval = per_chat_interval
+        self.chunk_size = chunk_size
+        self.save_every = save_every
+        self.progress_interval = progress_interval
+
+        self._bucket: Optional[TokenBucket] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._chat_ready_at: dict[int, float] = {}
+        self._last_progress = 0.0
+
+    async def run(self) -> tuple[int, int]:
+        self._bucket = TokenBucket(self.rate)
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+
+        logger.info('Broadcast %s started from user id %s', self.broadcast_id, self.cursor)
+
+        async with async_session() as session:
+            audience = iter_audience(
+                session,
+                language=self.audience_language,
+                active_since=self.active_since,
+                after_user_id=self.cursor,
+                chunk_size=self.chunk_size
+            )
+            async for chunk in audience:
+                await self._send_chunk(session, chunk)
+                # Committing also ends the read transaction, so no snapshot is held while sending
+                await self._checkpoint(session)
+
+            await self._save_progress(session, finished=True)
+        await self._edit_status(self.i18n['admin_newsletter_stats'].format(
+            total=self.total,
+            success=self.success,
+            failed=self.failed
+        ), reply_markup=create_static_inline_kb(1, self.i18n, admin='back_button'))
+        logger.info('Broadcast %s finished: success=%s, failed=%s', self.broadcast_id, self.success, self.failed)
+        return self.success, self.failed
+
+    async def _send_chunk(self, session: AsyncSession, chunk: list[tuple[int, int]]) -> None:
+        # The semaphore lets sends start in order; awaiting them in order keeps the
+        # cursor below every user whose send hasn't finished yet
+        sends = [asyncio.create_task(self._send(telegram_id)) for _, telegram_id in chunk]
+        try:
+            for done, ((user_id, _), send) in enumerate(zip(chunk, sends), 1):
+                if await send:
+                    self.success += 1
+                else:
+                    self.failed += 1
+                self.cursor = user_id
+                if done % self.save_every == 0:
+                    await self._checkpoint(session)
+        finally:
+            for send in sends:
+                send.cancel()
+
+    async def _checkpoint(self, session: AsyncSession) -> None:
+        """Commits progress and, at most every `progress_interval`, updates the status message"""
+        await self._save_progress(session, finished=False)
+        loop = asyncio.get_running_loop()
+        if loop.time() - self._last_progress >= self.progress_interval:
+            self._last_progress = loop.time()
+            await self._edit_status(self.i18n['admin_newsletter_progress'].format(
+                done=self.success + self.failed,
+                total=self.total,
+                success=self.success,
+                failed=self.failed
+            ))
+
+    async def _send(self, chat_id: int) -> bool:
+        async with self._semaphore:
+            for attempt in range(MAX_RETRIES + 1):
+                await self._bucket.acquire()
+                await self._wait_for_chat(chat_id)
+                try:
+                    await self.bot.copy_message(
+                        chat_id=chat_id,
+                        from_chat_id=self.from_chat_id,
+                        message_id=self.message_id
+                    )
+                    self._chat_ready_at.pop(chat_id, None)
+                    return True
+                except TelegramRetryAfter as e:
+                    logger.warning('Flood control on broadcast %s, sleeping %s s', self.broadcast_id, e.retry_after)
+                    self._bucket.pause(e.retry_after)
+                except (TelegramForbiddenError, TelegramBadRequest) as e:
+                    # Bot blocked, chat not found etc. - retrying won't help
+                    logger.info('Failed to send to %s: %s', chat_id, e)
+                    return False
+                except TelegramAPIError as e:
+                    logger.error('Failed to send to %s (attempt %s): %s', chat_id, attempt + 1, e)
+            self._chat_ready_at.pop(chat_id, None)
+            return False
+
+    async def _wait_for_chat(self, chat_id: int) -> None:
+        loop = asyncio.get_running_loop()
+        ready_at = self._chat_ready_at.get(chat_id, 0.0)
+        now = loop.time()
+        if ready_at > now:
+            await asyncio.sleep(ready_at - now)
+        self._chat_ready_at[chat_id] = max(now, ready_at) + self.per_chat_interval
+
+    async def _save_progress(self, session: AsyncSession, finished: bool) -> None:
+        await save_broadcast_progress(
+            session,
+            self.broadcast_id,
+            last_user_id=self.cursor,
+            success=self.success,
+            failed=self.failed,
+            finished=finished
+        )
+        await session.commit()
+
+    async def _edit_status(self, text: str, reply_markup: Optional[InlineKeyboardMarkup] = None) -> None:
+        try:
+            await self.bot.edit_message_text(
+                text=text,
+                chat_id=self.status_chat_id,
+                message_id=self.status_message_id,
+                reply_markup=reply_markup
+            )
+        except TelegramAPIError as e:
+            logger.debug('Could not update broadcast status message: %s', e)
+
+
+def _broadcast_done(task: asyncio.Task) -> None:
+    _tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        # Nobody awaits the task, so this is the only place the error shows up.
+        # The broadcast stays running in the database and is resumed on the next start
+        logger.error('Broadcast task %s failed', task.get_name(), exc_info=task.exception())
+
+
+def start_broadcast(bot: Bot, broadcast: Broadcast, i18n: dict, **kwargs) -> asyncio.Task:
+    """Runs the broadcast in a background task, so the update that started it returns right away"""
+    task = asyncio.create_task(Broadcaster(bot, broadcast, i18n, **kwargs).run(),
+                               name=f'broadcast-{broadcast.id}')
+    _tasks.add(task)
+    task.add_done_callback(_broadcast_done)
+    return task
+
+
+async def resume_broadcasts(bot: Bot, translations: dict) -> None:
+    """Restarts broadcasts that were interrupted by a crash or restart"""
+    async with async_session() as session:
+        broadcasts = await get_running_broadcasts(session)
+
+    for broadcast in broadcasts:
+        i18n = translations.get(broadcast.language) or translations[translations['default']]
+        logger.info('Resuming broadcast %s', broadcast.id)
+        start_broadcast(bot, broadcast, i18n)
@@ -0,0 +1,212 @@
+"""
+In-process metrics registry rendered in the Prometheus text format.
+
+Histograms use fixed buckets, so observing is a bisect and two additions;
+quantiles for the admin report are interpolated from the buckets the same way
+Prometheus' histogram_quantile() does.
+"""
+import logging
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Optional
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+# Seconds, from 1 ms to 10 s
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelValues = tuple[str, ...]
+
+
+def _escape_label(value: str) -> str:
+    """Backslash, double quote and line feed are the escapes of label values in the text format"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: tuple[str, ...], values: LabelValues, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _HistogramSeries:
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self, size: int):
+        self.counts = [0] * size
+        self.sum = 0.0
+        self.count = 0
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labels: tuple[str, ...] = (), buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self._series: dict[LabelValues, _HistogramSeries] = {}
+
+    def observe(self, value: float, *label_values: str) -> None:
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series[label_values] = _HistogramSeries(len(self.buckets) + 1)
+        series.counts[bisect_left(self.buckets, value)] += 1
+        series.sum += value
+        series.count += 1
+
+    def quantile(self, q: float, *label_values: str) -> Optional[float]:
+        series = self._series.get(label_values)
+        if series is None or not series.count:
+            return None
+
+        rank = q * series.count
+        cumulative = 0
+        for i, count in enumerate(series.counts):
+            if cumulative + count >= rank and count:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-1]
+
+    def series(self) -> dict[LabelValues, _HistogramSeries]:
+        return self._series
+
+    def render(self) -> list[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        for values, series in sorted(self._series.items()):
+            cumulative = 0
+            labels = _format_labels(self.labels, values)
+            for bound, count in zip(self.buckets, series.counts):
+                cumulative += count
+                le = 'le="%s"' % bound
+                lines.append(f'{self.name}_bucket{_format_labels(self.labels, values, le)} {cumulative}')
+            le = 'le="+Inf"'
+            lines.append(f'{self.name}_bucket{_format_labels(self.labels, values, le)} {series.count}')
+            lines.append(f'{self.name}_sum{labels} {series.sum}')
+            lines.append(f'{self.name}_count{labels} {series.count}')
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self.value = 0
+
+    def inc(self, amount: int = 1) -> None:
+        self.value += amount
+
+    def render(self) -> list[str]:
+        return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter', f'{self.name} {self.value}']
+
+
+class Gauge:
+    """
+    Value read from a callback at scrape time, so nothing has to keep it up to date.
+    With kind='counter' the callback reads a monotonic total, which rate() can use
+    """
+
+    def __init__(self, name: str, help_text: str, read: Callable[[], float], kind: str = 'gauge'):
+        self.name = name
+        self.help = help_text
+        self.read = read
+        self.kind = kind
+
+    def render(self) -> list[str]:
+        try:
+            value = self.read()
+        except Exception as e:
+            logger.debug('Gauge %s failed: %s', self.name, e)
+            return []
+        return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}', f'{self.name} {value}']
+
+
+class UpdateQueries:
+    """SQL statements issued while one handler runs, see HandlerMetricsMiddleware"""
+    __slots__ = ('count', 'statements')
+
+    def __init__(self):
+        self.count = 0
+        self.statements: dict[str, int] = {}
+
+    def add(self, statement: str) -> None:
+        self.count += 1
+        self.statements[statement] = self.statements.get(statement, 0) + 1
+
+    def repeated(self, times: int) -> dict[str, int]:
+        """Statements issued at least `times` times, the usual sign of an N+1 loop"""
+        return {statement: n for statement, n in self.statements.items() if n >= times}
+
+
+# Set for the duration of a handler call; the engine's cursor events add to it
+current_queries: ContextVar[Optional[UpdateQueries]] = ContextVar('current_queries', default=None)
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.handler_duration = Histogram(
+            'bot_handler_duration_seconds',
+            'Time spent in a handler, by handler, event type and callback data prefix',
+            labels=('handler', 'event', 'prefix')
+        )
+        self.sql_duration = Histogram(
+            'db_query_duration_seconds',
+            'Time spent executing SQL statements, by statement type',
+            labels=('statement',)
+        )
+        self.handler_queries = Histogram(
+            'bot_handler_queries',
+            'SQL statements issued by one handler call, by handler',
+            labels=('handler',),
+            buckets=(1, 2, 3, 5, 8, 13, 21, 34, 55)
+        )
+        self.sessions_opened = Counter('db_sessions_opened_total', 'Database sessions opened for updates')
+        self.sessions_active = 0
+        self._gauges: dict[str, Gauge] = {}
+        self.gauge('db_sessions_active', 'Database sessions currently open for updates', lambda: self.sessions_active)
+
+    def gauge(self, name: str, help_text: str, read: Callable[[], float]) -> None:
+        self._gauges[name] = Gauge(name, help_text, read)
+
+    def counter(self, name: str, help_text: str, read: Callable[[], float]) -> None:
+        """Registers a total kept elsewhere, read at scrape time; `name` should end with _total"""
+        self._gauges[name] = Gauge(name, help_text, read, kind='counter')
+
+    def render(self) -> str:
+        lines = (self.handler_duration.render() + self.sql_duration.render() + self.handler_queries.render()
+                 + self.sessions_opened.render())
+        for gauge in self._gauges.values():
+            lines.extend(gauge.render())
+        return '\n'.join(lines) + '\n'
+
+    def gauges(self) -> dict[str, float]:
+        values = {}
+        for name, gauge in self._gauges.items():
+            try:
+                values[name] = gauge.read()
+            except Exception:
+                continue
+        return values
+
+
+metrics = MetricsRegistry()
+
+
+async def _metrics_view(request: web.Request) -> web.Response:
+    return web.Response(text=metrics.render(), content_type='text/plain', charset='utf-8')
+
+
+async def start_metrics_server(host: str, port: int) -> web.AppRunner:
+    """Serves GET /metrics on host:port until the returned runner is cleaned up"""
+    app = web.Application()
+    app.router.add_get('/metrics', _metrics_view)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info('Metrics available on http://%s:%s/metrics', host, port)
+    return runner
@@ -1,3 +1,4 @@
+import html
 import logging
 
 from aiogram import Router, F, Bot
@@ -5,9 +6,14 @@ from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 from aiogram.types import Message, CallbackQuery
 
-from database.requests import get_stats, get_all_users_id
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.requests import get_stats, create_broadcast
+from external_services.broadcast import start_broadcast
+from external_services.metrics import metrics, Histogram
 from filters.is_admin import IsAdmin
-from keyboards.keyboard_utils import create_inline_kb
+from handlers.handlers_utils import to_message_ref
+from keyboards.keyboard_utils import create_static_inline_kb
 from states.states import AdminState
 
 admin_router = Router()
@@ -17,9 +23,9 @@ logger = logging.getLogger(__name__)
 
 @admin_router.message(IsAdmin, Command('admin'))
 async def admin_panel(message: Message, i18n: dict[str, str]):
-    keyboard = create_inline_kb(1, i18n,
-                                admin_newsletter='admin_newsletter_btn',
-                                admin_statistic='admin_statistic_btn')
+    keyboard = create_static_inline_kb(1, i18n,
+                                       admin_newsletter='admin_newsletter_btn',
+                                       admin_statistic='admin_statistic_btn')
 
     await message.answer(i18n.get('admin_welcome'),
                          reply_markup=keyboard)
@@ -29,20 +35,46 @@ async def admin_panel(message: Message, i18n: dict[str, str]):
 async def admin_panel(callback: CallbackQuery, i18n: dict[str, str], state: FSMContext):
     await state.clear()
     await callback.answer()
-    keyboard = create_inline_kb(1, i18n,
-                                admin_newsletter='admin_newsletter_btn',
-                                admin_statistic='admin_statistic_btn')
+    keyboard = create_static_inline_kb(1, i18n,
+                                       admin_newsletter='admin_newsletter_btn',
+                                       admin_statistic='admin_statistic_btn')
 
     await callback.message.edit_text(i18n.get('admin_welcome'),
                                      reply_markup=keyboard)
 
 
+def _latency_lines(histogram: Histogram) -> list[str]:
+    lines = []
+    for labels, series in sorted(histogram.series().items(), key=lambda item: -item[1].count):
+        p50 = histogram.quantile(0.5, *labels) * 1000
+        p99 = histogram.quantile(0.99, *labels) * 1000
+        name = ' '.join(label for label in labels if label)
+        lines.append(f'{name}: {p50:.0f} / {p99:.0f} ({series.count})')
+    return lines
+
+
+@admin_router.message(IsAdmin, Command('metrics'))
+async def admin_metrics(message: Message, i18n: dict[str, str]):
+    lines = _latency_lines(metrics.handler_duration)
+    if not lines:
+        await message.answer(i18n.get('admin_metrics_empty'))
+        return
+
+    lines.append('')
+    lines.extend(f'sql {line}' for line in _latency_lines(metrics.sql_duration))
+    lines.append('')
+    lines.extend(f'{name}: {value}' for name, value in metrics.gauges().items())
+
+    text = '\n'.join(lines)
+    await message.answer(f"{i18n.get('admin_metrics_header')}\n<pre>{html.escape(text[:3900])}</pre>")
+
+
 @admin_router.callback_query(IsAdmin, F.data == 'admin_statistic')
-async def admin_statistic(callback: CallbackQuery, i18n: dict[str, str]):
-    keyboard = create_inline_kb(1, i18n, admin='back_button')
+async def admin_statistic(callback: CallbackQuery, i18n: dict[str, str], session: AsyncSession):
+    keyboard = create_static_inline_kb(1, i18n, admin='back_button')
     await callback.answer()
 
-    users_count, wishlists_count, gifts_count = await get_stats()
+    users_count, wishlists_count, gifts_count = await get_stats(session)
 
     stats_text = i18n.get('admin_statistics_text').format(
         users_count=users_count,
@@ -58,7 +90,7 @@ async def admin_statistic(callback: CallbackQuery, i18n: dict[str, str]):
 
 @admin_router.callback_query(IsAdmin, F.data == 'admin_newsletter')
 async def admin_newsletter(callback: CallbackQuery, i18n: dict[str, str], state: FSMContext):
-    keyboard = create_inline_kb(1, i18n, admin='back_button')
+    keyboard = create_static_inline_kb(1, i18n, admin='back_button')
 
     await callback.answer()
 
@@ -71,8 +103,8 @@ async def admin_newsletter(callback: CallbackQuery, i18n: dict[str, str], state:
 
 @admin_router.message(AdminState.waiting_newsletter_message)
 async def confirm_newsletter(message: Message, state: FSMContext, i18n: dict[str, str]):
-    await state.update_data(newsletter_message=message)
-    keyboard = create_inline_kb(2, i18n, confirm_newsletter='confirm_yes', cancel_newsletter='confirm_no')
+    await state.update_data(newsletter_message=to_message_ref(message))
+    keyboard = create_static_inline_kb(2, i18n, confirm_newsletter='confirm_yes', cancel_newsletter='confirm_no')
 
     await message.answer(
         text=i18n.get('admin_newsletter_confirm'),
@@ -81,7 +113,7 @@ async def confirm_newsletter(message: Message, state: FSMContext, i18n: dict[str
 
 
 @admin_router.callback_query(IsAdmin, F.data == 'confirm_newsletter')
-async def process_confirm_newsletter(callback: CallbackQuery, state: FSMContext, bot: Bot, i18n: dict[str, str]):
+async def process_confirm_newsletter(callback: CallbackQuery, state: FSMContext, bot: Bot, i18n: dict[str, str], session: AsyncSession):
     await callback.answer()
 
     logger.info('Newsletter confirmed')
@@ -94,28 +126,24 @@ async def process_confirm_newsletter(callback: CallbackQuery, state: FSMContext,
 
     await callback.message.edit_text(i18n.get('admin_newsletter_started'))
 
-    all_ids = await get_all_users_id()
-    total_users = len(all_ids)
-    success = 0
-    failed = 0
+    from_chat_id, message_id = newsletter_message
+    broadcast = await create_broadcast(
+        session,
+        from_chat_id=from_chat_id,
+        message_id=message_id,
+        status_chat_id=callback.message.chat.id,
+        status_message_id=callback.message.message_id,
+        # Only the status message is in the admin's language: there is no audience
+        # filter to pick, so the newsletter goes to every user and total counts them all
+        language=callback.from_user.language_code
+    )
+    # The broadcast runs in its own sessions, so it must see a committed row
+    await session.commit()
+    await session.refresh(broadcast)
 
     logger.info('Newsletter started')
 
-    for user_id in all_ids:
-        try:
-            await newsletter_message.send_copy(chat_id=user_id)
-            success += 1
-        except Exception as e:
-            logger.error(f"Failed to send to {user_id}: {e}")
-            failed += 1
-
-    stats_text = i18n['admin_newsletter_stats'].format(
-        total=total_users,
-        success=success,
-        failed=failed
-    )
-
-    await callback.message.edit_text(stats_text, reply_markup=create_inline_kb(1, i18n, admin='back_button'))
+    start_broadcast(bot, broadcast, i18n)
     await state.clear()
 
 
@@ -1,12 +1,32 @@
 from datetime import datetime
 
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.fsm.context import FSMContext
 from aiogram.types import Message
 
-from database.models import SubscriptionStatus, Wishlist, User, Item, PriorityLevel
-from database.requests import get_subscription, get_subscribers_count
+from database.models import SubscriptionStatus, Wishlist, Item, PriorityLevel
+from database.requests import WishlistView, CarouselItem, ItemOrder
 from keyboards.keyboard_utils import create_item_keyboard
 
+# FSM data keeps (chat_id, message_id) instead of aiogram Message objects: it stays small
+# and serializable for RedisStorage. JSON turns the tuple into a list, both unpack the same.
+MessageRef = tuple[int, int]
+
+
+def to_message_ref(message: Message) -> MessageRef:
+    return message.chat.id, message.message_id
+
+
+async def delete_message_ref(bot: Bot, ref: MessageRef | None) -> None:
+    if not ref:
+        return
+    chat_id, message_id = ref
+    try:
+        await bot.delete_message(chat_id=chat_id, message_id=message_id)
+    except TelegramBadRequest:
+        pass
+
 
 async def validate_date_input(date_str: str) -> str | bool:
     """Validate date input and show errors if needed"""
@@ -44,13 +64,14 @@ def is_date_in_past(date_str: str) -> bool:
 
 async def render_wishlist_template(
         message: Message,
-        wishlist: Wishlist,
-        user: User,
+        view: WishlistView,
         i18n: dict
 ) -> str:
     """Рендерит шаблон вишлиста с количеством подписчиков"""
+    wishlist = view.wishlist
 
-    bot_username = (await message.bot.get_me()).username
+    # bot.me() кэширует профиль бота, поэтому запрос к API выполняется один раз
+    bot_username = (await message.bot.me()).username
     share_url = f"https://t.me/{bot_username}?start={wishlist.access_uuid}"
 
     # Описание
@@ -65,21 +86,12 @@ async def render_wishlist_template(
     # Статус приватности
     privacy_value = i18n['privacy_private'] if wishlist.is_private else i18n['privacy_public']
 
-    # Количество подарков
-    items_count = len(wishlist.items) if wishlist.items else 0
-
-    # Количество подписчиков
-    subscribers_count = await get_subscribers_count(wishlist.id)
-
     # Статус подписки
-    subscription = await get_subscription(user.id, wishlist.id)
-    is_owner = wishlist.owner_id == user.id
-
-    if is_owner:
+    if view.is_owner:
         subscription_status = i18n['subscription_owner']
-    elif subscription and subscription.status == SubscriptionStatus.APPROVED:
+    elif view.subscription_status == SubscriptionStatus.APPROVED:
         subscription_status = i18n['subscription_subscribed']
-    elif subscription and subscription.status == SubscriptionStatus.PENDING:
+    elif view.subscription_status == SubscriptionStatus.PENDING:
         subscription_status = i18n['subscription_pending']
     else:
         subscription_status = i18n['subscription_none']
@@ -87,22 +99,23 @@ async def render_wishlist_template(
     # Рендерим шаблон с подписчиками
     return i18n['wishlist_template'].format(
         title=wishlist.title,
-        owner_username=wishlist.owner.username,
+        owner_username=view.owner_username,
         privacy_value=privacy_value,
         share_url=share_url,
         description=description,
         event_date=event_date,
-        items_count=items_count,
-        subscribers_count=subscribers_count,
+        items_count=view.items_count,
+        subscribers_count=view.subscribers_count,
         subscription_status=subscription_status
     )
 
 
 async def render_limited_wishlist_template(
-        wishlist: Wishlist,
+        view: WishlistView,
         i18n: dict,
         is_pending: bool = False
 ) -> str:
+    wishlist = view.wishlist
     description = wishlist.description if wishlist.description else i18n['no_description']
 
     if wishlist.event_date:
@@ -117,7 +130,7 @@ async def render_limited_wishlist_template(
 
     return i18n['wishlist_limited_template'].format(
         title=wishlist.title,
-        owner_username=wishlist.owner.username,
+        owner_username=view.owner_username,
         description=description,
         event_date=event_date,
         subscription_status=subscription_status
@@ -133,15 +146,22 @@ def get_i18n(translations: dict, lang: str):
     return translations.get(lang) or translations.get(default_lang) or {}
 
 
-async def send_item_info(message: Message, current_item: int, wishlist: Wishlist, i18n: dict, is_owner: bool,
-                         new_msg: bool):
-    item = wishlist.items[current_item - 1]
+def carousel_view(callback_args) -> dict:
+    """get_carousel_item keyword arguments of the view carried by carousel buttons (see CAROUSEL_VIEW)"""
+    return {
+        'order': ItemOrder(callback_args.order),
+        'only_unreserved': callback_args.only_unreserved,
+        'max_price': callback_args.max_price or None,
+    }
+
+
+async def send_item_info(message: Message, carousel: CarouselItem, i18n: dict, new_msg: bool):
+    item = carousel.item
 
-    item_text = await render_item_template(item, i18n, current_item, len(wishlist.items))
+    item_text = await render_item_template(item, i18n, carousel.position, carousel.total)
     photo_id = item.photo_id
 
-    keyboard = create_item_keyboard(item, i18n, current_item, len(wishlist.items),
-                                    is_owner)
+    keyboard = create_item_keyboard(carousel, i18n)
     if not new_msg:
         from aiogram.types import InputMediaPhoto
 
@@ -179,11 +199,9 @@ async def render_item_template(item: Item, i18n: dict, current: int, total: int)
            f"📦 {current}/{total}"
 
 
-async def delete_item_message(state: FSMContext):
+async def delete_item_message(bot: Bot, state: FSMContext):
     data = await state.get_data()
     item_msg = data.get('item_msg')
     if item_msg:
-        try:
-            await item_msg.delete()
-        except Exception:
-            pass
+        await delete_message_ref(bot, item_msg)
+        await state.update_data(item_msg=None)
@@ -1,16 +1,21 @@
 import logging
 
-from aiogram import F, Router
+from aiogram import Bot, F, Router
 from aiogram.exceptions import TelegramBadRequest
 from aiogram.filters import StateFilter
 from aiogram.fsm.context import FSMContext
 from aiogram.types import Message, CallbackQuery
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
+from sqlalchemy.ext.asyncio import AsyncSession
+
 from database.models import PriorityLevel
-from database.requests import get_wishlist, get_or_create_user, create_or_update_item, get_item
-from handlers.handlers_utils import send_item_info, delete_item_message
-from keyboards.keyboard_utils import create_inline_kb, item_kb
+from database.requests import get_wishlist, get_user_identity, create_or_update_item, get_item, \
+    get_carousel_item, get_item_position
+from handlers.handlers_utils import MessageRef, send_item_info, delete_item_message, delete_message_ref, \
+    to_message_ref
+from keyboards.callback_data import ViewWishlist, AddItem, EditItem
+from keyboards.keyboard_utils import create_static_inline_kb, item_kb
 from states.states import FSMAddItem
 
 router = Router()
@@ -18,11 +23,12 @@ logger = logging.getLogger(__name__)
 
 
 async def update_item_preview_message(
-        last_bot_message: Message | None,
+        bot: Bot,
+        last_bot_message: MessageRef | None,
         i18n: dict,
         state: FSMContext,
         new_message_target: Message | CallbackQuery | None = None,
-) -> Message:
+) -> MessageRef:
     data = await state.get_data()
 
     # Формируем текст предпросмотра
@@ -44,48 +50,38 @@ async def update_item_preview_message(
 
     # Определяем куда отправлять сообщение
     if isinstance(new_message_target, CallbackQuery):
-        target = new_message_target.message
+        chat_id = new_message_target.message.chat.id
     elif isinstance(new_message_target, Message):
-        target = new_message_target
+        chat_id = new_message_target.chat.id
     else:
-        target = last_bot_message
+        chat_id = last_bot_message[0]
 
-    # Всегда отправляем как фото сообщение
-    if last_bot_message:
-        try:
-            # Удаляем старое сообщение
-            await last_bot_message.delete()
-        except TelegramBadRequest:
-            pass
+    # Удаляем старое сообщение
+    await delete_message_ref(bot, last_bot_message)
 
-    if target:
-        msg = await target.answer_photo(
-            photo=use_photo,
-            caption=preview_text,
-            reply_markup=kb,
-            parse_mode="HTML"
-        )
-    else:
-        msg = await last_bot_message.answer_photo(
-            photo=use_photo,
-            caption=preview_text,
-            reply_markup=kb,
-            parse_mode="HTML"
-        )
-    return msg
+    # Всегда отправляем как фото сообщение
+    msg = await bot.send_photo(
+        chat_id=chat_id,
+        photo=use_photo,
+        caption=preview_text,
+        reply_markup=kb,
+        parse_mode="HTML"
+    )
+    return to_message_ref(msg)
 
 
-@router.callback_query(F.data.startswith('add_item_'))
-async def start_add_item(callback: CallbackQuery, i18n: dict, state: FSMContext):
+@router.callback_query(AddItem.filter())
+async def start_add_item(callback: CallbackQuery, i18n: dict, state: FSMContext, session: AsyncSession,
+                         callback_args: AddItem.args):
     """Начинает процесс добавления подарка"""
     await callback.answer()
 
-    await delete_item_message(state)
+    await delete_item_message(callback.bot, state)
 
-    wishlist_id = int(callback.data.split('_')[2])
+    wishlist_id = callback_args.wishlist_id
 
-    wishlist = await get_wishlist(wishlist_id)
-    user = await get_or_create_user(callback.from_user.id)
+    wishlist = await get_wishlist(session, wishlist_id)
+    user = await get_user_identity(session, callback.from_user.id)
 
     if not wishlist or wishlist.owner_id != user.id:
         await callback.answer(i18n['access_denied'], show_alert=True)
@@ -121,25 +117,26 @@ async def start_add_item(callback: CallbackQuery, i18n: dict, state: FSMContext)
         reply_markup=item_kb(i18n),
         parse_mode="HTML"
     )
-    await state.update_data(last_bot_message=last_msg)
+    await state.update_data(last_bot_message=to_message_ref(last_msg))
 
 
-@router.callback_query(F.data.startswith('edit_item_'))
-async def start_edit_item(callback: CallbackQuery, i18n: dict, state: FSMContext):
+@router.callback_query(EditItem.filter())
+async def start_edit_item(callback: CallbackQuery, i18n: dict, state: FSMContext, session: AsyncSession,
+                          callback_args: EditItem.args):
     """Начинает процесс редактирования подарка"""
     await callback.answer()
 
-    await delete_item_message(state)
+    await delete_item_message(callback.bot, state)
 
-    item_id = int(callback.data.split('_')[2])
+    item_id = callback_args.item_id
 
-    item = await get_item(item_id, with_wishlist=True)
+    item = await get_item(session, item_id, with_wishlist=True)
 
     if not item or not item.wishlist:
         await callback.answer(i18n['item_not_found'], show_alert=True)
         return
 
-    user = await get_or_create_user(callback.from_user.id)
+    user = await get_user_identity(session, callback.from_user.id)
 
     if item.wishlist.owner_id != user.id:
         await callback.answer(i18n['access_denied'], show_alert=True)
@@ -174,7 +171,7 @@ async def start_edit_item(callback: CallbackQuery, i18n: dict, state: FSMContext
         parse_mode="HTML"
     )
 
-    await state.update_data(last_bot_message=last_msg)
+    await state.update_data(last_bot_message=to_message_ref(last_msg))
 
     # Удаляем оригинальное сообщение
     try:
@@ -211,7 +208,7 @@ async def start_editing_item_field(callback: CallbackQuery, i18n: dict, state: F
     elif field == 'priority':
         await state.set_state(FSMAddItem.editing_priority)
         # Показываем клавиатуру с приоритетами
-        keyboard = create_inline_kb(
+        keyboard = create_static_inline_kb(
             3,
             i18n,
             **{
@@ -243,7 +240,7 @@ async def set_item_priority(callback: CallbackQuery, i18n: dict, state: FSMConte
     data = await state.get_data()
     last_bot_message = data.get('last_bot_message')
 
-    new_msg = await update_item_preview_message(last_bot_message, i18n, state)
+    new_msg = await update_item_preview_message(callback.bot, last_bot_message, i18n, state)
     await state.update_data(last_bot_message=new_msg)
 
 
@@ -265,7 +262,7 @@ async def process_item_name(message: Message, i18n: dict, state: FSMContext):
     except TelegramBadRequest:
         pass
 
-    new_msg = await update_item_preview_message(last_bot_message, i18n, state, message)
+    new_msg = await update_item_preview_message(message.bot, last_bot_message, i18n, state, message)
     await state.update_data(last_bot_message=new_msg)
 
 
@@ -287,7 +284,7 @@ async def process_item_description(message: Message, i18n: dict, state: FSMConte
     except TelegramBadRequest:
         pass
 
-    new_msg = await update_item_preview_message(last_bot_message, i18n, state)
+    new_msg = await update_item_preview_message(message.bot, last_bot_message, i18n, state)
     await state.update_data(last_bot_message=new_msg)
 
 
@@ -305,7 +302,7 @@ async def process_item_link(message: Message, i18n: dict, state: FSMContext):
     except TelegramBadRequest:
         pass
 
-    new_msg = await update_item_preview_message(last_bot_message, i18n, state)
+    new_msg = await update_item_preview_message(message.bot, last_bot_message, i18n, state)
     await state.update_data(last_bot_message=new_msg)
 
 
@@ -329,7 +326,7 @@ async def process_item_price(message: Message, i18n: dict, state: FSMContext):
     except TelegramBadRequest:
         pass
 
-    new_msg = await update_item_preview_message(last_bot_message, i18n, state)
+    new_msg = await update_item_preview_message(message.bot, last_bot_message, i18n, state)
     await state.update_data(last_bot_message=new_msg)
 
 
@@ -350,12 +347,12 @@ async def process_item_photo(message: Message, i18n: dict, state: FSMContext):
         pass
 
     # Передаем message как new_message_target
-    new_msg = await update_item_preview_message(last_bot_message, i18n, state, message)
+    new_msg = await update_item_preview_message(message.bot, last_bot_message, i18n, state, message)
     await state.update_data(last_bot_message=new_msg)
 
 
 @router.callback_query(F.data == 'confirm_item', StateFilter(FSMAddItem.item_info))
-async def confirm_item(callback: CallbackQuery, i18n: dict, state: FSMContext):
+async def confirm_item(callback: CallbackQuery, i18n: dict, state: FSMContext, session: AsyncSession):
     """Подтверждает добавление/редактирование подарка и показывает обновленные подарки"""
     data = await state.get_data()
 
@@ -373,6 +370,7 @@ async def confirm_item(callback: CallbackQuery, i18n: dict, state: FSMContext):
                 break
 
         item = await create_or_update_item(
+            session,
             item_id=data.get('item_id'),
             wishlist_id=data['wishlist_id'],
             name=data['name'],
@@ -382,31 +380,24 @@ async def confirm_item(callback: CallbackQuery, i18n: dict, state: FSMContext):
             priority=priority,
             photo_id=data['photo_id']
         )
+        await session.commit()
 
         # Показываем alert с подтверждением
         action_text = i18n['item_updated'] if data.get('item_id') else i18n['item_added_success']
         await callback.answer(action_text.format(name=item.name), show_alert=True)
 
-        # Получаем обновленный вишлист с подарками
-        wishlist = await get_wishlist(data['wishlist_id'], with_items=True, with_owner=True)
-
-        # Получаем пользователя
-        user = await get_or_create_user(callback.from_user.id)
-        is_owner = wishlist.owner_id == user.id
-
         # Удаляем сообщение с редактированием подарка
         try:
             await callback.message.delete()
         except TelegramBadRequest:
             pass
 
-        current_item = 1
-        for i, item1 in enumerate(wishlist.items, start=1):
-            if item1.id == item.id:
-                current_item = i
-                continue
+        # Показываем сохраненный подарок на его месте в карусели
+        # The default view shows every item of the wishlist, so the position is always found
+        position = await get_item_position(session, item)
+        carousel = await get_carousel_item(session, item.wishlist_id, position, callback.from_user.id)
 
-        await send_item_info(callback.message, current_item, wishlist, i18n, is_owner, True)
+        await send_item_info(callback.message, carousel, i18n, True)
 
         await state.clear()
 
@@ -416,7 +407,7 @@ async def confirm_item(callback: CallbackQuery, i18n: dict, state: FSMContext):
 
 
 @router.callback_query(F.data == 'cancel', StateFilter(FSMAddItem))
-async def cancel_item_creation(callback: CallbackQuery, i18n: dict, state: FSMContext):
+async def cancel_item_creation(callback: CallbackQuery, i18n: dict, state: FSMContext, session: AsyncSession):
     """Отменяет создание/редактирование"""
     data = await state.get_data()
 
@@ -427,7 +418,7 @@ async def cancel_item_creation(callback: CallbackQuery, i18n: dict, state: FSMCo
 
     if wishlist_id:
         # Возвращаемся к вишлисту
-        wishlist = await get_wishlist(wishlist_id)
+        wishlist = await get_wishlist(session, wishlist_id)
 
         # Удаляем сообщение с предпросмотром
         try:
@@ -442,7 +433,7 @@ async def cancel_item_creation(callback: CallbackQuery, i18n: dict, state: FSMCo
             def __init__(self, message, from_user, access_uuid):
                 self.message = message
                 self.from_user = from_user
-                self.data = f"view_wishlist_{access_uuid}"
+                self.data = ViewWishlist.pack(access_uuid)
 
             async def answer(self):
                 pass
@@ -450,7 +441,7 @@ async def cancel_item_creation(callback: CallbackQuery, i18n: dict, state: FSMCo
         from handlers.user import view_wishlist
 
         fake_callback = FakeCallback(callback.message, callback.from_user, wishlist.access_uuid)
-        await view_wishlist(fake_callback, i18n)
+        await view_wishlist(fake_callback, i18n, state, session, ViewWishlist.args(wishlist.access_uuid))
 
     await state.clear()
 
@@ -463,5 +454,5 @@ async def remove_item_photo(callback: CallbackQuery, i18n: dict, state: FSMConte
     data = await state.get_data()
     last_bot_message = data.get('last_bot_message')
 
-    new_msg = await update_item_preview_message(last_bot_message, i18n, state)
+    new_msg = await update_item_preview_message(callback.bot, last_bot_message, i18n, state)
     await state.update_data(last_bot_message=new_msg)
@@ -0,0 +1,145 @@
+import html
+import logging
+
+from aiogram import Router
+from aiogram.filters import Command, CommandObject, StateFilter
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import default_state
+from aiogram.types import Message, CallbackQuery, InlineQuery, InlineQueryResultArticle, InputTextMessageContent
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.requests import get_user_identity, find_user_identity, get_found_item, get_item_position, \
+    get_carousel_item, search, search_query, SearchHit, SearchPage
+from handlers.handlers_utils import send_item_info, delete_item_message, to_message_ref
+from keyboards.callback_data import SearchResults, OpenItem
+from keyboards.keyboard_utils import create_search_keyboard
+
+router = Router()
+logger = logging.getLogger(__name__)
+
+# Seconds Telegram may reuse inline results of the same query of the same user
+INLINE_CACHE_TIME = 10
+
+
+def render_search_page(page: SearchPage, query: str, i18n: dict) -> str:
+    key = 'search_results' if page.hits else 'search_no_results'
+    return i18n[key].format(query=html.escape(query))
+
+
+@router.message(Command('search'), StateFilter(default_state))
+async def process_search_command(message: Message, command: CommandObject, i18n: dict[str, str],
+                                 state: FSMContext, session: AsyncSession):
+    """
+    /search <words>: items and wishlists of the user and of their subscriptions
+    """
+    query = command.args or ''
+    if search_query(query) is None:
+        await message.answer(i18n['search_usage'])
+        return
+
+    user = await get_user_identity(session, message.from_user.id, message.from_user.username)
+    page = await search(session, user.id, query)
+    await state.update_data(search_query=query)
+
+    await message.answer(
+        text=render_search_page(page, query, i18n),
+        reply_markup=create_search_keyboard(page, 0, i18n)
+    )
+
+
+@router.callback_query(SearchResults.filter(), StateFilter(default_state))
+async def search_results_page(callback: CallbackQuery, i18n: dict[str, str], state: FSMContext,
+                              session: AsyncSession, callback_args: SearchResults.args):
+    query = (await state.get_data()).get('search_query')
+    if not query:
+        await callback.answer(i18n['search_expired'], show_alert=True)
+        return
+
+    await callback.answer()
+    user = await get_user_identity(session, callback.from_user.id, callback.from_user.username)
+    page = await search(session, user.id, query, offset=callback_args.offset)
+
+    await callback.message.edit_text(
+        text=render_search_page(page, query, i18n),
+        reply_markup=create_search_keyboard(page, callback_args.offset, i18n)
+    )
+
+
+@router.callback_query(OpenItem.filter(), StateFilter(default_state))
+async def open_found_item(callback: CallbackQuery, i18n: dict[str, str], state: FSMContext,
+                          session: AsyncSession, callback_args: OpenItem.args):
+    """Shows an item found by search at its place in the wishlist carousel"""
+    user = await find_user_identity(session, callback.from_user.id)
+    item = await get_found_item(session, callback_args.item_id, user.id) if user else None
+    carousel = None
+    if item is not None:
+        position = await get_item_position(session, item)
+        if position is not None:
+            carousel = await get_carousel_item(session, item.wishlist_id, position, callback.from_user.id)
+    if not carousel:
+        await callback.answer(i18n['item_not_found'], show_alert=True)
+        return
+
+    await callback.answer()
+    await delete_item_message(callback.bot, state)
+    item_msg = await send_item_info(callback.message, carousel=carousel, i18n=i18n, new_msg=True)
+    await state.update_data(item_msg=to_message_ref(item_msg))
+
+
+def inline_search_result(hit: SearchHit, share_url: str, i18n: dict) -> InlineQueryResultArticle:
+    """An inline result that shares the item or the wishlist with a link to open the wishlist in the bot"""
+    title = html.escape(hit.wishlist_title)
+    if hit.item_id is None:
+        return InlineQueryResultArticle(
+            id=f'wishlist_{hit.wishlist_id}',
+            title=hit.wishlist_title,
+            description=i18n['inline_search_wishlist_description'],
+            input_message_content=InputTextMessageContent(
+                message_text=i18n['inline_search_wishlist'].format(title=title, url=share_url)
+            )
+        )
+
+    return InlineQueryResultArticle(
+        id=f'item_{hit.item_id}',
+        title=hit.item_name,
+        description=hit.wishlist_title,
+        input_message_content=InputTextMessageContent(
+            message_text=i18n['inline_search_item'].format(
+                name=html.escape(hit.item_name),
+                price_label=i18n['price'],
+                price=hit.price or i18n['no_data'],
+                title=title,
+                url=share_url
+            )
+        )
+    )
+
+
+@router.inline_query()
+async def inline_search(inline_query: InlineQuery, i18n: dict[str, str], session: AsyncSession):
+    """
+    @bot <words> in any chat: the same search as /search, paged by Telegram
+    through the offset of the query
+    """
+    offset = int(inline_query.offset) if inline_query.offset.isdigit() else 0
+    # Inline queries come from any chat; people who never started the bot have nothing to find
+    user = await find_user_identity(session, inline_query.from_user.id)
+    if user:
+        page = await search(session, user.id, inline_query.query, offset=offset)
+    else:
+        page = SearchPage(hits=[], next_offset=None)
+
+    # bot.me() caches the bot profile, so the API is asked once
+    bot_username = (await inline_query.bot.me()).username
+    results = [
+        inline_search_result(hit, f"https://t.me/{bot_username}?start={hit.access_uuid}", i18n)
+        for hit in page.hits
+    ]
+
+    await inline_query.answer(
+        results,
+        cache_time=INLINE_CACHE_TIME,
+        is_personal=True,
+        next_offset=str(page.next_offset) if page.next_offset is not None else ''
+    )
@@ -1,18 +1,24 @@
 from aiogram import Router, F, Bot
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.filters import CommandStart, Command, StateFilter
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import default_state
 from aiogram.types import Message, CallbackQuery, User
 from aiogram.utils.chat_action import ChatActionSender
 
+from sqlalchemy.ext.asyncio import AsyncSession
+
 from database.models import Wishlist, SubscriptionStatus
 from handlers.handlers_utils import render_wishlist_template, render_limited_wishlist_template, get_i18n, \
-    send_item_info, delete_item_message
-from keyboards.keyboard_utils import create_inline_kb
+    send_item_info, delete_item_message, to_message_ref, carousel_view
+from keyboards.callback_data import ViewWishlist, EditWishlist, DeleteWishlist, Subscribe, Unsubscribe, \
+    ApproveSubscription, RejectSubscription, AddItem, NextItem, PrevItem, ReserveItem, UnreserveItem, ItemView
+from keyboards.keyboard_utils import create_inline_kb, create_static_inline_kb, create_item_keyboard
 
-from database.requests import get_or_create_user, get_wishlists, get_friends_wishlists, get_wishlist, \
+from database.requests import get_user_identity, get_wishlists, get_friends_wishlists, get_wishlist, \
     delete_wishlist_db, get_subscription, delete_subscription, get_or_create_subscription, update_subscription_status, \
-    get_subscription_with_details, get_user_language, get_item
+    get_subscription_with_details, get_user_language, get_item, get_wishlist_view, \
+    get_carousel_item, reserve_item, unreserve_item
 from main import logger
 
 # Initialize router for handling messages and callbacks
@@ -21,18 +27,22 @@ router = Router()
 
 # Handler for /start command
 @router.message(CommandStart(), StateFilter(default_state))
-async def process_start_message(message: Message, i18n: dict[str, str]):
+async def process_start_message(message: Message, i18n: dict[str, str], session: AsyncSession):
     """
     Handles the /start command with wishlist links support
     """
     # Get or create user
-    user = await get_or_create_user(
+    user = await get_user_identity(
+        session,
         telegram_id=message.from_user.id,
-        username=message.from_user.username
+        username=message.from_user.username,
+        language=message.from_user.language_code
     )
+    # A new user is written; the rest of /start only reads
+    await session.commit()
 
     # Send standard welcome message
-    keyboard = create_inline_kb(1, i18n, 'btn_my_wishlists', 'friends_wishlist_buttons', 'help_button')
+    keyboard = create_static_inline_kb(1, i18n, 'btn_my_wishlists', 'friends_wishlist_buttons', 'help_button')
 
     welcome_msg = await message.answer(
         text=i18n.get('start_message'),
@@ -44,11 +54,11 @@ async def process_start_message(message: Message, i18n: dict[str, str]):
     args = message.text.split()
     if len(args) > 1:
         wishlist_uuid = args[1]
-        await handle_wishlist_link(message, wishlist_uuid, user, i18n)
+        await handle_wishlist_link(message, wishlist_uuid, user, i18n, session)
 
 
-async def handle_wishlist_link(message: Message, wishlist_uuid: str, user: User, i18n: dict):
-    wishlist = await get_wishlist(wishlist_identifier=wishlist_uuid, with_owner=True)
+async def handle_wishlist_link(message: Message, wishlist_uuid: str, user: User, i18n: dict, session: AsyncSession):
+    wishlist = await get_wishlist(session, wishlist_identifier=wishlist_uuid, with_owner=True)
 
     if not wishlist:
         await message.answer(i18n.get('wishlist_not_found'))
@@ -56,7 +66,7 @@ async def handle_wishlist_link(message: Message, wishlist_uuid: str, user: User,
 
     # Check if user is the owner
     if wishlist.owner_id == user.id:
-        keyboard = create_inline_kb(1, i18n, **{f"view_wishlist_{wishlist.access_uuid}": 'view_wishlist'})
+        keyboard = create_inline_kb(1, i18n, **{ViewWishlist.pack(wishlist.access_uuid): 'view_wishlist'})
         await message.answer(
             text=i18n.get('wishlist_own_access'),
             reply_markup=keyboard
@@ -67,7 +77,7 @@ async def handle_wishlist_link(message: Message, wishlist_uuid: str, user: User,
     share_keyboard = create_inline_kb(
         1,
         i18n,
-        **{f"view_wishlist_{wishlist.access_uuid}": 'view_wishlist'}
+        **{ViewWishlist.pack(wishlist.access_uuid): 'view_wishlist'}
     )
 
     await message.answer(
@@ -86,7 +96,7 @@ async def process_start_message(callback: CallbackQuery, i18n: dict[str, str]):
     Handles the 'start_message' callback to return to main menu.
     """
     # Recreate the main menu keyboard
-    keyboard = create_inline_kb(1, i18n, 'btn_my_wishlists', 'friends_wishlist_buttons', 'help_button')
+    keyboard = create_static_inline_kb(1, i18n, 'btn_my_wishlists', 'friends_wishlist_buttons', 'help_button')
 
     # Acknowledge the callback (removes loading animation)
     await callback.answer()
@@ -98,21 +108,21 @@ async def process_start_message(callback: CallbackQuery, i18n: dict[str, str]):
     )
 
 
-@router.callback_query(F.data.startswith('subscribe_'))
-async def subscribe_to_wishlist(callback: CallbackQuery, i18n: dict, state: FSMContext):
+@router.callback_query(Subscribe.filter())
+async def subscribe_to_wishlist(callback: CallbackQuery, i18n: dict, state: FSMContext, session: AsyncSession,
+                                callback_args: Subscribe.args):
     await callback.answer()
 
-    wishlist_id = int(callback.data.split('_')[1])
-    wishlist = await get_wishlist(wishlist_id, with_owner=True)
+    wishlist = await get_wishlist(session, callback_args.wishlist_id, with_owner=True)
 
     if not wishlist:
         await callback.answer(i18n.get('wishlist_not_found'), show_alert=True)
         return
 
-    user = await get_or_create_user(callback.from_user.id)
+    user = await get_user_identity(session, callback.from_user.id)
 
     # Check if already subscribed
-    existing_subscription = await get_subscription(user.id, wishlist.id)
+    existing_subscription = await get_subscription(session, user.id, wishlist.id)
     if existing_subscription:
         if existing_subscription.status == SubscriptionStatus.APPROVED:
             await callback.answer(i18n.get('already_subscribed'), show_alert=True)
@@ -123,15 +133,19 @@ async def subscribe_to_wishlist(callback: CallbackQuery, i18n: dict, state: FSMC
 
     if wishlist.is_private:
         subscription = await get_or_create_subscription(
+            session,
             user.id, wishlist.id, wishlist.owner_id, SubscriptionStatus.PENDING
         )
+        await session.commit()
         await callback.answer(i18n.get('subscription_request_sent'), show_alert=True)
 
         await notify_owner_about_request(callback.bot, wishlist, user, i18n)
     else:
         subscription = await get_or_create_subscription(
+            session,
             user.id, wishlist.id, wishlist.owner_id, SubscriptionStatus.APPROVED
         )
+        await session.commit()
         await callback.answer(i18n.get('subscribed_success'), show_alert=True)
 
     from aiogram.types import CallbackQuery
@@ -140,36 +154,37 @@ async def subscribe_to_wishlist(callback: CallbackQuery, i18n: dict, state: FSMC
         def __init__(self, message, from_user, access_uuid):
             self.message = message
             self.from_user = from_user
-            self.data = f"view_wishlist_{access_uuid}"
+            self.data = ViewWishlist.pack(access_uuid)
 
         async def answer(self):
             pass
 
     fake_callback = FakeCallback(callback.message, callback.from_user, wishlist.access_uuid)
-    await view_wishlist(fake_callback, i18n, state)
+    await view_wishlist(fake_callback, i18n, state, session, ViewWishlist.args(wishlist.access_uuid))
 
 
-@router.callback_query(F.data.startswith('unsubscribe_'))
-async def unsubscribe_from_wishlist(callback: CallbackQuery, i18n: dict, state: FSMContext):
+@router.callback_query(Unsubscribe.filter())
+async def unsubscribe_from_wishlist(callback: CallbackQuery, i18n: dict, state: FSMContext, session: AsyncSession,
+                                    callback_args: Unsubscribe.args):
     await callback.answer()
 
-    await delete_item_message(state)
+    await delete_item_message(callback.bot, state)
 
-    wishlist_id = int(callback.data.split('_')[1])
-    wishlist = await get_wishlist(wishlist_id, with_owner=True)
+    wishlist = await get_wishlist(session, callback_args.wishlist_id, with_owner=True)
 
     if not wishlist:
         await callback.answer(i18n.get('wishlist_not_found'), show_alert=True)
         return
 
-    user = await get_or_create_user(callback.from_user.id)
-    subscription = await get_subscription(user.id, wishlist.id)
+    user = await get_user_identity(session, callback.from_user.id)
+    subscription = await get_subscription(session, user.id, wishlist.id)
 
     if not subscription:
         await callback.answer(i18n.get('not_subscribed'), show_alert=True)
         return
 
-    await delete_subscription(subscription.id)
+    await delete_subscription(session, subscription.id)
+    await session.commit()
 
     await callback.answer(i18n.get('unsubscribed_success'), show_alert=True)
 
@@ -179,13 +194,13 @@ async def unsubscribe_from_wishlist(callback: CallbackQuery, i18n: dict, state:
         def __init__(self, message, from_user, access_uuid):
             self.message = message
             self.from_user = from_user
-            self.data = f"view_wishlist_{access_uuid}"
+            self.data = ViewWishlist.pack(access_uuid)
 
         async def answer(self):
             pass
 
     fake_callback = FakeCallback(callback.message, callback.from_user, wishlist.access_uuid)
-    await view_wishlist(fake_callback, i18n, state)
+    await view_wishlist(fake_callback, i18n, state, session, ViewWishlist.args(wishlist.access_uuid))
 
 
 async def notify_owner_about_request(bot: Bot, wishlist: Wishlist, subscriber: User, i18n: dict):
@@ -193,8 +208,8 @@ async def notify_owner_about_request(bot: Bot, wishlist: Wishlist, subscriber: U
         2,
         i18n,
         **{
-            f"approve_sub_{subscriber.id}_{wishlist.id}": 'btn_approve',
-            f"reject_sub_{subscriber.id}_{wishlist.id}": 'btn_reject'
+            ApproveSubscription.pack(subscriber.id, wishlist.id): 'btn_approve',
+            RejectSubscription.pack(subscriber.id, wishlist.id): 'btn_reject'
         }
     )
 
@@ -211,18 +226,17 @@ async def notify_owner_about_request(bot: Bot, wishlist: Wishlist, subscriber: U
         logger.error(f"Error notifying owner: {e}")
 
 
-@router.callback_query(F.data.startswith('approve_sub_'))
-async def approve_subscription(callback: CallbackQuery, i18n: dict):
+@router.callback_query(ApproveSubscription.filter())
+async def approve_subscription(callback: CallbackQuery, i18n: dict, session: AsyncSession,
+                               callback_args: ApproveSubscription.args):
     """Одобряет запрос на подписку"""
     await callback.answer()
 
     try:
-        parts = callback.data.split('_')
-        subscriber_id = int(parts[2])
-        wishlist_id = int(parts[3])
+        subscriber_id, wishlist_id = callback_args
 
         # Сначала получаем данные ДО обновления
-        subscription = await get_subscription_with_details(subscriber_id, wishlist_id)
+        subscription = await get_subscription_with_details(session, subscriber_id, wishlist_id)
         if not subscription:
             await callback.answer(i18n.get('subscription_not_found'), show_alert=True)
             return
@@ -233,7 +247,8 @@ async def approve_subscription(callback: CallbackQuery, i18n: dict):
         subscriber_username = subscription.subscriber.username or subscriber_tg_id
 
         # Теперь обновляем статус
-        await update_subscription_status(subscription.id, SubscriptionStatus.APPROVED)
+        await update_subscription_status(session, subscription.id, SubscriptionStatus.APPROVED)
+        await session.commit()
 
         # Уведомляем подписчика
         try:
@@ -258,18 +273,17 @@ async def approve_subscription(callback: CallbackQuery, i18n: dict):
         await callback.answer(i18n.get('error_occurred'), show_alert=True)
 
 
-@router.callback_query(F.data.startswith('reject_sub_'))
-async def reject_subscription(callback: CallbackQuery, i18n: dict):
+@router.callback_query(RejectSubscription.filter())
+async def reject_subscription(callback: CallbackQuery, i18n: dict, session: AsyncSession,
+                              callback_args: RejectSubscription.args):
     """Отклоняет запрос на подписку"""
     await callback.answer()
 
     try:
-        parts = callback.data.split('_')
-        subscriber_id = int(parts[2])
-        wishlist_id = int(parts[3])
+        subscriber_id, wishlist_id = callback_args
 
         # Сначала получаем данные ДО удаления
-        subscription = await get_subscription_with_details(subscriber_id, wishlist_id)
+        subscription = await get_subscription_with_details(session, subscriber_id, wishlist_id)
         if not subscription:
             await callback.answer(i18n.get('subscription_not_found'), show_alert=True)
             return
@@ -280,7 +294,8 @@ async def reject_subscription(callback: CallbackQuery, i18n: dict):
         subscriber_username = subscription.subscriber.username or subscriber_tg_id
 
         # Теперь удаляем
-        await delete_subscription(subscription.id)
+        await delete_subscription(session, subscription.id)
+        await session.commit()
 
         # Уведомляем подписчика
         try:
@@ -306,22 +321,22 @@ async def reject_subscription(callback: CallbackQuery, i18n: dict):
 
 
 @router.callback_query(F.data == 'btn_my_wishlists')
-async def show_my_wishlist(callback: CallbackQuery, i18n: dict[str, str], state: FSMContext):
+async def show_my_wishlist(callback: CallbackQuery, i18n: dict[str, str], state: FSMContext, session: AsyncSession):
     """
     Displays user's wishlists with interactive buttons or empty state if none exist.
     """
 
-    await delete_item_message(state)
+    await delete_item_message(callback.bot, state)
 
-    user = await get_or_create_user(callback.from_user.id, callback.from_user.username)
+    user = await get_user_identity(session, callback.from_user.id, callback.from_user.username)
     user_id = user.id
-    wishlists = await get_wishlists(user_id)
+    wishlists = await get_wishlists(session, user_id)
 
     await callback.answer()  # Acknowledge callback
 
     async with ChatActionSender.typing(bot=callback.bot, chat_id=callback.from_user.id):
         if not wishlists:
-            keyboard = create_inline_kb(1, i18n, 'btn_create_wishlist', start_message='back_button')
+            keyboard = create_static_inline_kb(1, i18n, 'btn_create_wishlist', start_message='back_button')
             await callback.message.edit_text(
                 text=i18n.get('my_wishlists_if_none'),
                 reply_markup=keyboard
@@ -329,7 +344,7 @@ async def show_my_wishlist(callback: CallbackQuery, i18n: dict[str, str], state:
         else:
             wishlists_buttons = {}
             for wishlist in wishlists:
-                wishlists_buttons[f'view_wishlist_{wishlist.access_uuid}'] = f'🎁 {wishlist.title}'
+                wishlists_buttons[ViewWishlist.pack(wishlist.access_uuid)] = f'🎁 {wishlist.title}'
 
             keyboard = create_inline_kb(1, i18n, **wishlists_buttons, btn_create_wishlist='btn_create_wishlist',
                                         start_message='back_button')
@@ -341,18 +356,18 @@ async def show_my_wishlist(callback: CallbackQuery, i18n: dict[str, str], state:
 
 
 @router.callback_query(F.data == 'friends_wishlist_buttons', StateFilter(default_state))
-async def process_friends_wishlist_buttons(callback: CallbackQuery, i18n: dict[str, str]):
+async def process_friends_wishlist_buttons(callback: CallbackQuery, i18n: dict[str, str], session: AsyncSession):
     """
     Displays friends' wishlists with sharing status or empty state.
     """
-    user = await get_or_create_user(callback.from_user.id, callback.from_user.username)
+    user = await get_user_identity(session, callback.from_user.id, callback.from_user.username)
     user_id = user.id
-    friends_wishlists = await get_friends_wishlists(user_id)
+    friends_wishlists = await get_friends_wishlists(session, user_id)
 
     await callback.answer()
 
     if not friends_wishlists:
-        keyboard = create_inline_kb(1, i18n, start_message='back_button')
+        keyboard = create_static_inline_kb(1, i18n, start_message='back_button')
         await callback.message.edit_text(
             text=i18n.get('friends_wishlists_if_none'),
             reply_markup=keyboard
@@ -360,7 +375,7 @@ async def process_friends_wishlist_buttons(callback: CallbackQuery, i18n: dict[s
     else:
         wishlists_buttons = {}
         for wishlist in friends_wishlists:
-            wishlists_buttons[f'view_wishlist_{wishlist.access_uuid}'] = f'🎁 {wishlist.title}'
+            wishlists_buttons[ViewWishlist.pack(wishlist.access_uuid)] = f'🎁 {wishlist.title}'
 
         keyboard = create_inline_kb(1, i18n, **wishlists_buttons,
                                     start_message='back_button')
@@ -371,66 +386,64 @@ async def process_friends_wishlist_buttons(callback: CallbackQuery, i18n: dict[s
         )
 
 
-@router.callback_query(F.data.startswith('view_wishlist'), StateFilter(default_state))
-async def view_wishlist(callback: CallbackQuery, i18n: dict[str, str], state: FSMContext):
+@router.callback_query(ViewWishlist.filter(), StateFilter(default_state))
+async def view_wishlist(callback: CallbackQuery, i18n: dict[str, str], state: FSMContext, session: AsyncSession,
+                        callback_args: ViewWishlist.args):
     """
     Displays wishlist using template
     """
     await callback.answer()
-    wishlist_uuid = callback.data.split('view_wishlist_')[1]
 
-    wishlist = await get_wishlist(wishlist_identifier=wishlist_uuid, with_items=True, with_owner=True)
+    view = await get_wishlist_view(session, callback_args.access_uuid, callback.from_user.id)
 
     try:
-        if not wishlist:
+        if not view:
             await callback.message.edit_text(
                 text=i18n.get('wishlist_not_found'),
-                reply_markup=create_inline_kb(1, i18n, start_message='back_button')
+                reply_markup=create_static_inline_kb(1, i18n, start_message='back_button')
             )
             return
 
-        user = await get_or_create_user(callback.from_user.id)
-        subscription = await get_subscription(user.id, wishlist.id)
-
-        is_owner = wishlist.owner_id == user.id
-        is_subscribed = subscription and subscription.status == SubscriptionStatus.APPROVED
-        is_pending = subscription and subscription.status == SubscriptionStatus.PENDING
+        wishlist = view.wishlist
+        is_owner = view.is_owner
+        is_subscribed = view.subscription_status == SubscriptionStatus.APPROVED
+        is_pending = view.subscription_status == SubscriptionStatus.PENDING
 
         not_allowed = not is_owner and wishlist.is_private and not is_subscribed
         if not_allowed:
-            text = await render_limited_wishlist_template(wishlist, i18n, is_pending)
+            text = await render_limited_wishlist_template(view, i18n, is_pending)
 
             if is_pending:
                 keyboard = create_inline_kb(
                     1,
                     i18n,
-                    **{f"view_wishlist_{wishlist.access_uuid}": 'btn_subscription_pending'},
+                    **{ViewWishlist.pack(wishlist.access_uuid): 'btn_subscription_pending'},
                     friends_wishlist_buttons='back_button'
                 )
             else:
                 keyboard = create_inline_kb(
                     1,
                     i18n,
-                    **{f"subscribe_{wishlist.id}": 'btn_subscribe'},
+                    **{Subscribe.pack(wishlist.id): 'btn_subscribe'},
                     friends_wishlist_buttons='back_button'
                 )
         else:
-            text = await render_wishlist_template(callback.message, wishlist, user, i18n)
+            text = await render_wishlist_template(callback.message, view, i18n)
 
             if is_owner:
                 keyboard = create_inline_kb(
                     3,
                     i18n,
-                    **{f"add_item_{wishlist.id}": 'btn_add_item',
-                       f"edit_wishlist_{wishlist.id}": 'btn_edit',
-                       f"delete_wishlist_{wishlist.id}": 'btn_delete_wishlist'},
+                    **{AddItem.pack(wishlist.id): 'btn_add_item',
+                       EditWishlist.pack(wishlist.id): 'btn_edit',
+                       DeleteWishlist.pack(wishlist.id): 'btn_delete_wishlist'},
                     btn_my_wishlists='back_button'
                 )
             else:
                 if is_subscribed:
-                    subscribe_btn = {f"unsubscribe_{wishlist.id}": 'btn_unsubscribe'}
+                    subscribe_btn = {Unsubscribe.pack(wishlist.id): 'btn_unsubscribe'}
                 else:
-                    subscribe_btn = {f"subscribe_{wishlist.id}": 'btn_subscribe'}
+                    subscribe_btn = {Subscribe.pack(wishlist.id): 'btn_subscribe'}
 
                 keyboard = create_inline_kb(
                     1,
@@ -445,63 +458,130 @@ async def view_wishlist(callback: CallbackQuery, i18n: dict[str, str], state: FS
             disable_web_page_preview=True
         )
 
-        if wishlist.items and not not_allowed:
-            item_msg = await send_item_info(callback.message, is_owner=is_owner, current_item=1, wishlist=wishlist, i18n=i18n,
-                                 new_msg=True)
-            await state.update_data(item_msg=item_msg)
+        if view.items_count and not not_allowed:
+            carousel = await get_carousel_item(session, wishlist.id, 1, callback.from_user.id)
+            item_msg = await send_item_info(callback.message, carousel=carousel, i18n=i18n, new_msg=True)
+            await state.update_data(item_msg=to_message_ref(item_msg))
 
     except Exception as e:
         logger.error(e)
 
 
-@router.callback_query(F.data.startswith('next_item_'))
-async def next_item(callback: CallbackQuery, i18n: dict[str, str]):
-    wishlist_id = int(callback.data.split('_')[2])
-    current_item = int(callback.data.split('_')[3]) + 1
+@router.callback_query(NextItem.filter())
+async def next_item(callback: CallbackQuery, i18n: dict[str, str], session: AsyncSession,
+                    callback_args: NextItem.args):
+    carousel = await get_carousel_item(session, callback_args.wishlist_id, callback_args.position + 1,
+                                       callback.from_user.id, **carousel_view(callback_args))
+    if not carousel:
+        return
+
+    await send_item_info(callback.message, carousel=carousel, i18n=i18n, new_msg=False)
+
 
-    wishlist = await get_wishlist(wishlist_id, with_items=True)
-    if not wishlist or not wishlist.items:
+@router.callback_query(PrevItem.filter())
+async def prev_item(callback: CallbackQuery, i18n: dict[str, str], session: AsyncSession,
+                    callback_args: PrevItem.args):
+    carousel = await get_carousel_item(session, callback_args.wishlist_id, callback_args.position - 1,
+                                       callback.from_user.id, **carousel_view(callback_args))
+    if not carousel:
         return
 
-    user = await get_or_create_user(callback.from_user.id)
-    is_owner = True if user.id == wishlist.owner_id else False
+    await send_item_info(callback.message, carousel=carousel, i18n=i18n, new_msg=False)
 
-    await send_item_info(callback.message, is_owner=is_owner, current_item=current_item, wishlist=wishlist, i18n=i18n,
-                         new_msg=False)
 
+@router.callback_query(ItemView.filter())
+async def switch_item_view(callback: CallbackQuery, i18n: dict[str, str], session: AsyncSession,
+                           callback_args: ItemView.args):
+    carousel = await get_carousel_item(session, callback_args.wishlist_id, 1, callback.from_user.id,
+                                       **carousel_view(callback_args))
+    if not carousel:
+        await callback.answer(i18n['no_items_in_view'], show_alert=True)
+        return
 
-@router.callback_query(F.data.startswith('prev_item_'))
-async def prev_item(callback: CallbackQuery, i18n: dict[str, str]):
-    wishlist_id = int(callback.data.split('_')[2])
-    current_item = int(callback.data.split('_')[3]) - 1
+    await callback.answer()
+    await send_item_info(callback.message, carousel=carousel, i18n=i18n, new_msg=False)
+
+
+async def refresh_item(callback: CallbackQuery, i18n: dict[str, str], session: AsyncSession,
+                       callback_args: ReserveItem.args | UnreserveItem.args) -> None:
+    """Redraws the carousel after the item's reservation changed"""
+    view = carousel_view(callback_args)
+    position = callback_args.position
+    carousel = await get_carousel_item(session, callback_args.wishlist_id, position, callback.from_user.id, **view)
+    if not carousel and position > 1:
+        # The item was the last one of a view that doesn't show it anymore
+        carousel = await get_carousel_item(session, callback_args.wishlist_id, position - 1,
+                                           callback.from_user.id, **view)
+    if not carousel:
+        return
 
-    wishlist = await get_wishlist(wishlist_id, with_items=True)
-    if not wishlist or not wishlist.items:
+    if carousel.item.id != callback_args.item_id:
+        await send_item_info(callback.message, carousel=carousel, i18n=i18n, new_msg=False)
         return
 
-    user = await get_or_create_user(callback.from_user.id)
-    is_owner = True if user.id == wishlist.owner_id else False
+    try:
+        await callback.message.edit_reply_markup(reply_markup=create_item_keyboard(carousel, i18n))
+    except TelegramBadRequest:
+        # The buttons already show the current state
+        pass
+
+
+@router.callback_query(ReserveItem.filter())
+async def reserve_gift(callback: CallbackQuery, i18n: dict[str, str], session: AsyncSession,
+                       callback_args: ReserveItem.args):
+    wishlist_id, item_id = callback_args.wishlist_id, callback_args.item_id
+    user = await get_user_identity(session, callback.from_user.id, callback.from_user.username)
+
+    reserved = await reserve_item(session, user.id, wishlist_id, item_id)
+    await session.commit()
+    if reserved:
+        await callback.answer(i18n['item_reserved_success'])
+    else:
+        item = await get_item(session, item_id)
+        already_reserved = item is not None and item.is_reserved
+        await callback.answer(i18n['item_already_reserved' if already_reserved else 'access_denied'], show_alert=True)
+
+    await refresh_item(callback, i18n, session, callback_args)
+
+
+@router.callback_query(UnreserveItem.filter())
+async def unreserve_gift(callback: CallbackQuery, i18n: dict[str, str], session: AsyncSession,
+                         callback_args: UnreserveItem.args):
+    user = await get_user_identity(session, callback.from_user.id, callback.from_user.username)
+
+    unreserved = await unreserve_item(session, user.id, callback_args.wishlist_id, callback_args.item_id)
+    await session.commit()
+    if unreserved:
+        await callback.answer(i18n['item_unreserved_success'])
+    else:
+        await callback.answer(i18n['access_denied'], show_alert=True)
+
+    await refresh_item(callback, i18n, session, callback_args)
+
 
-    await send_item_info(callback.message, is_owner=is_owner, current_item=current_item, wishlist=wishlist, i18n=i18n,
-                         new_msg=False)
+@router.callback_query(F.data == 'already_reserved')
+async def already_reserved(callback: CallbackQuery, i18n: dict[str, str]):
+    await callback.answer(i18n['item_already_reserved'], show_alert=True)
 
 
-@router.callback_query(F.data.startswith('delete_wishlist'), StateFilter(default_state))
-async def delete_wishlist(callback: CallbackQuery, i18n: dict[str, str], state: FSMContext):
+@router.callback_query(DeleteWishlist.filter(), StateFilter(default_state))
+async def delete_wishlist(callback: CallbackQuery, i18n: dict[str, str], state: FSMContext, session: AsyncSession,
+                          callback_args: DeleteWishlist.args):
     try:
-        await delete_item_message(state)
+        await delete_item_message(callback.bot, state)
 
-        wishlist_id = int(callback.data.split('delete_wishlist_')[1])
+        wishlist_id = callback_args.wishlist_id
 
-        wishlist = await get_wishlist(wishlist_id)
-        user = await get_or_create_user(callback.from_user.id)
+        wishlist = await get_wishlist(session, wishlist_id)
+        user = await get_user_identity(session, callback.from_user.id)
         user_id = user.id
         if not wishlist or wishlist.owner_id != user_id:
             await callback.answer(i18n.get('access_denied'), show_alert=True)
             return
 
-        await delete_wishlist_db(wishlist_id)
-        keyboard = create_inline_kb(1, i18n, 'btn_my_wishlists')
+        await delete_wishlist_db(session, wishlist_id)
+        await session.commit()
+        keyboard = create_static_inline_kb(1, i18n, 'btn_my_wishlists')
         await callback.message.edit_text(
             text=i18n.get('wishlist_deleted_success'),
             reply_markup=keyboard
@@ -521,7 +601,7 @@ async def process_help_button(callback: CallbackQuery, i18n: dict[str, str]):
     Displays help information with support options.
     """
     # Create help menu keyboard with support option
-    keyboard = create_inline_kb(1, i18n, 'support_button', start_message='back_button')
+    keyboard = create_static_inline_kb(1, i18n, 'support_button', start_message='back_button')
 
     await callback.answer()
 
@@ -533,13 +613,13 @@ async def process_help_button(callback: CallbackQuery, i18n: dict[str, str]):
 
 
 # Handler for /help command
-@router.message(Command(commands='/help'), StateFilter(default_state))
+@router.message(Command('help'), StateFilter(default_state))
 async def process_help_command(message: Message, i18n: dict[str, str]):
     """
     Handles the /help command via message (alternative to button click).
     """
     # Create help keyboard
-    keyboard = create_inline_kb(1, i18n, 'support_button')
+    keyboard = create_static_inline_kb(1, i18n, 'support_button')
 
     # Send help message
     await message.answer(
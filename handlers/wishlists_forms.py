@@ -2,15 +2,18 @@ import logging
 from datetime import datetime
 from typing import Optional
 
-from aiogram import Router, F
+from aiogram import Bot, Router, F
 from aiogram.exceptions import TelegramBadRequest
 from aiogram.filters import StateFilter
 from aiogram.fsm.context import FSMContext
 from aiogram.types import CallbackQuery, Message
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
-from database.requests import get_wishlist, get_or_create_user, create_or_update_wishlist
-from handlers.handlers_utils import delete_item_message
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.requests import get_wishlist, get_user_identity, create_or_update_wishlist
+from handlers.handlers_utils import MessageRef, delete_item_message, to_message_ref
+from keyboards.callback_data import ViewWishlist, EditWishlist
 from keyboards.keyboard_utils import wishlist_kb
 from states.states import FSMNewWishList
 
@@ -45,11 +48,12 @@ async def render_wishlist_edit_template(
 
 
 async def update_wishlist_message(
-        last_bot_message: Message | None,
+        bot: Bot,
+        last_bot_message: MessageRef | None,
         i18n: dict,
         state: FSMContext,
         new_message_target: Message | CallbackQuery | None = None,
-) -> Message:
+) -> MessageRef:
     data = await state.get_data()
 
     text = await render_wishlist_edit_template(data, i18n)
@@ -60,12 +64,15 @@ async def update_wishlist_message(
     )
 
     if last_bot_message:
+        chat_id, message_id = last_bot_message
         try:
-            await last_bot_message.edit_text(
+            await bot.edit_message_text(
                 text=text,
+                chat_id=chat_id,
+                message_id=message_id,
                 reply_markup=kb
             )
-            return last_bot_message
+            return chat_id, message_id
         except TelegramBadRequest:
             pass
 
@@ -74,12 +81,18 @@ async def update_wishlist_message(
             text=text,
             reply_markup=kb
         )
-    else:
+    elif new_message_target is not None:
         msg = await new_message_target.answer(
             text=text,
             reply_markup=kb
         )
-    return msg
+    else:
+        msg = await bot.send_message(
+            chat_id=last_bot_message[0],
+            text=text,
+            reply_markup=kb
+        )
+    return to_message_ref(msg)
 
 
 def validate_date(date_str: str) -> Optional[str]:
@@ -90,16 +103,16 @@ def validate_date(date_str: str) -> Optional[str]:
         return "invalid_date_format"
 
 
-@router.callback_query((F.data == 'btn_create_wishlist') | (F.data.startswith('edit_wishlist')))
-async def start_wishlist_creation(callback: CallbackQuery, i18n: dict, state: FSMContext):
+@router.callback_query((F.data == 'btn_create_wishlist') | EditWishlist.filter())
+async def start_wishlist_creation(callback: CallbackQuery, i18n: dict, state: FSMContext, session: AsyncSession,
+                                  callback_args: tuple):
     await callback.answer()
-    await delete_item_message(state)
+    await delete_item_message(callback.bot, state)
 
-    if callback.data.startswith('edit_wishlist_'):
+    if isinstance(callback_args, EditWishlist.args):
         try:
-            wishlist_id = int(callback.data.split('_')[-1])
-            wishlist = await get_wishlist(wishlist_id)
-            user = await get_or_create_user(callback.from_user.id)
+            wishlist = await get_wishlist(session, callback_args.wishlist_id)
+            user = await get_user_identity(session, callback.from_user.id)
 
             if not wishlist or wishlist.owner_id != user.id:
                 await callback.answer(i18n['access_denied'], show_alert=True)
@@ -111,7 +124,7 @@ async def start_wishlist_creation(callback: CallbackQuery, i18n: dict, state: FS
                 description=wishlist.description,
                 event_date=wishlist.event_date.strftime("%d.%m.%Y") if wishlist.event_date else None,
                 wishlist_id=wishlist.id,
-                access_uuid=wishlist.access_uuid,
+                access_uuid=str(wishlist.access_uuid),
                 is_editing=True
             )
             await state.set_state(FSMNewWishList.wishlist_info)
@@ -133,7 +146,7 @@ async def start_wishlist_creation(callback: CallbackQuery, i18n: dict, state: FS
                 ),
                 parse_mode="HTML"
             )
-            await state.update_data(last_bot_message=last_msg)
+            await state.update_data(last_bot_message=to_message_ref(last_msg))
             return
         except Exception as e:
             logger.error(f"Error loading wishlist: {e}")
@@ -154,18 +167,18 @@ async def start_wishlist_creation(callback: CallbackQuery, i18n: dict, state: FS
         reply_markup=wishlist_kb(i18n),
         parse_mode="HTML"
     )
-    await state.update_data(last_bot_message=last_msg)
+    await state.update_data(last_bot_message=to_message_ref(last_msg))
 
 
 @router.callback_query(F.data == 'cancel', StateFilter(FSMNewWishList))
-async def cancel_creation(callback: CallbackQuery, i18n: dict, state: FSMContext):
+async def cancel_creation(callback: CallbackQuery, i18n: dict, state: FSMContext, session: AsyncSession):
     await callback.answer()
     state_data = await state.get_data()
     wishlist_id = state_data.get('wishlist_id')
     if wishlist_id:
-        wishlist = await get_wishlist(wishlist_id)
+        wishlist = await get_wishlist(session, wishlist_id)
         keyboard = InlineKeyboardBuilder().button(text=i18n['back_to_wishlist'],
-                                                  callback_data=f"view_wishlist_{wishlist.access_uuid}").as_markup()
+                                                  callback_data=ViewWishlist.pack(wishlist.access_uuid)).as_markup()
     else:
         keyboard = InlineKeyboardBuilder().button(text=i18n['btn_my_wishlists'],
                                                   callback_data='btn_my_wishlists').as_markup()
@@ -179,7 +192,7 @@ async def toggle_privacy(callback: CallbackQuery, i18n: dict, state: FSMContext)
     data = await state.get_data()
     new_privacy = not data.get('is_private', False)
     await state.update_data(is_private=new_privacy)
-    await update_wishlist_message(callback.message, i18n, state)
+    await update_wishlist_message(callback.bot, to_message_ref(callback.message), i18n, state)
 
 
 @router.callback_query(F.data.startswith('edit_'), StateFilter(FSMNewWishList.wishlist_info))
@@ -216,7 +229,7 @@ async def process_title(message: Message, i18n: dict, state: FSMContext):
     except TelegramBadRequest:
         pass
 
-    new_msg = await update_wishlist_message(last_bot_message, i18n, state, message)
+    new_msg = await update_wishlist_message(message.bot, last_bot_message, i18n, state, message)
     await state.update_data(last_bot_message=new_msg)
 
 
@@ -237,7 +250,7 @@ async def process_description(message: Message, i18n: dict, state: FSMContext):
     except TelegramBadRequest:
         pass
 
-    new_msg = await update_wishlist_message(last_bot_message, i18n, state)
+    new_msg = await update_wishlist_message(message.bot, last_bot_message, i18n, state)
     await state.update_data(last_bot_message=new_msg)
 
 
@@ -259,17 +272,18 @@ async def process_date(message: Message, i18n: dict, state: FSMContext):
     except TelegramBadRequest:
         pass
 
-    new_msg = await update_wishlist_message(last_bot_message, i18n, state)
+    new_msg = await update_wishlist_message(message.bot, last_bot_message, i18n, state)
     await state.update_data(last_bot_message=new_msg)
 
 
 @router.callback_query(F.data == 'confirm', StateFilter(FSMNewWishList.wishlist_info))
-async def confirm_wishlist(callback: CallbackQuery, i18n: dict, state: FSMContext):
+async def confirm_wishlist(callback: CallbackQuery, i18n: dict, state: FSMContext, session: AsyncSession):
     await callback.answer()
     data = await state.get_data()
     try:
         event_date = datetime.strptime(data['event_date'], "%d.%m.%Y") if data.get('event_date') else None
         wishlist = await create_or_update_wishlist(
+            session,
             user_id=callback.from_user.id,
             username=callback.from_user.username,
             title=data['title'],
@@ -278,10 +292,11 @@ async def confirm_wishlist(callback: CallbackQuery, i18n: dict, state: FSMContex
             event_date=event_date,
             wishlist_id=data.get('wishlist_id')
         )
+        await session.commit()
         await callback.message.edit_text(
             text=i18n['wishlist_created'].format(title=wishlist.title),
             reply_markup=InlineKeyboardBuilder()
-            .button(text=i18n['view_wishlist'], callback_data=f"view_wishlist_{wishlist.access_uuid}")
+            .button(text=i18n['view_wishlist'], callback_data=ViewWishlist.pack(wishlist.access_uuid))
             .as_markup()
         )
         await state.clear()
@@ -0,0 +1,65 @@
+from collections import OrderedDict
+from typing import Callable, Hashable
+
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from pydantic import ConfigDict
+
+
+class FrozenInlineKeyboardButton(InlineKeyboardButton):
+    model_config = ConfigDict(frozen=True)
+
+
+class FrozenInlineKeyboardMarkup(InlineKeyboardMarkup):
+    """Markup that can't be reassigned; cached instances are shared by all updates"""
+    model_config = ConfigDict(frozen=True)
+
+
+class KeyboardCache:
+    """
+    Bounded LRU cache of prebuilt keyboards, keyed by (lexicon, layout, args).
+
+    Lexicons are the module-level dicts from lexicon/, so they are keyed by
+    identity; every entry keeps a reference to its lexicon, so the id can't be
+    reused by another dict while the entry lives.
+    """
+
+    def __init__(self, maxsize: int = 4096):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[tuple, tuple[dict, InlineKeyboardMarkup]] = OrderedDict()
+
+    def get_or_build(
+            self,
+            i18n: dict[str, str],
+            layout: str,
+            args: Hashable,
+            build: Callable[[], InlineKeyboardMarkup]
+    ) -> InlineKeyboardMarkup:
+        key = (id(i18n), layout, args)
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] is i18n:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        markup = build()
+        self._entries[key] = (i18n, markup)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return markup
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+
+keyboard_cache = KeyboardCache()
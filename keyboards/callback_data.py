@@ -0,0 +1,227 @@
+"""
+Compact callback data for buttons that carry ids.
+
+Telegram allows 64 bytes of callback data. Instead of ``view_wishlist_<uuid>``
+(50 bytes) such buttons carry ``<tag>:<payload>``, where the payload is the
+button's fields packed into bytes and base64url-encoded without padding: ints
+are unsigned LEB128 varints (one byte up to 127, three up to ~2M), UUIDs their
+16 raw bytes and bools a single byte. ``view_wishlist`` takes 25 bytes that
+way, ``next_item`` with a wishlist id and a position around 10.
+
+Every schema registers its tag. compile_callback_routes() gives the route of
+``Schema.filter()`` the schema's decoder, so the payload is decoded once per
+update, when the trie matches, and handlers get the typed fields as a named
+tuple in ``callback_args``. Buttons sent before the switch carry the old
+``<name>_<arg>_<arg>`` format; ``filter()`` matches it too and decodes it the
+old way, so they keep working.
+"""
+import binascii
+import uuid
+from base64 import b64decode, urlsafe_b64encode
+from collections import namedtuple
+from typing import Any, Callable, NamedTuple, Optional
+
+from aiogram import F
+from magic_filter import MagicFilter
+
+MAX_CALLBACK_DATA = 64
+
+_schemas: dict[str, 'CallbackSchema'] = {}
+_legacy_prefixes: dict[str, 'CallbackSchema'] = {}
+
+
+def _encode_int(buffer: bytearray, value: int) -> None:
+    if value < 0:
+        raise ValueError(f'Callback ints must not be negative, got {value}')
+    while value > 0x7f:
+        buffer.append(value & 0x7f | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def _decode_int(raw: bytes, offset: int) -> tuple[int, int]:
+    value = shift = 0
+    while True:
+        if offset >= len(raw):
+            raise ValueError('Truncated int in callback data')
+        byte = raw[offset]
+        offset += 1
+        value |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            if not byte and shift:
+                raise ValueError('Overlong int in callback data')
+            return value, offset
+        shift += 7
+
+
+def _encode_uuid(buffer: bytearray, value: uuid.UUID | str) -> None:
+    buffer += (value if isinstance(value, uuid.UUID) else uuid.UUID(value)).bytes
+
+
+def _decode_uuid(raw: bytes, offset: int) -> tuple[uuid.UUID, int]:
+    if offset + 16 > len(raw):
+        raise ValueError('Truncated uuid in callback data')
+    return uuid.UUID(bytes=bytes(raw[offset:offset + 16])), offset + 16
+
+
+def _encode_bool(buffer: bytearray, value: bool) -> None:
+    buffer.append(1 if value else 0)
+
+
+def _decode_bool(raw: bytes, offset: int) -> tuple[bool, int]:
+    if offset >= len(raw):
+        raise ValueError('Truncated bool in callback data')
+    if raw[offset] > 1:
+        raise ValueError(f'Invalid bool {raw[offset]} in callback data')
+    return raw[offset] == 1, offset + 1
+
+
+def _parse_legacy_int(part: str) -> int:
+    # int() would also take signs, spaces and non-ASCII digits
+    if not (part.isascii() and part.isdigit()):
+        raise ValueError(f'Invalid int {part!r} in callback data')
+    return int(part)
+
+
+def _parse_legacy_bool(part: str) -> bool:
+    if part not in ('0', '1'):
+        raise ValueError(f'Invalid bool {part!r} in callback data')
+    return part == '1'
+
+
+# Field type -> (encoder, decoder, parser of the old underscore format)
+_CODECS: dict[type, tuple[Callable, Callable, Callable[[str], Any]]] = {
+    int: (_encode_int, _decode_int, _parse_legacy_int),
+    uuid.UUID: (_encode_uuid, _decode_uuid, uuid.UUID),
+    bool: (_encode_bool, _decode_bool, _parse_legacy_bool),
+}
+
+
+class CallbackSchema:
+    """
+    A kind of button with typed fields, e.g.
+    ``CallbackSchema('vw', 'view_wishlist', access_uuid=uuid.UUID)``.
+    A field given as ``(type, default)`` may be omitted when packing; trailing
+    fields with defaults may also be missing from old-format data.
+
+    `name` is the prefix the buttons used before the compact format; it is
+    still accepted and labels the handler metrics.
+    """
+
+    def __init__(self, tag: str, name: str, **fields: type | tuple[type, Any]):
+        if not tag or ':' in tag:
+            raise ValueError(f'Invalid callback tag {tag!r}')
+        if tag in _schemas:
+            raise ValueError(f'Callback tag {tag!r} is already used by {_schemas[tag].name}')
+
+        types = {}
+        defaults = []
+        for field, spec in fields.items():
+            kind = spec[0] if isinstance(spec, tuple) else spec
+            if kind not in _CODECS:
+                raise TypeError(f'Unsupported callback field type {kind!r} of {name}.{field}')
+            if isinstance(spec, tuple):
+                defaults.append(spec[1])
+            elif defaults:
+                raise TypeError(f'Field {name}.{field} without a default follows fields with defaults')
+            types[field] = kind
+
+        self.tag = tag
+        self.name = name
+        self.prefix = f'{tag}:'
+        self.legacy_prefix = f'{name}_'
+        self.fields = types
+        self.args = namedtuple(''.join(part.title() for part in name.split('_')), types, defaults=defaults)
+        _schemas[tag] = self
+        _legacy_prefixes[self.legacy_prefix] = self
+
+    @property
+    def prefixes(self) -> tuple[str, str]:
+        return self.prefix, self.legacy_prefix
+
+    def pack(self, *args: Any, **kwargs: Any) -> str:
+        values = self.args(*args, **kwargs)
+        buffer = bytearray()
+        for value, kind in zip(values, self.fields.values()):
+            _CODECS[kind][0](buffer, value)
+        data = self.prefix + urlsafe_b64encode(buffer).rstrip(b'=').decode()
+        if len(data) > MAX_CALLBACK_DATA:
+            raise ValueError(f'Callback data of {self.name} is {len(data)} bytes, Telegram allows {MAX_CALLBACK_DATA}')
+        return data
+
+    def unpack(self, payload: str) -> NamedTuple:
+        """Fields of the payload after the prefix; ValueError if it isn't valid"""
+        try:
+            raw = b64decode(payload + '=' * (-len(payload) % 4), altchars=b'-_', validate=True)
+        except binascii.Error as e:
+            raise ValueError(f'Invalid {self.name} callback payload: {e}') from e
+        # The decoder also takes '+', '/' and set padding bits; only what pack() produces is valid
+        if urlsafe_b64encode(raw).rstrip(b'=').decode() != payload:
+            raise ValueError(f'Non-canonical {self.name} callback payload')
+
+        values = []
+        offset = 0
+        for kind in self.fields.values():
+            value, offset = _CODECS[kind][1](raw, offset)
+            values.append(value)
+        if offset != len(raw):
+            raise ValueError(f'Trailing bytes in {self.name} callback payload')
+        return self.args(*values)
+
+    def unpack_legacy(self, rest: str) -> NamedTuple:
+        """Fields of old ``<name>_<arg>_<arg>`` data, given what follows the prefix"""
+        parts = rest.split('_') if rest else []
+        required = len(self.fields) - len(self.args._field_defaults)
+        if not required <= len(parts) <= len(self.fields):
+            raise ValueError(f'Expected {len(self.fields)} arguments in {self.name} callback, got {len(parts)}')
+        return self.args(*(_CODECS[kind][2](part) for part, kind in zip(parts, self.fields.values())))
+
+    def filter(self) -> MagicFilter:
+        """Matches the compact and the old format; compiled into the callback trie"""
+        return F.data.startswith(self.prefix) | F.data.startswith(self.legacy_prefix)
+
+
+def find_schema(data: str) -> Optional[CallbackSchema]:
+    """Schema of compact callback data, None for anything else"""
+    tag, separator, _ = data.partition(':')
+    return _schemas.get(tag) if separator else None
+
+
+def callback_decoder(prefix: str) -> Optional[Callable[[str], NamedTuple]]:
+    """Decoder of the data after a prefix produced by CallbackSchema.filter(), None for other prefixes"""
+    if prefix.endswith(':') and prefix[:-1] in _schemas:
+        return _schemas[prefix[:-1]].unpack
+    if prefix in _legacy_prefixes:
+        return _legacy_prefixes[prefix].unpack_legacy
+    return None
+
+
+ViewWishlist = CallbackSchema('vw', 'view_wishlist', access_uuid=uuid.UUID)
+EditWishlist = CallbackSchema('we', 'edit_wishlist', wishlist_id=int)
+DeleteWishlist = CallbackSchema('wd', 'delete_wishlist', wishlist_id=int)
+
+Subscribe = CallbackSchema('su', 'subscribe', wishlist_id=int)
+Unsubscribe = CallbackSchema('us', 'unsubscribe', wishlist_id=int)
+ApproveSubscription = CallbackSchema('sa', 'approve_sub', subscriber_id=int, wishlist_id=int)
+RejectSubscription = CallbackSchema('sr', 'reject_sub', subscriber_id=int, wishlist_id=int)
+
+AddItem = CallbackSchema('ia', 'add_item', wishlist_id=int)
+EditItem = CallbackSchema('ie', 'edit_item', item_id=int)
+
+# Carousel view, see database.requests.get_carousel_item: ItemOrder value, whether only
+# unreserved items are shown and the price limit (0 for none)
+CAROUSEL_VIEW = {'order': (int, 0), 'only_unreserved': (bool, False), 'max_price': (int, 0)}
+
+# Reservation buttons carry the carousel position and view to redraw the item after the click
+ReserveItem = CallbackSchema('ir', 'reserve_item', wishlist_id=int, item_id=int, position=int, **CAROUSEL_VIEW)
+UnreserveItem = CallbackSchema('iu', 'unreserve_item', wishlist_id=int, item_id=int, position=int, **CAROUSEL_VIEW)
+# Carousel buttons carry the position they were pressed at
+NextItem = CallbackSchema('in', 'next_item', wishlist_id=int, position=int, **CAROUSEL_VIEW)
+PrevItem = CallbackSchema('ip', 'prev_item', wishlist_id=int, position=int, **CAROUSEL_VIEW)
+# Switches the carousel to another view, starting from its first item
+ItemView = CallbackSchema('iv', 'item_view', wishlist_id=int, **CAROUSEL_VIEW)
+
+# Search results from the given offset; the query is kept in the FSM data, it may not fit in callback data
+SearchResults = CallbackSchema('sp', 'search_results', offset=int)
+# Opens an item found by search in its wishlist carousel
+OpenItem = CallbackSchema('io', 'open_item', item_id=int)
@@ -1,112 +1,190 @@
-from typing import Optional
+import math
+from itertools import chain, repeat
+from typing import Iterable, Optional
 
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-from aiogram.utils.keyboard import InlineKeyboardBuilder
 
-from database.models import Item, User
+from database.requests import CarouselItem, ItemOrder, SearchPage, SEARCH_PAGE_SIZE
+from keyboards.callback_data import EditItem, ReserveItem, UnreserveItem, NextItem, PrevItem, ItemView, \
+    ViewWishlist, SearchResults, OpenItem
+from keyboards.cache import keyboard_cache, FrozenInlineKeyboardButton, FrozenInlineKeyboardMarkup
 
+# (text, callback data)
+Button = tuple[str, str]
 
-def create_inline_kb(
-        width: int,
-        i18n: dict[str, str],
-        *args: str,
-        **kwargs: str
-) -> InlineKeyboardMarkup:
-    kb_builder = InlineKeyboardBuilder()
-
-    buttons: list[InlineKeyboardButton] = []
-
-    if args:
-        for button in args:
-            if button in i18n.keys():
-                text = i18n.get(button)
-            else:
-                text = button
-            buttons.append(InlineKeyboardButton(
-                text=text,
-                callback_data=button
-            ))
-    if kwargs:
-        for button, text in kwargs.items():
-            if text in i18n.keys():
-                text = i18n.get(text)
-            buttons.append(InlineKeyboardButton(
-                text=text,
-                callback_data=button
-            ))
-
-    kb_builder.row(*buttons, width=width)
-
-    return kb_builder.as_markup()
 
+def build_markup(rows: Iterable[Iterable[Button]], frozen: bool = False) -> InlineKeyboardMarkup:
+    """
+    Builds the markup straight from rows of buttons, which is several times
+    faster than going through InlineKeyboardBuilder when the layout is known
+    """
+    if frozen:
+        return FrozenInlineKeyboardMarkup(inline_keyboard=[
+            [FrozenInlineKeyboardButton(text=text, callback_data=data) for text, data in row] for row in rows
+        ])
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text=text, callback_data=data) for text, data in row] for row in rows
+    ])
 
-def wishlist_kb(i18n: dict, is_private: Optional[bool] = None) -> InlineKeyboardMarkup:
-    builder = InlineKeyboardBuilder()
-
-    builder.button(text=i18n['btn_edit_title'], callback_data="edit_title")
 
-    privacy_text = i18n['btn_make_private'] if not is_private else i18n['btn_make_public']
-    builder.button(text=privacy_text, callback_data="toggle_privacy")
+def split_rows(buttons: list[Button], *sizes: int) -> list[list[Button]]:
+    """Splits buttons into rows the way InlineKeyboardBuilder.adjust() does: the last size repeats"""
+    rows = []
+    start = 0
+    for size in chain(sizes, repeat(sizes[-1])):
+        if start >= len(buttons):
+            return rows
+        rows.append(buttons[start:start + size])
+        start += size
+    return rows
 
-    builder.button(text=i18n['btn_edit_description'], callback_data="edit_description")
-    builder.button(text=i18n['btn_edit_date'], callback_data="edit_date")
 
-    # Кнопки подтверждения/отмены
-    builder.button(text=i18n['btn_cancel'], callback_data="cancel")
-    builder.button(text=i18n['btn_confirm'], callback_data="confirm")
+def _inline_rows(width: int, i18n: dict[str, str], args: tuple[str, ...], kwargs: dict[str, str]) -> list[list[Button]]:
+    buttons: list[Button] = [(i18n.get(button, button), button) for button in args]
+    buttons.extend((i18n.get(text, text), button) for button, text in kwargs.items())
+    return split_rows(buttons, width)
 
-    # Распределяем кнопки по рядам
-    builder.adjust(1,1,1,1,2)
 
-    return builder.as_markup()
-
-def item_kb(i18n: dict) -> InlineKeyboardMarkup:
-    builder = InlineKeyboardBuilder()
-
-    builder.button(text=i18n['btn_edit_name'], callback_data="edit_name")
-    builder.button(text=i18n["btn_edit_description"], callback_data="edit_description")
-
-    builder.button(text=i18n['btn_edit_link'], callback_data="edit_link")
-    builder.button(text=i18n['btn_edit_price'], callback_data="edit_price")
-    builder.button(text=i18n['btn_edit_priority'], callback_data="edit_priority")
-    builder.button(text=i18n['btn_edit_photo'], callback_data="edit_photo")
-    builder.button(text=i18n['btn_remove_photo'], callback_data="remove_photo")
+def create_inline_kb(
+        width: int,
+        i18n: dict[str, str],
+        *args: str,
+        **kwargs: str
+) -> InlineKeyboardMarkup:
+    """
+    Positional args are callback data that double as lexicon keys of the button
+    text, kwargs map callback data to a lexicon key or a literal text.
+    Built on every call, for keyboards that carry ids of the user's data.
+    """
+    return build_markup(_inline_rows(width, i18n, args, kwargs))
 
-    # Кнопки подтверждения/отмены
-    builder.button(text=i18n['btn_cancel'], callback_data="cancel")
-    builder.button(text=i18n['btn_confirm'], callback_data="confirm_item")
 
-    # Распределяем кнопки по рядам
-    builder.adjust(1,1,1,1,1,1,1,2)
+def create_static_inline_kb(
+        width: int,
+        i18n: dict[str, str],
+        *args: str,
+        **kwargs: str
+) -> InlineKeyboardMarkup:
+    """
+    create_inline_kb() for keyboards that are the same for every user, such as
+    menus and back buttons. The markup is cached and shared, it must not be modified.
+    """
+    def build() -> InlineKeyboardMarkup:
+        return build_markup(_inline_rows(width, i18n, args, kwargs), frozen=True)
 
-    return builder.as_markup()
+    return keyboard_cache.get_or_build(i18n, f'inline_{width}', (args, tuple(kwargs.items())), build)
 
 
-def create_item_keyboard(item: Item, i18n: dict, curr: int, total: int, is_owner=False) -> InlineKeyboardMarkup:
-    builder = InlineKeyboardBuilder()
+def wishlist_kb(i18n: dict, is_private: Optional[bool] = None) -> InlineKeyboardMarkup:
+    def build() -> InlineKeyboardMarkup:
+        privacy_text = i18n['btn_make_private'] if not is_private else i18n['btn_make_public']
+        return build_markup([
+            [(i18n['btn_edit_title'], "edit_title")],
+            [(privacy_text, "toggle_privacy")],
+            [(i18n['btn_edit_description'], "edit_description")],
+            [(i18n['btn_edit_date'], "edit_date")],
+            # Кнопки подтверждения/отмены
+            [(i18n['btn_cancel'], "cancel"), (i18n['btn_confirm'], "confirm")],
+        ], frozen=True)
+
+    return keyboard_cache.get_or_build(i18n, 'wishlist', bool(is_private), build)
 
-    if is_owner:
-        builder.button(
-            text=i18n['btn_edit'],
-            callback_data=f"edit_item_{item.id}"
-        )
+def item_kb(i18n: dict) -> InlineKeyboardMarkup:
+    def build() -> InlineKeyboardMarkup:
+        return build_markup([
+            [(i18n['btn_edit_name'], "edit_name")],
+            [(i18n["btn_edit_description"], "edit_description")],
+            [(i18n['btn_edit_link'], "edit_link")],
+            [(i18n['btn_edit_price'], "edit_price")],
+            [(i18n['btn_edit_priority'], "edit_priority")],
+            [(i18n['btn_edit_photo'], "edit_photo")],
+            [(i18n['btn_remove_photo'], "remove_photo")],
+            # Кнопки подтверждения/отмены
+            [(i18n['btn_cancel'], "cancel"), (i18n['btn_confirm'], "confirm_item")],
+        ], frozen=True)
+
+    return keyboard_cache.get_or_build(i18n, 'item', (), build)
+
+
+def create_view_buttons(carousel: CarouselItem, i18n: dict) -> list[Button]:
+    """
+    Buttons that switch the carousel ordering and filters. Owners don't get the
+    reservation-based ones, so the carousel never tells them what is reserved.
+    """
+    item = carousel.item
+    only_unreserved, max_price = carousel.only_unreserved, carousel.max_price or 0
+
+    orders = list(ItemOrder) if not carousel.is_owner else [order for order in ItemOrder
+                                                            if order != ItemOrder.UNRESERVED]
+    current = carousel.order if carousel.order in orders else orders[0]
+    next_order = orders[(orders.index(current) + 1) % len(orders)]
+    buttons = [(
+        i18n['btn_item_order'].format(order=i18n[f'item_order_{current.name.lower()}']),
+        ItemView.pack(item.wishlist_id, next_order, only_unreserved, max_price)
+    )]
+
+    if not carousel.is_owner:
+        buttons.append((
+            i18n['btn_all_items' if only_unreserved else 'btn_only_unreserved'],
+            ItemView.pack(item.wishlist_id, carousel.order, not only_unreserved, max_price)
+        ))
+
+    if max_price:
+        buttons.append((i18n['btn_any_price'], ItemView.pack(item.wishlist_id, carousel.order, only_unreserved, 0)))
+    elif item.price:
+        price = math.ceil(item.price)
+        buttons.append((
+            i18n['btn_max_price'].format(price=price),
+            ItemView.pack(item.wishlist_id, carousel.order, only_unreserved, price)
+        ))
+    return buttons
+
+
+def create_item_keyboard(carousel: CarouselItem, i18n: dict) -> InlineKeyboardMarkup:
+    item = carousel.item
+    curr, total = carousel.position, carousel.total
+    view = (carousel.order, carousel.only_unreserved, carousel.max_price or 0)
+
+    if carousel.is_owner:
+        action = (i18n['btn_edit'], EditItem.pack(item.id))
+    elif carousel.reserved_by_viewer:
+        action = (i18n['btn_unreserve'], UnreserveItem.pack(item.wishlist_id, item.id, curr, *view))
+    elif not item.is_reserved:
+        action = (i18n['btn_reserve'], ReserveItem.pack(item.wishlist_id, item.id, curr, *view))
     else:
-        if not item.is_reserved:
-            builder.button(
-                text=i18n['btn_reserve'],
-                callback_data=f"reserve_item_{item.id}"
-            )
-        else:
-            builder.button(
-                text=i18n['btn_reserved'],
-                callback_data="already_reserved"
-            )
+        action = (i18n['btn_reserved'], "already_reserved")
 
     # Кнопки навигации
+    navigation: list[Button] = []
     if curr > 1:
-        builder.button(text="<<", callback_data=f"prev_item_{item.wishlist_id}_{curr}")
+        navigation.append(("<<", PrevItem.pack(item.wishlist_id, curr, *view)))
     if curr < total:
-        builder.button(text=">>", callback_data=f"next_item_{item.wishlist_id}_{curr}")
+        navigation.append((">>", NextItem.pack(item.wishlist_id, curr, *view)))
 
-    builder.adjust(1, 3)
-    return builder.as_markup()
\ No newline at end of file
+    rows = [[action], navigation] if navigation else [[action]]
+    rows.append(create_view_buttons(carousel, i18n))
+    # Changes with every item, so it is built fresh without InlineKeyboardBuilder
+    return build_markup(rows)
+
+
+def create_search_keyboard(page: SearchPage, offset: int, i18n: dict) -> InlineKeyboardMarkup:
+    """A button per hit: items open in their carousel, wishlists on their screen"""
+    rows: list[list[Button]] = []
+    for hit in page.hits:
+        if hit.item_id is None:
+            rows.append([(i18n['btn_search_wishlist'].format(title=hit.wishlist_title),
+                          ViewWishlist.pack(hit.access_uuid))])
+        else:
+            rows.append([(i18n['btn_search_item'].format(name=hit.item_name, title=hit.wishlist_title),
+                          OpenItem.pack(hit.item_id))])
+
+    navigation: list[Button] = []
+    if offset > 0:
+        navigation.append(("<<", SearchResults.pack(max(0, offset - SEARCH_PAGE_SIZE))))
+    if page.next_offset is not None:
+        navigation.append((">>", SearchResults.pack(page.next_offset)))
+    if navigation:
+        rows.append(navigation)
+
+    rows.append([(i18n['back_button'], 'start_message')])
+    return build_markup(rows)
@@ -62,6 +62,9 @@ Reserve gifts secretly and make their day!''',
     'admin_newsletter_confirm': 'Are you sure you want to send this message to all users?',
     'admin_newsletter_started': '⏳ Newsletter started...',
     'admin_newsletter_canceled': '❌ Newsletter canceled',
+    'admin_metrics_header': '📈 Latency since start, p50 / p99 in ms (count):',
+    'admin_metrics_empty': 'No updates handled yet',
+    'admin_newsletter_progress': '⏳ Newsletter in progress...\n\n• Processed: {done} of {total}\n• Successfully sent: {success}\n• Failed to send: {failed}',
     'admin_newsletter_stats': '📊 Newsletter statistics:\n\n• Total users: {total}\n• Successfully sent: {success}\n• Failed to send: {failed}',
     'confirm_yes': '✅ Yes, send',
     'confirm_no': '❌ Cancel',
@@ -198,6 +201,33 @@ Reserve gifts secretly and make their day!''',
     "btn_reserve": "🎁 Reserve",
     "btn_reserved": "✅ Reserved",
     "btn_already_reserved": "⛔ Already reserved",
+    "btn_unreserve": "✅ Reserved by you · Cancel",
+    "item_reserved_success": "🎁 The gift is reserved for you",
+    "item_unreserved_success": "↩️ Reservation cancelled",
+    "item_already_reserved": "⛔ Someone has already reserved this gift",
+
+    "btn_item_order": "🔀 {order}",
+    "item_order_added": "By date added",
+    "item_order_priority": "By priority",
+    "item_order_price": "By price",
+    "item_order_unreserved": "Available first",
+    "btn_only_unreserved": "🎁 Available only",
+    "btn_all_items": "📦 All gifts",
+    "btn_max_price": "💰 Up to {price}",
+    "btn_any_price": "💰 Any price",
+    "no_items_in_view": "No gifts match these filters",
+
+    "search_usage": "🔎 Send <code>/search</code> with the words to look for, e.g. <code>/search headphones</code>. "
+                    "You can also type the bot's username and the words in any chat.",
+    "search_results": "🔎 Found in your and your friends' wishlists for «{query}»:",
+    "search_no_results": "🔎 Nothing found for «{query}» in your and your friends' wishlists",
+    "search_expired": "The search has expired, send /search again",
+    "btn_search_item": "🎁 {name} · {title}",
+    "btn_search_wishlist": "📋 {title}",
+    "item_not_found": "Gift not found",
+    "inline_search_item": "🎁 <b>{name}</b>\n💰 {price_label}: {price}\n📋 {title}: {url}",
+    "inline_search_wishlist": "📋 <b>{title}</b>\n{url}",
+    "inline_search_wishlist_description": "Wishlist",
 
     "item_updated": "✅ Gift \"{name}\" successfully updated!",
 
@@ -62,6 +62,9 @@ LEXICON_RU = {
     'admin_newsletter_confirm': 'Вы уверены, что хотите разослать это сообщение всем пользователям?',
     'admin_newsletter_started': '⏳ Начата рассылка...',
     'admin_newsletter_canceled': '❌ Рассылка отменена',
+    'admin_metrics_header': '📈 Задержки с момента запуска, p50 / p99 в мс (количество):',
+    'admin_metrics_empty': 'Обновлений ещё не было',
+    'admin_newsletter_progress': '⏳ Идёт рассылка...\n\n• Обработано: {done} из {total}\n• Успешно отправлено: {success}\n• Не удалось отправить: {failed}',
     'admin_newsletter_stats': '📊 Статистика рассылки:\n\n• Всего пользователей: {total}\n• Успешно отправлено: {success}\n• Не удалось отправить: {failed}',
     'confirm_yes': '✅ Да, отправить',
     'confirm_no': '❌ Отменить',
@@ -193,6 +196,33 @@ LEXICON_RU = {
     "btn_reserve": "🎁 Забронировать",
     "btn_reserved": "✅ Забронировано",
     "btn_already_reserved": "⛔ Уже забронировано",
+    "btn_unreserve": "✅ Забронировано вами · Отменить",
+    "item_reserved_success": "🎁 Подарок забронирован за вами",
+    "item_unreserved_success": "↩️ Бронь отменена",
+    "item_already_reserved": "⛔ Этот подарок уже кто-то забронировал",
+
+    "btn_item_order": "🔀 {order}",
+    "item_order_added": "По дате добавления",
+    "item_order_priority": "По приоритету",
+    "item_order_price": "По цене",
+    "item_order_unreserved": "Сначала свободные",
+    "btn_only_unreserved": "🎁 Только свободные",
+    "btn_all_items": "📦 Все подарки",
+    "btn_max_price": "💰 До {price}",
+    "btn_any_price": "💰 Любая цена",
+    "no_items_in_view": "Нет подарков, подходящих под фильтры",
+
+    "search_usage": "🔎 Отправьте <code>/search</code> и слова для поиска, например <code>/search наушники</code>. "
+                    "А ещё можно набрать имя бота и слова в любом чате.",
+    "search_results": "🔎 Найдено в ваших списках и списках друзей по запросу «{query}»:",
+    "search_no_results": "🔎 По запросу «{query}» ничего не найдено в ваших списках и списках друзей",
+    "search_expired": "Поиск устарел, отправьте /search ещё раз",
+    "btn_search_item": "🎁 {name} · {title}",
+    "btn_search_wishlist": "📋 {title}",
+    "item_not_found": "Подарок не найден",
+    "inline_search_item": "🎁 <b>{name}</b>\n💰 {price_label}: {price}\n📋 {title}: {url}",
+    "inline_search_wishlist": "📋 <b>{title}</b>\n{url}",
+    "inline_search_wishlist_description": "Список желаний",
 
     "item_updated": "✅ Подарок \"{name}\" успешно обновлен!",
 
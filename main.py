@@ -1,13 +1,21 @@
 import asyncio
 import logging
+import multiprocessing
+import re
+from urllib.parse import urlsplit
 
+from aiohttp import web
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
-from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.fsm.storage.base import BaseStorage
+from aiogram.fsm.storage.redis import RedisStorage, DefaultKeyBuilder
+from aiogram.webhook.aiohttp_server import setup_application
+from redis.asyncio import Redis, ConnectionPool
 
-from config.config import Config, load_config
-from handlers import user, wishlists_forms, other, items_forms
+from config.config import Config, RedisConfig, WebhookConfig, load_config
+from config.log import setup_logging, dropped_records
+from handlers import user, wishlists_forms, other, items_forms, search
 from handlers.admin import admin_router
 
 
@@ -16,39 +24,95 @@ from lexicon.lexicon_ru import LEXICON_RU
 
 from middlewares.i18n import TranslatorMiddleware
 
-from database.models import async_main
+from database import models
+from database.models import async_main, async_session, setup_engine
+from database.user_cache import user_cache
+from middlewares.database import DatabaseMiddleware
+from external_services.broadcast import resume_broadcasts
+from external_services.metrics import metrics, start_metrics_server
+from middlewares.callback_router import compile_callback_routes
+from middlewares.executor import OrderedExecutorMiddleware, BackpressureRequestHandler
 from middlewares.logging import LoggerMiddleware
+from middlewares.metrics import HandlerMetricsMiddleware
+from middlewares.throttling import NavigationThrottleMiddleware
+from states.storage import BoundedMemoryStorage
 
 logger = logging.getLogger(__name__)
 
+# What Telegram accepts as a webhook secret_token
+WEBHOOK_SECRET_PATTERN = re.compile(r'[A-Za-z0-9_-]{1,256}')
+
 translations = {
     'default': 'en',
     'en': LEXICON_EN,
     'ru': LEXICON_RU
 }
 
-async def main():
-    logging.getLogger("aiogram.event").setLevel(logging.WARNING)
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(filename)s:%(lineno)d #%(levelname)-8s '
-               '[%(asctime)s] - %(name)s - %(message)s'
-    )
-    logger.info('Starting bot')
+def create_storage(config: Config) -> BaseStorage:
+    """FSM storage: in-process memory by default, Redis when USE_REDIS is set"""
+    if not config.bot.use_redis:
+        return BoundedMemoryStorage(state_ttl=config.fsm.state_ttl, max_states=config.fsm.max_states)
 
-    config: Config = load_config()
-    
-    storage = MemoryStorage()
+    redis_config: RedisConfig = config.redis
+    pool = ConnectionPool.from_url(redis_config.url, max_connections=redis_config.max_connections)
+    return RedisStorage(
+        redis=Redis(connection_pool=pool),
+        key_builder=DefaultKeyBuilder(prefix=redis_config.key_prefix, with_destiny=True),
+        state_ttl=config.fsm.state_ttl,
+        data_ttl=config.fsm.state_ttl
+    )
 
-    bot = Bot(
+def create_bot(config: Config) -> Bot:
+    return Bot(
         token=config.bot.token,
         default=DefaultBotProperties(parse_mode=ParseMode.HTML)
     )
-    dp = Dispatcher(storage=storage)
+
+def create_dispatcher(config: Config, is_primary: bool = True, metrics_port: int | None = None) -> Dispatcher:
+    """
+    :param is_primary: Only the primary process resumes broadcasts
+    :param metrics_port: Port of the /metrics endpoint, METRICS_PORT by default; 0 disables it
+    """
+    storage = create_storage(config)
+    logger.info('Using %s for FSM', type(storage).__name__)
+
+    executor = OrderedExecutorMiddleware(
+        max_concurrency=config.updates.max_concurrency,
+        max_pending=config.updates.max_pending,
+        max_user_pending=config.updates.max_user_pending
+    )
+
+    if isinstance(storage, RedisStorage):
+        # Serializes updates of one chat across all workers sharing the storage
+        dp = Dispatcher(storage=storage, events_isolation=storage.create_isolation(),
+                        translations=translations, is_primary=is_primary, update_executor=executor)
+    else:
+        dp = Dispatcher(storage=storage, translations=translations, is_primary=is_primary,
+                        update_executor=executor)
+        metrics.gauge('fsm_storage_states', 'FSM states kept in memory', lambda: storage.stats()['size'])
+        metrics.gauge('fsm_storage_bytes', 'Approximate size of the in-memory FSM data',
+                      lambda: storage.stats()['bytes'])
+
+    dp['metrics_host'] = config.metrics.host
+    dp['metrics_port'] = config.metrics.port if metrics_port is None else metrics_port
+    metrics.gauge('updates_pending', 'Updates accepted and not finished yet', lambda: executor.stats()['pending'])
+    metrics.gauge('updates_running', 'Updates running their handlers', lambda: executor.stats()['running'])
+    metrics.gauge('updates_waiting', 'Updates queued behind their user or the concurrency limit',
+                  lambda: executor.stats()['waiting'])
+    metrics.counter('updates_dropped_total', 'Updates dropped because their user had too many queued',
+                    lambda: executor.stats()['dropped'])
+    metrics.gauge('user_cache_size', 'User identities cached in this process', lambda: user_cache.stats()['size'])
+    metrics.counter('user_cache_hits_total', 'User identity lookups served from the cache',
+                    lambda: user_cache.stats()['hits'])
+    metrics.counter('user_cache_misses_total', 'User identity lookups that went to the database',
+                    lambda: user_cache.stats()['misses'])
+    metrics.counter('log_records_dropped_total', 'Log records dropped because the log queue was full',
+                    dropped_records)
 
     logger.info('Connecting routers')
 
     dp.include_router(user.router)
+    dp.include_router(search.router)
     dp.include_router(wishlists_forms.router)
     dp.include_router(admin_router)
     dp.include_router(items_forms.router)
@@ -57,21 +121,151 @@ async def main():
 
     logger.info('Connecting middleware')
 
+    # Outer, so navigation spam is coalesced and updates are ordered per user
+    # before any other middleware runs
+    dp.update.outer_middleware(NavigationThrottleMiddleware())
+    dp.update.outer_middleware(executor)
     dp.update.middleware(TranslatorMiddleware())
-    dp.update.middleware(LoggerMiddleware())
+    dp.update.middleware(LoggerMiddleware(sample_rate=config.log.sample_rate, slow_ms=config.log.slow_ms))
+    dp.update.middleware(DatabaseMiddleware(async_session))
+    # Every callback is matched against all handlers' F.data filters once, through a trie
+    dp.callback_query.outer_middleware(compile_callback_routes(dp))
+    dp.message.middleware(HandlerMetricsMiddleware('message', query_budget=config.db.query_budget))
+    dp.callback_query.middleware(HandlerMetricsMiddleware('callback_query', query_budget=config.db.query_budget))
+    dp.inline_query.middleware(HandlerMetricsMiddleware('inline_query', query_budget=config.db.query_budget))
 
     logger.info('Init database')
 
     dp.startup.register(startup)
+    dp.shutdown.register(shutdown)
+    return dp
+
+async def main():
+    config: Config = load_config()
+
+    setup_logging(config.log)
+    logger.info('Starting bot')
+
+    setup_engine(config.db)
+    await async_main()
+
+    bot = create_bot(config)
+    dp = create_dispatcher(config)
 
     await bot.delete_webhook(drop_pending_updates=True)
-    await dp.start_polling(bot, translations=translations)
+    # Polling stops fetching updates while max_pending of them are in flight
+    await dp.start_polling(bot, tasks_concurrency_limit=config.updates.max_pending)
 
-async def startup(dispatcher: Dispatcher):
+async def prepare_webhook(config: Config):
+    """Migrates the database once, before the workers start"""
+    setup_engine(config.db)
     await async_main()
+    await models.engine.dispose()
+
+async def register_webhook(dispatcher: Dispatcher, bot: Bot, webhook: WebhookConfig):
+    await bot.set_webhook(
+        url=webhook.url.rstrip('/') + webhook.path,
+        secret_token=webhook.secret,
+        allowed_updates=dispatcher.resolve_used_update_types(),
+        drop_pending_updates=True
+    )
+
+def check_webhook_config(config: Config):
+    """Webhook mode doesn't start without a public https url and a secret token Telegram sends back"""
+    url = urlsplit(config.webhook.url)
+    if url.scheme != 'https' or not url.netloc:
+        raise ValueError('USE_WEBHOOK=true needs WEBHOOK_URL, the public https base url of the bot')
+    if not config.webhook.secret or not WEBHOOK_SECRET_PATTERN.fullmatch(config.webhook.secret):
+        raise ValueError('USE_WEBHOOK=true needs WEBHOOK_SECRET of 1-256 characters A-Z, a-z, 0-9, _ and -')
+    if config.webhook.workers > 1 and not config.bot.use_redis:
+        raise ValueError('WEBHOOK_WORKERS > 1 needs USE_REDIS=true, FSM states must be shared between workers')
+
+def create_webhook_app(dispatcher: Dispatcher, bot: Bot, webhook: WebhookConfig) -> web.Application:
+    """aiohttp application that feeds updates POSTed to the webhook path to the dispatcher"""
+    app = web.Application()
+    # Answers Telegram right away and runs the handlers in a background task
+    BackpressureRequestHandler(
+        dispatcher=dispatcher,
+        bot=bot,
+        secret_token=webhook.secret,
+        handle_in_background=True,
+        executor=dispatcher['update_executor']
+    ).register(app, path=webhook.path)
+    return app
+
+def serve_webhook(config: Config, worker: int):
+    """
+    Runs one aiohttp webhook worker. Several workers bind the same port with
+    SO_REUSEPORT and the kernel spreads incoming connections between them.
+    """
+    if worker:
+        setup_logging(config.log)
+
+    setup_engine(config.db)
+    bot = create_bot(config)
+    # Every worker has its own registry, so each one is scraped on its own port
+    metrics_port = config.metrics.port + worker if config.metrics.port else 0
+    dp = create_dispatcher(config, is_primary=worker == 0, metrics_port=metrics_port)
+
+    app = create_webhook_app(dp, bot, config.webhook)
+    if worker == 0:
+        dp.startup.register(register_webhook)
+    setup_application(app, dp, bot=bot, webhook=config.webhook)
+
+    logger.info('Webhook worker %s listening on %s:%s%s', worker, config.webhook.host, config.webhook.port,
+                config.webhook.path)
+    web.run_app(
+        app,
+        host=config.webhook.host,
+        port=config.webhook.port,
+        reuse_port=config.webhook.workers > 1,
+        print=None
+    )
+
+def run_webhook(config: Config):
+    check_webhook_config(config)
+    asyncio.run(prepare_webhook(config))
+
+    context = multiprocessing.get_context('spawn')
+    workers = [
+        context.Process(target=serve_webhook, args=(config, worker), name=f'webhook-{worker}')
+        for worker in range(1, config.webhook.workers)
+    ]
+    for process in workers:
+        process.start()
+    try:
+        serve_webhook(config, 0)
+    finally:
+        for process in workers:
+            process.terminate()
+            process.join()
+
+async def startup(dispatcher: Dispatcher, bot: Bot, translations: dict, is_primary: bool = True,
+                  metrics_host: str = '127.0.0.1', metrics_port: int = 0):
+    if metrics_port:
+        dispatcher['metrics_runner'] = await start_metrics_server(metrics_host, metrics_port)
+    # Migrations run before the dispatcher starts: in main() or prepare_webhook()
+    if is_primary:
+        await resume_broadcasts(bot, translations)
+
+async def shutdown(dispatcher: Dispatcher, bot: Bot, update_executor: OrderedExecutorMiddleware):
+    if 'metrics_runner' in dispatcher.workflow_data:
+        await dispatcher['metrics_runner'].cleanup()
+    logger.info('Update executor on shutdown: %s', update_executor.stats())
+    logger.info('User cache on shutdown: %s', user_cache.stats())
+    if isinstance(dispatcher.storage, BoundedMemoryStorage):
+        logger.info('FSM storage on shutdown: %s', dispatcher.storage.stats())
+    await dispatcher.storage.close()
+    await bot.session.close()
 
 if __name__ == "__main__":
     try:
-        asyncio.run(main())
+        config = load_config()
+        if config.webhook.enabled:
+            setup_logging(config.log)
+            logger.info('Starting bot in webhook mode')
+            run_webhook(config)
+        else:
+            asyncio.run(main())
     except KeyboardInterrupt:
         logger.info('Bot stopped')
@@ -0,0 +1,248 @@
+"""
+Callback query routing through a prefix trie.
+
+aiogram checks every callback handler's filters in registration order, and
+F.data magic filters are synchronous, so each check is a thread hop. At
+startup compile_callback_routes() takes the ``F.data == ...`` and
+``F.data.startswith(...)`` filters of all callback handlers and compiles them
+into one trie. Each such filter is replaced with an async RouteFilter that only
+looks up the routes matched for the current callback. The trie is walked once
+per callback in O(len(data)).
+
+Handler order and all other filters (states, IsAdmin) stay as they are, so
+routing decisions don't change. Overlapping prefixes, whose winner is decided
+by registration order alone, are logged at startup.
+
+Routes of CallbackSchema filters decode their compact payload with the schema;
+data that doesn't decode doesn't match the route.
+"""
+import logging
+import operator
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Optional
+
+from aiogram import BaseMiddleware, Router
+from aiogram.dispatcher.event.handler import FilterObject, HandlerObject
+from aiogram.filters import Filter
+from aiogram.types import CallbackQuery, TelegramObject
+from magic_filter import MagicFilter
+from magic_filter.magic import or_op
+from magic_filter.operations import GetAttributeOperation, ComparatorOperation, CallOperation, CombinationOperation
+
+from keyboards.callback_data import callback_decoder
+
+logger = logging.getLogger(__name__)
+
+# Plain tuples for F.data routes, named tuples for CallbackSchema routes
+CallbackArgs = tuple
+
+
+@dataclass(frozen=True)
+class CallbackRoute:
+    id: int
+    key: str
+    exact: bool
+    handler: HandlerObject
+    router: Router
+    decode: Callable[[str], CallbackArgs]
+
+    @property
+    def name(self) -> str:
+        callback = self.handler.callback
+        pattern = f"== '{self.key}'" if self.exact else f"startswith('{self.key}')"
+        return f"{callback.__module__}.{callback.__name__} [{pattern}]"
+
+    @property
+    def has_other_filters(self) -> bool:
+        return len(self.handler.filters or ()) > 1
+
+
+class _Node:
+    __slots__ = ('children', 'prefix_routes', 'exact_routes')
+
+    def __init__(self):
+        self.children: dict[str, _Node] = {}
+        self.prefix_routes: list[CallbackRoute] = []
+        self.exact_routes: list[CallbackRoute] = []
+
+
+def parse_callback_args(rest: str) -> CallbackArgs:
+    """'12_3' -> (12, 3); parts that are not numbers stay strings"""
+    if rest.startswith('_'):
+        rest = rest[1:]
+    if not rest:
+        return ()
+    return tuple(int(part) if part.isdigit() else part for part in rest.split('_'))
+
+
+class CallbackTrie:
+    def __init__(self):
+        self.routes: list[CallbackRoute] = []
+        self._root = _Node()
+
+    def add(
+            self,
+            key: str,
+            exact: bool,
+            handler: HandlerObject,
+            router: Router,
+            decode: Callable[[str], CallbackArgs] = parse_callback_args
+    ) -> CallbackRoute:
+        route = CallbackRoute(len(self.routes), key, exact, handler, router, decode)
+        self.routes.append(route)
+
+        node = self._root
+        for char in key:
+            node = node.children.setdefault(char, _Node())
+        (node.exact_routes if exact else node.prefix_routes).append(route)
+        return route
+
+    def match(self, data: str) -> dict[int, CallbackArgs]:
+        """Ids of all routes matching data, with the arguments after the matched prefix"""
+        matched: dict[int, CallbackArgs] = {}
+        node = self._root
+        for index, char in enumerate(data):
+            self._decode(node.prefix_routes, data[index:], matched)
+            node = node.children.get(char)
+            if node is None:
+                return matched
+
+        self._decode(node.prefix_routes, '', matched)
+        for route in node.exact_routes:
+            matched[route.id] = ()
+        return matched
+
+    @staticmethod
+    def _decode(routes: list[CallbackRoute], rest: str, matched: dict[int, CallbackArgs]) -> None:
+        for route in routes:
+            try:
+                matched[route.id] = route.decode(rest)
+            except ValueError as e:
+                logger.debug('Callback data does not match %s: %s', route.name, e)
+
+    def overlaps(self) -> list[tuple[CallbackRoute, CallbackRoute]]:
+        """Pairs of routes of different handlers that can both match the same callback"""
+        pairs = []
+        for route in self.routes:
+            for other in self.routes[route.id + 1:]:
+                if other.handler is route.handler:
+                    continue
+                if self.covers(route, other) or self.covers(other, route):
+                    pairs.append((route, other))
+        return pairs
+
+    @staticmethod
+    def covers(route: CallbackRoute, other: CallbackRoute) -> bool:
+        """Whether every callback matching other also matches route"""
+        if route.exact:
+            return other.exact and other.key == route.key
+        return other.key.startswith(route.key)
+
+
+class RouteFilter(Filter):
+    """Replaces a handler's F.data filter; passes the parsed arguments as ``callback_args``"""
+
+    def __init__(self, trie: CallbackTrie, route_ids: tuple[int, ...]):
+        self.trie = trie
+        self.route_ids = route_ids
+
+    async def __call__(
+            self,
+            callback: CallbackQuery,
+            callback_routes: Optional[dict[int, CallbackArgs]] = None
+    ) -> bool | dict[str, Any]:
+        if callback_routes is None:
+            callback_routes = self.trie.match(callback.data or '')
+        for route_id in self.route_ids:
+            args = callback_routes.get(route_id)
+            if args is not None:
+                return {'callback_args': args}
+        return False
+
+
+class CallbackRouterMiddleware(BaseMiddleware):
+    """Outer callback_query middleware: matches the callback data once for all handlers"""
+
+    def __init__(self, trie: CallbackTrie):
+        self.trie = trie
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+            event: CallbackQuery,
+            data: dict[str, Any]
+    ) -> Any:
+
+        data['callback_routes'] = self.trie.match(event.data or '')
+        return await handler(event, data)
+
+
+def _data_patterns(magic: MagicFilter) -> Optional[list[tuple[str, bool]]]:
+    """
+    (key, exact) pairs of ``F.data == key``, ``F.data.startswith(key)`` and
+    their ``|`` combinations; None for any other filter
+    """
+    operations = magic._operations
+    if operations and isinstance(operations[-1], CombinationOperation):
+        combination = operations[-1]
+        # MagicFilter.__or__ combines two filters with or_op, anything else with operator.or_
+        if combination.combinator not in (or_op, operator.or_) or not isinstance(combination.right, MagicFilter):
+            return None
+        left = _data_patterns(MagicFilter(operations[:-1]))
+        right = _data_patterns(combination.right)
+        return left + right if left is not None and right is not None else None
+
+    if not operations or not isinstance(operations[0], GetAttributeOperation) or operations[0].name != 'data':
+        return None
+    rest = operations[1:]
+
+    if (
+        len(rest) == 1
+        and isinstance(rest[0], ComparatorOperation)
+        and rest[0].comparator is operator.eq
+        and isinstance(rest[0].right, str)
+    ):
+        return [(rest[0].right, True)]
+
+    if (
+        len(rest) == 2
+        and isinstance(rest[0], GetAttributeOperation) and rest[0].name == 'startswith'
+        and isinstance(rest[1], CallOperation) and not rest[1].kwargs
+        and len(rest[1].args) == 1 and isinstance(rest[1].args[0], str)
+    ):
+        return [(rest[1].args[0], False)]
+
+    return None
+
+
+def compile_callback_routes(router: Router) -> CallbackRouterMiddleware:
+    """
+    Compiles the F.data filters of all callback handlers of router and its
+    sub-routers into a trie and swaps them for RouteFilters. Handlers with other
+    data filters keep them and are checked as before.
+
+    Register the returned middleware with ``dp.callback_query.outer_middleware``.
+    """
+    trie = CallbackTrie()
+    for current in router.chain_tail:
+        for handler in current.callback_query.handlers:
+            for index, filter_object in enumerate(handler.filters or ()):
+                patterns = _data_patterns(filter_object.magic) if filter_object.magic is not None else None
+                if patterns is None:
+                    continue
+                route_ids = tuple(
+                    trie.add(key, exact, handler, current, callback_decoder(key) or parse_callback_args).id
+                    for key, exact in patterns
+                )
+                handler.filters[index] = FilterObject(RouteFilter(trie, route_ids))
+                break
+
+    for first, second in trie.overlaps():
+        if trie.covers(first, second) and not first.has_other_filters:
+            logger.warning('Callback route %s shadows %s, which can never be reached', first.name, second.name)
+        else:
+            logger.info('Callback routes %s and %s overlap, the first one whose other filters pass wins',
+                        first.name, second.name)
+
+    logger.info('Compiled %s callback routes', len(trie.routes))
+    return CallbackRouterMiddleware(trie)
@@ -0,0 +1,48 @@
+from typing import Callable, Any, Awaitable
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from external_services.metrics import metrics
+
+
+class DatabaseMiddleware(BaseMiddleware):
+    """
+    Opens one session per update and puts it into handler data as ``session``.
+
+    The session connects lazily, so updates that never touch the database don't
+    check out a connection. Everything the handler does is committed as one
+    transaction when it returns and rolled back if it raises.
+
+    A write keeps the SQLite write lock until the transaction ends, and a Bot API
+    round trip takes far longer than the queries of a handler. So handlers that
+    write do all their writes first and commit them themselves before they call
+    the Bot API; nothing is written after that commit, and the commit here finds
+    nothing left to do.
+    """
+
+    def __init__(self, session_pool: async_sessionmaker):
+        self.session_pool = session_pool
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+            event: TelegramObject,
+            data: dict[str, Any]
+    ) -> Any:
+
+        metrics.sessions_opened.inc()
+        metrics.sessions_active += 1
+        try:
+            async with self.session_pool() as session:
+                data["session"] = session
+                try:
+                    result = await handler(event, data)
+                except Exception:
+                    await session.rollback()
+                    raise
+                await session.commit()
+                return result
+        finally:
+            metrics.sessions_active -= 1
@@ -0,0 +1,188 @@
+import asyncio
+import logging
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Optional
+
+from aiohttp import web
+from aiogram import BaseMiddleware, Bot
+from aiogram.dispatcher.event.bases import UNHANDLED
+from aiogram.methods import TelegramMethod
+from aiogram.types import TelegramObject, Update, User
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler
+
+logger = logging.getLogger(__name__)
+
+# True in the task feeding an update whose `pending` slot was taken by reserve()
+_reserved_slot: ContextVar[bool] = ContextVar('reserved_slot', default=False)
+
+
+class OrderedExecutorMiddleware(BaseMiddleware):
+    """
+    Runs updates of the same user one after another and caps how many updates
+    are handled at once across all users.
+
+    Per-user locks are FIFO, so a double-tapped button is processed in the order
+    the updates arrived instead of two handlers racing on one FSM state. Locks
+    are dropped as soon as the user has nothing queued. `pending` counts updates
+    waiting or running; intake code takes a slot with reserve() before it
+    schedules an update, so it stops accepting new updates at `max_pending`.
+
+    One user can't take all of those slots: an update arriving while the user
+    already has `max_user_pending` updates running or queued is dropped, and a
+    dropped callback query gets an empty answer so the button stops spinning.
+    """
+
+    def __init__(self, max_concurrency: int = 64, max_pending: int = 1000, max_user_pending: int = 10):
+        self.max_concurrency = max_concurrency
+        self.max_pending = max_pending
+        self.max_user_pending = max_user_pending
+        self.pending = 0
+        self.running = 0
+        self.processed = 0
+        self.dropped = 0
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._capacity = asyncio.Condition()
+        # user id -> (lock, number of updates holding or waiting for it)
+        self._locks: dict[int, tuple[asyncio.Lock, int]] = {}
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+            event: TelegramObject,
+            data: dict[str, Any]
+    ) -> Any:
+
+        user: Optional[User] = data.get("event_from_user")
+        if user is not None and self._user_depth(user.id) >= self.max_user_pending:
+            return await self._drop(event, user)
+
+        reserved = _reserved_slot.get()
+        if not reserved:
+            self.pending += 1
+        try:
+            if user is None:
+                return await self._run(handler, event, data)
+
+            lock = self._acquire_lock(user.id)
+            try:
+                async with lock:
+                    return await self._run(handler, event, data)
+            finally:
+                self._release_lock(user.id)
+        finally:
+            self.processed += 1
+            if not reserved:
+                await self.release()
+
+    async def _run(self, handler, event, data):
+        async with self._semaphore:
+            self.running += 1
+            try:
+                return await handler(event, data)
+            finally:
+                self.running -= 1
+
+    async def _drop(self, event: TelegramObject, user: User) -> Any:
+        self.dropped += 1
+        logger.debug('Dropped an update of user %s, %s of theirs are queued', user.id, self.max_user_pending)
+        if isinstance(event, Update) and event.callback_query is not None:
+            await event.callback_query.answer()
+        return UNHANDLED
+
+    def _user_depth(self, user_id: int) -> int:
+        return self._locks.get(user_id, (None, 0))[1]
+
+    def _acquire_lock(self, user_id: int) -> asyncio.Lock:
+        lock, users = self._locks.get(user_id, (None, 0))
+        if lock is None:
+            lock = asyncio.Lock()
+        self._locks[user_id] = (lock, users + 1)
+        return lock
+
+    def _release_lock(self, user_id: int) -> None:
+        lock, users = self._locks[user_id]
+        if users == 1:
+            del self._locks[user_id]
+        else:
+            self._locks[user_id] = (lock, users - 1)
+
+    async def reserve(self) -> None:
+        """
+        Takes a `pending` slot for an update that is about to be scheduled, blocking
+        while `max_pending` updates are already waiting or running. The check and the
+        increment happen without a suspension point between them, so a burst can't
+        overshoot the limit. The slot is given back with release().
+        """
+        if self.pending >= self.max_pending:
+            logger.debug('Update executor is full (%s pending), holding intake', self.pending)
+            async with self._capacity:
+                await self._capacity.wait_for(lambda: self.pending < self.max_pending)
+                self.pending += 1
+                return
+        self.pending += 1
+
+    async def release(self) -> None:
+        self.pending -= 1
+        async with self._capacity:
+            self._capacity.notify()
+
+    def stats(self) -> dict[str, int]:
+        """Queue depth metrics: waiting and running updates, users with queued updates, deepest user queue"""
+        return {
+            'pending': self.pending,
+            'running': self.running,
+            'waiting': self.pending - self.running,
+            'users': len(self._locks),
+            'max_user_depth': max((users for _, users in self._locks.values()), default=0),
+            'processed': self.processed,
+            'dropped': self.dropped,
+        }
+
+
+class BackpressureRequestHandler(SimpleRequestHandler):
+    """
+    Webhook handler that answers Telegram only when the executor has room for
+    the update, so a burst makes Telegram hold and retry instead of piling up tasks.
+
+    Updates are always handled in a background task. Only the public handle() of
+    SimpleRequestHandler is overridden; the rest goes through the dispatcher's
+    feed_raw_update() like aiogram's own background handling does.
+    """
+
+    def __init__(self, *args: Any, executor: OrderedExecutorMiddleware, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.executor = executor
+        self._feed_tasks: set[asyncio.Task] = set()
+
+    async def handle(self, request: web.Request) -> web.Response:
+        bot = await self.resolve_bot(request)
+        if not self.verify_secret(request.headers.get("X-Telegram-Bot-Api-Secret-Token", ""), bot):
+            return web.Response(body="Unauthorized", status=401)
+
+        update = await request.json(loads=bot.session.json_loads)
+        await self.executor.reserve()
+        task = asyncio.create_task(self._feed_update(bot, update))
+        self._feed_tasks.add(task)
+        task.add_done_callback(self._feed_tasks.discard)
+        return web.json_response({}, dumps=bot.session.json_dumps)
+
+    __call__ = handle
+
+    async def _feed_update(self, bot: Bot, update: dict[str, Any]) -> None:
+        _reserved_slot.set(True)
+        try:
+            result = await self.dispatcher.feed_raw_update(bot=bot, update=update, **self.data)
+            if isinstance(result, TelegramMethod):
+                await self.dispatcher.silent_call_request(bot=bot, result=result)
+        finally:
+            await self.executor.release()
+
+    async def drain(self) -> None:
+        """Waits until the updates scheduled so far are handled"""
+        while self._feed_tasks:
+            await asyncio.gather(*self._feed_tasks, return_exceptions=True)
+
+    async def close(self) -> None:
+        # Runs on application shutdown: updates Telegram was already told about finish first
+        await self.drain()
+        await super().close()
@@ -1,5 +1,7 @@
 import asyncio
 import logging
+import random
+from typing import Callable
 
 from aiogram import BaseMiddleware
 from aiogram.dispatcher.event.bases import UNHANDLED
@@ -8,50 +10,67 @@ logger = logging.getLogger("update_logger")
 
 
 class LoggerMiddleware(BaseMiddleware):
+    """
+    Logs one structured record per update.
+
+    Failed and slow updates are always logged; fast successful ones only with
+    probability `sample_rate`, drawn from `sample`. Field values are cut by the
+    log formatter, on the logging thread.
+    """
+
+    def __init__(self, sample_rate: float = 1.0, slow_ms: float = 500.0,
+                 sample: Callable[[], float] = random.random):
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.sample = sample
+
     async def __call__(self, handler, update, data):
         loop = asyncio.get_running_loop()
         start_time = loop.time()
         handled = False
+        error = None
         try:
             result = await handler(update, data)
             handled = result is not UNHANDLED
             return result
+        except Exception as e:
+            error = e
+            raise
         finally:
             duration = (loop.time() - start_time) * 1000
 
-            username = None
-            user_id = None
-            chat_id = None
-            extra_info = ""
-
-            # Сообщение
-            if update.message:
-                msg = update.message
-                user_id = msg.from_user.id if msg.from_user else None
-                username = msg.from_user.username if msg.from_user else None
-                chat_id = msg.chat.id if msg.chat else None
-
-                if msg.text:
-                    extra_info = f"message_text={msg.text!r}"
-                elif msg.caption:
-                    extra_info = f"message_caption={msg.caption!r}"
+            if error is not None or duration >= self.slow_ms or self.sample() < self.sample_rate:
+                fields = {
+                    'update_id': update.update_id,
+                    'handled': handled,
+                    'duration_ms': round(duration, 2),
+                    'bot_id': data["bot"].id,
+                }
+
+                # Сообщение
+                if update.message:
+                    msg = update.message
+                    fields['user_id'] = msg.from_user.id if msg.from_user else None
+                    fields['username'] = msg.from_user.username if msg.from_user else None
+                    fields['chat_id'] = msg.chat.id if msg.chat else None
+
+                    if msg.text:
+                        fields['message_text'] = msg.text
+                    elif msg.caption:
+                        fields['message_caption'] = msg.caption
+                    else:
+                        fields['message_content_type'] = msg.content_type
+                elif update.callback_query:
+                    cb = update.callback_query
+                    fields['user_id'] = cb.from_user.id if cb.from_user else None
+                    fields['username'] = cb.from_user.username if cb.from_user else None
+                    fields['chat_id'] = cb.message.chat.id if cb.message and cb.message.chat else None
+                    fields['callback_data'] = cb.data
+
+                if error is not None:
+                    fields['error'] = repr(error)
+                    logger.warning("Update failed", extra={'fields': fields})
+                elif duration >= self.slow_ms:
+                    logger.warning("Slow update", extra={'fields': fields})
                 else:
-                    extra_info = f"message_content_type={msg.content_type}"
-            elif update.callback_query:
-                cb = update.callback_query
-                user_id = cb.from_user.id if cb.from_user else None
-                username = cb.from_user.username if cb.from_user else None
-                chat_id = cb.message.chat.id if cb.message and cb.message.chat else None
-                extra_info = f"callback_data={cb.data!r}"
-
-            logger.info(
-                "Update id=%s is %s. Duration %.2f ms by bot id=%s, user_id=%s, username=%s, chat_id=%s, %s",
-                update.update_id,
-                "handled" if handled else "not handled",
-                duration,
-                data["bot"].id,
-                user_id,
-                username,
-                chat_id,
-                extra_info,
-            )
+                    logger.info("Update %s", "handled" if handled else "not handled", extra={'fields': fields})
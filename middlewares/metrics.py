@@ -0,0 +1,117 @@
+import logging
+import time
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery, TelegramObject
+
+from external_services.metrics import metrics, current_queries, UpdateQueries
+from keyboards.callback_data import find_schema
+
+logger = logging.getLogger(__name__)
+
+# Statement budgets by handler name, DB_QUERY_BUDGET for handlers not listed. Every
+# handler of handlers/user.py and handlers/items_forms.py has one: tests/test_query_budgets.py
+# replays them all, fails when one goes over and when a handler there has no budget
+QUERY_BUDGETS: dict[str, int] = {
+    # Start and help, handlers/user.py
+    'process_start_message': 3,
+    'process_help_button': 0,
+    'process_help_command': 0,
+    # Wishlist lists
+    'show_my_wishlist': 2,
+    'process_friends_wishlist_buttons': 3,
+    'delete_wishlist': 2,
+    # Subscriptions; subscribing and unsubscribing redraw the wishlist screen
+    'subscribe_to_wishlist': 9,
+    'unsubscribe_from_wishlist': 7,
+    'approve_subscription': 4,
+    'reject_subscription': 3,
+    # Carousel
+    'view_wishlist': 2,
+    'next_item': 1,
+    'prev_item': 1,
+    'switch_item_view': 1,
+    'reserve_gift': 5,
+    'unreserve_gift': 4,
+    'already_reserved': 0,
+    # Item form, handlers/items_forms.py; the fields are kept in the FSM data until confirmed
+    'start_add_item': 2,
+    'start_edit_item': 1,
+    'start_editing_item_field': 0,
+    'set_item_priority': 0,
+    'process_item_name': 0,
+    'process_item_description': 0,
+    'process_item_link': 0,
+    'process_item_price': 0,
+    'process_item_photo': 0,
+    'remove_item_photo': 0,
+    'confirm_item': 4,
+    'cancel_item_creation': 3,
+}
+
+# The same statement this many times in one handler call is reported as N+1
+REPEATED_QUERY_THRESHOLD = 3
+
+# Label of callback data that isn't a CallbackSchema payload. Such data comes from the
+# client, so using it as a label would let anyone create new metric series
+OTHER_CALLBACK = 'other'
+
+
+def callback_prefix(data: str | None) -> str:
+    if not data:
+        return ''
+    schema = find_schema(data)
+    return schema.name if schema else OTHER_CALLBACK
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """
+    Inner middleware that times every handler call into the handler latency
+    histogram, labeled by handler name, event type and callback data prefix.
+
+    It also counts the SQL statements the handler issues and logs a warning when
+    they exceed the handler's budget or one statement repeats, as lazy loads
+    in a loop do.
+    """
+
+    def __init__(self, event_type: str, query_budget: int = 10, budgets: dict[str, int] | None = None):
+        self.event_type = event_type
+        self.query_budget = query_budget
+        self.budgets = QUERY_BUDGETS if budgets is None else budgets
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+            event: TelegramObject,
+            data: dict[str, Any]
+    ) -> Any:
+
+        handler_object = data.get("handler")
+        name = getattr(handler_object.callback, '__name__', 'unknown') if handler_object else 'unknown'
+        prefix = callback_prefix(event.data) if isinstance(event, CallbackQuery) else ''
+
+        queries = UpdateQueries()
+        token = current_queries.set(queries)
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            metrics.handler_duration.observe(time.perf_counter() - start, name, self.event_type, prefix)
+            current_queries.reset(token)
+            metrics.handler_queries.observe(queries.count, name)
+            self._check_budget(name, queries)
+
+    def _check_budget(self, name: str, queries: UpdateQueries) -> None:
+        budget = self.budgets.get(name, self.query_budget)
+        repeated = queries.repeated(REPEATED_QUERY_THRESHOLD)
+        if queries.count <= budget and not repeated:
+            return
+
+        fields = {'handler': name, 'queries': queries.count, 'budget': budget}
+        if repeated:
+            statement, times = max(repeated.items(), key=lambda item: item[1])
+            fields['repeated_statement'] = ' '.join(statement.split())
+            fields['repeated_times'] = times
+        logger.warning('Query budget exceeded' if queries.count > budget else 'Repeated query',
+                       extra={'fields': fields})
@@ -0,0 +1,78 @@
+import asyncio
+import logging
+from itertools import count
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.event.bases import UNHANDLED
+from aiogram.types import TelegramObject, Update
+
+from keyboards.callback_data import NextItem, PrevItem
+
+logger = logging.getLogger(__name__)
+
+NAVIGATION_PREFIXES = NextItem.prefixes + PrevItem.prefixes
+
+
+class NavigationThrottleMiddleware(BaseMiddleware):
+    """
+    Coalesces carousel navigation spam per (user, message).
+
+    The first press on a message is handled right away. Presses that arrive
+    within `window` seconds after it wait until the window closes, and only the
+    latest of them is handled; superseded ones just get an empty callback
+    answer, without touching the database or editing the message.
+
+    Must run before OrderedExecutorMiddleware: while a press waits here it
+    doesn't hold the user's lock, so a newer press can still supersede it.
+    """
+
+    def __init__(self, window: float = 0.3, prefixes: tuple[str, ...] = NAVIGATION_PREFIXES):
+        self.window = window
+        self.prefixes = prefixes
+        self.dropped = 0
+        self._sequence = count()
+        # (user id, chat id, message id) -> (time the last press was handled, latest waiting press)
+        self._keys: dict[tuple[int, int, int], tuple[float, int]] = {}
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+            event: Update,
+            data: dict[str, Any]
+    ) -> Any:
+
+        callback = event.callback_query
+        if (
+            callback is None
+            or callback.message is None
+            or not callback.data
+            or not callback.data.startswith(self.prefixes)
+        ):
+            return await handler(event, data)
+
+        loop = asyncio.get_running_loop()
+        key = (callback.from_user.id, callback.message.chat.id, callback.message.message_id)
+        handled_at, _ = self._keys.get(key, (None, None))
+
+        if handled_at is not None and loop.time() - handled_at < self.window:
+            sequence = next(self._sequence)
+            self._keys[key] = (handled_at, sequence)
+            await asyncio.sleep(handled_at + self.window - loop.time())
+
+            if self._keys.get(key, (None, None))[1] != sequence:
+                self.dropped += 1
+                logger.debug('Dropped superseded navigation %r of user %s', callback.data, callback.from_user.id)
+                await callback.answer()
+                return UNHANDLED
+
+        self._keys[key] = (loop.time(), -1)
+        self._forget_stale(loop.time())
+        return await handler(event, data)
+
+    def _forget_stale(self, now: float) -> None:
+        if len(self._keys) < 1000:
+            return
+        for key, (handled_at, waiting) in list(self._keys.items()):
+            if waiting == -1 and now - handled_at >= self.window:
+                del self._keys[key]
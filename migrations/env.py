@@ -0,0 +1,97 @@
+import asyncio
+from logging.config import fileConfig
+
+from environs import Env
+from sqlalchemy import pool, NUMERIC, UUID
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from alembic import context
+
+from database.models import Base, SEARCH_TABLES
+
+# this is the Alembic Config object, which provides
+# access to the values within the .ini file in use.
+config = context.config
+
+# Interpret the config file for Python logging. Skipped when migrations are
+# started by the bot itself, so the bot's logging setup stays intact.
+if config.config_file_name is not None and 'connection' not in config.attributes:
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+
+def compare_type(context, inspected_column, metadata_column, inspected_type, metadata_type):
+    # SQLite reflects UUID columns as NUMERIC, don't report that as a type change
+    if isinstance(metadata_type, UUID) and isinstance(inspected_type, NUMERIC):
+        return False
+    return None
+
+
+def include_name(name, type_, parent_names):
+    # FTS5 tables and their shadow tables (items_fts_data, ...) are created by raw SQL in 0008
+    if type_ == 'table':
+        return not name.startswith(SEARCH_TABLES)
+    return True
+
+
+def get_url() -> str:
+    """Same DB_URL the bot reads in config.config.load_config"""
+    env = Env()
+    env.read_env()
+    return env.str("DB_URL", "sqlite+aiosqlite:///db.sqlite3")
+
+
+def run_migrations_offline() -> None:
+    """Run migrations in 'offline' mode, emitting SQL to the script output."""
+    context.configure(
+        url=get_url(),
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+        render_as_batch=True,
+    )
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def do_run_migrations(connection: Connection) -> None:
+    # batch mode lets ALTER-style operations work on SQLite
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        render_as_batch=True,
+        compare_type=compare_type,
+        include_name=include_name,
+    )
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+async def run_async_migrations() -> None:
+    """Create an Engine from DB_URL and run migrations on its connection."""
+    connectable = create_async_engine(get_url(), poolclass=pool.NullPool)
+
+    async with connectable.connect() as connection:
+        await connection.run_sync(do_run_migrations)
+
+    await connectable.dispose()
+
+
+def run_migrations_online() -> None:
+    """Run migrations in 'online' mode."""
+    connection = config.attributes.get('connection')
+    if connection is not None:
+        # Called from database.models.async_main with an open connection
+        do_run_migrations(connection)
+    else:
+        asyncio.run(run_async_migrations())
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
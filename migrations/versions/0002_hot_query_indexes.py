@@ -0,0 +1,50 @@
+"""hot query indexes
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 11:53:35.719564
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, Sequence[str], None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('items', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_items_wishlist_id'), ['wishlist_id'], unique=False)
+
+    # Nothing prevented duplicate subscriptions before, keep the oldest one of each pair
+    op.execute(sa.text(
+        "DELETE FROM wishlist_subscriptions WHERE id NOT IN ("
+        "SELECT MIN(id) FROM wishlist_subscriptions GROUP BY subscriber_id, wishlist_id)"
+    ))
+
+    with op.batch_alter_table('wishlist_subscriptions', schema=None) as batch_op:
+        batch_op.create_index('ix_wishlist_subscriptions_wishlist_status', ['wishlist_id', 'status'], unique=False)
+        batch_op.create_index('uq_wishlist_subscriptions_subscriber_wishlist', ['subscriber_id', 'wishlist_id'], unique=True)
+
+    with op.batch_alter_table('wishlists', schema=None) as batch_op:
+        batch_op.create_index('ix_wishlists_owner_active_created', ['owner_id', 'is_deleted', 'created_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('wishlists', schema=None) as batch_op:
+        batch_op.drop_index('ix_wishlists_owner_active_created')
+
+    with op.batch_alter_table('wishlist_subscriptions', schema=None) as batch_op:
+        batch_op.drop_index('uq_wishlist_subscriptions_subscriber_wishlist')
+        batch_op.drop_index('ix_wishlist_subscriptions_wishlist_status')
+
+    with op.batch_alter_table('items', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_items_wishlist_id'))
@@ -0,0 +1,44 @@
+"""wishlist counters
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 12:20:11.402317
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, Sequence[str], None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('wishlists', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('items_count', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('reserved_count', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('subscribers_count', sa.Integer(), server_default='0', nullable=False))
+
+    op.execute(sa.text(
+        "UPDATE wishlists SET "
+        "items_count = (SELECT COUNT(*) FROM items WHERE items.wishlist_id = wishlists.id), "
+        "reserved_count = (SELECT COUNT(*) FROM items "
+        "WHERE items.wishlist_id = wishlists.id AND items.is_reserved = 1), "
+        "subscribers_count = (SELECT COUNT(*) FROM wishlist_subscriptions "
+        "WHERE wishlist_subscriptions.wishlist_id = wishlists.id "
+        "AND wishlist_subscriptions.status = 'approved')"
+    ))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('wishlists', schema=None) as batch_op:
+        batch_op.drop_column('subscribers_count')
+        batch_op.drop_column('reserved_count')
+        batch_op.drop_column('items_count')
@@ -0,0 +1,43 @@
+"""audience filters
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 11:59:42.872363
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, Sequence[str], None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('broadcasts', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('audience_language', sa.String(length=5), nullable=True))
+        batch_op.add_column(sa.Column('active_since', sa.DateTime(), nullable=True))
+
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        # Left empty for existing users until they come back to the bot
+        batch_op.add_column(sa.Column('last_active_at', sa.DateTime(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_users_language'), ['language'], unique=False)
+        batch_op.create_index(batch_op.f('ix_users_last_active_at'), ['last_active_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_users_last_active_at'))
+        batch_op.drop_index(batch_op.f('ix_users_language'))
+        batch_op.drop_column('last_active_at')
+
+    with op.batch_alter_table('broadcasts', schema=None) as batch_op:
+        batch_op.drop_column('active_since')
+        batch_op.drop_column('audience_language')
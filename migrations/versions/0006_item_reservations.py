@@ -0,0 +1,33 @@
+"""item reservations
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 14:07:51.218436
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0006'
+down_revision: Union[str, Sequence[str], None] = '0005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Items reserved before this revision keep is_reserved without a reserving user
+    with op.batch_alter_table('items', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('reserved_by_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_items_reserved_by_id_users', 'users', ['reserved_by_id'], ['id'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('items', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_items_reserved_by_id_users', type_='foreignkey')
+        batch_op.drop_column('reserved_by_id')
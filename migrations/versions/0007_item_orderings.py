@@ -0,0 +1,45 @@
+"""item orderings
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 15:32:06.904117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0007'
+down_revision: Union[str, Sequence[str], None] = '0006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('items', schema=None) as batch_op:
+        batch_op.add_column(sa.Column(
+            'priority_rank',
+            sa.Integer(),
+            sa.Computed("CASE priority_level WHEN 'high' THEN 0 WHEN 'medium' THEN 1 ELSE 2 END", persisted=False),
+            nullable=True
+        ))
+
+    # Outside the batch: batch mode can't reflect the expression index when it recreates the table
+    op.create_index('ix_items_wishlist_priority', 'items', ['wishlist_id', 'priority_rank'], unique=False)
+    op.create_index('ix_items_wishlist_price', 'items', ['wishlist_id', sa.text('price IS NULL'), 'price'],
+                    unique=False)
+    op.create_index('ix_items_wishlist_reserved', 'items', ['wishlist_id', 'is_reserved'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_items_wishlist_reserved', table_name='items')
+    op.drop_index('ix_items_wishlist_price', table_name='items')
+    op.drop_index('ix_items_wishlist_priority', table_name='items')
+
+    with op.batch_alter_table('items', schema=None) as batch_op:
+        batch_op.drop_column('priority_rank')
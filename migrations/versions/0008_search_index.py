@@ -0,0 +1,70 @@
+"""search index
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18 17:12:40.381562
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0008'
+down_revision: Union[str, Sequence[str], None] = '0007'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (FTS table, content table, indexed columns, bm25 weights of the columns)
+SEARCH_TABLES = (
+    ('items_fts', 'items', ('name', 'description'), (10.0, 1.0)),
+    ('wishlists_fts', 'wishlists', ('title', 'description'), (10.0, 1.0)),
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # External content tables: FTS5 stores only the index and reads the text from the
+    # content table by rowid. The triggers keep the index in sync with every write.
+    # A batch_alter_table on items or wishlists recreates the table and drops its
+    # triggers, so such a migration has to create them again.
+    for fts, content, columns, weights in SEARCH_TABLES:
+        names = ', '.join(columns)
+        new = ', '.join(f'new.{column}' for column in columns)
+        old = ', '.join(f'old.{column}' for column in columns)
+
+        op.execute(
+            f"CREATE VIRTUAL TABLE {fts} USING fts5({names}, content='{content}', content_rowid='id', "
+            f"tokenize='unicode61 remove_diacritics 2', prefix='2 3 4')"
+        )
+        # ORDER BY rank weighs a match in the name or title above one in the description
+        op.execute(f"INSERT INTO {fts}({fts}, rank) VALUES ('rank', 'bm25({', '.join(map(str, weights))})')")
+
+        op.execute(
+            f"CREATE TRIGGER {fts}_ai AFTER INSERT ON {content} BEGIN "
+            f"INSERT INTO {fts}(rowid, {names}) VALUES (new.id, {new}); "
+            f"END"
+        )
+        op.execute(
+            f"CREATE TRIGGER {fts}_ad AFTER DELETE ON {content} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.id, {old}); "
+            f"END"
+        )
+        # Only text changes touch the index; reservations and counter updates don't
+        op.execute(
+            f"CREATE TRIGGER {fts}_au AFTER UPDATE OF {names} ON {content} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.id, {old}); "
+            f"INSERT INTO {fts}(rowid, {names}) VALUES (new.id, {new}); "
+            f"END"
+        )
+
+        op.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for fts, _, _, _ in SEARCH_TABLES:
+        for suffix in ('au', 'ad', 'ai'):
+            op.execute(f"DROP TRIGGER IF EXISTS {fts}_{suffix}")
+        op.execute(f"DROP TABLE IF EXISTS {fts}")
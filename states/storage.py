@@ -0,0 +1,114 @@
+import sys
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Mapping, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+
+@dataclass
+class _Record:
+    expires_at: float
+    state: Optional[str] = None
+    data: Dict[str, Any] = field(default_factory=dict)
+
+
+def _deep_sizeof(obj: Any) -> int:
+    """Rough size of plain FSM data (dicts, lists, tuples and scalars) in bytes"""
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_deep_sizeof(k) + _deep_sizeof(v) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set)):
+        size += sum(_deep_sizeof(v) for v in obj)
+    return size
+
+
+class BoundedMemoryStorage(BaseStorage):
+    """
+    In-process FSM storage that forgets abandoned states.
+
+    Keys are kept in LRU order and every access moves the key to the end and
+    renews its TTL, so expired entries always sit at the front and are dropped
+    in O(1) on the next write. When more than `max_states` keys are stored,
+    the least recently used one is evicted as well.
+
+    `clock` returns the current time in seconds, time.monotonic by default.
+    """
+
+    def __init__(self, state_ttl: float = 86400, max_states: int = 10_000,
+                 clock: Callable[[], float] = time.monotonic):
+        self.state_ttl = state_ttl
+        self.max_states = max_states
+        self.clock = clock
+        self.evicted = 0
+        self._records: OrderedDict[StorageKey, _Record] = OrderedDict()
+
+    def _get(self, key: StorageKey) -> Optional[_Record]:
+        record = self._records.get(key)
+        if record is None:
+            return None
+
+        now = self.clock()
+        if record.expires_at < now:
+            del self._records[key]
+            self.evicted += 1
+            return None
+
+        record.expires_at = now + self.state_ttl
+        self._records.move_to_end(key)
+        return record
+
+    def _get_or_create(self, key: StorageKey) -> _Record:
+        record = self._get(key)
+        if record is None:
+            record = self._records[key] = _Record(expires_at=self.clock() + self.state_ttl)
+            self._evict()
+        return record
+
+    def _evict(self) -> None:
+        now = self.clock()
+        while self._records:
+            oldest_key, oldest = next(iter(self._records.items()))
+            if oldest.expires_at >= now and len(self._records) <= self.max_states:
+                break
+            del self._records[oldest_key]
+            self.evicted += 1
+
+    def _drop_if_empty(self, key: StorageKey, record: _Record) -> None:
+        if record.state is None and not record.data:
+            self._records.pop(key, None)
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        if state is None and key not in self._records:
+            return
+        record = self._get_or_create(key)
+        record.state = state.state if isinstance(state, State) else state
+        self._drop_if_empty(key, record)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        record = self._get(key)
+        return record.state if record else None
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if not data and key not in self._records:
+            return
+        record = self._get_or_create(key)
+        record.data = dict(data)
+        self._drop_if_empty(key, record)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        record = self._get(key)
+        return dict(record.data) if record else {}
+
+    async def close(self) -> None:
+        self._records.clear()
+
+    def stats(self) -> dict[str, int]:
+        """Number of stored states, approximate bytes held by their data and evictions so far"""
+        return {
+            'size': len(self._records),
+            'bytes': sum(_deep_sizeof(record.data) for record in self._records.values()),
+            'evicted': self.evicted,
+        }
@@ -0,0 +1,69 @@
+import os
+from collections import defaultdict
+
+import pytest
+
+# load_config() requires both; the tests never talk to Telegram
+os.environ.setdefault('BOT_TOKEN', '42:TEST')
+os.environ.setdefault('ADMIN_IDS', '1')
+
+from aiogram import Bot, Dispatcher  # noqa: E402
+
+# handlers.user imports main, so it has to be imported first to avoid a circular import
+from handlers import user  # noqa: E402,F401
+from tests.fakes import FakeSession, UpdateFactory  # noqa: E402
+from config.config import DbConfig, load_config  # noqa: E402
+from database import models  # noqa: E402
+from database.user_cache import user_cache  # noqa: E402
+from main import create_dispatcher  # noqa: E402
+from middlewares.metrics import HandlerMetricsMiddleware  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def anyio_backend():
+    # One event loop for the whole run: the session-scoped dispatcher keeps asyncio locks
+    return 'asyncio'
+
+
+@pytest.fixture
+async def db(tmp_path):
+    """Migrated file-backed SQLite database; models.async_session is bound to it"""
+    engine = models.setup_engine(DbConfig(url=f"sqlite+aiosqlite:///{tmp_path / 'test.sqlite3'}"))
+    await models.async_main()
+    user_cache.clear()
+    yield engine
+    user_cache.clear()
+    await engine.dispose()
+
+
+@pytest.fixture(scope='session')
+def dispatcher() -> Dispatcher:
+    """The bot's dispatcher with all routers and middlewares; routers attach to one dispatcher only"""
+    return create_dispatcher(load_config(), metrics_port=0)
+
+
+@pytest.fixture
+def bot() -> Bot:
+    return Bot(token='42:TEST', session=FakeSession())
+
+
+@pytest.fixture
+def updates() -> UpdateFactory:
+    return UpdateFactory()
+
+
+@pytest.fixture
+def handler_queries(monkeypatch) -> dict[str, list[int]]:
+    """
+    Number of SQL statements of every handler call by handler name, as counted
+    through current_queries by HandlerMetricsMiddleware
+    """
+    counts = defaultdict(list)
+    check_budget = HandlerMetricsMiddleware._check_budget
+
+    def record(self, name, queries):
+        counts[name].append(queries.count)
+        check_budget(self, name, queries)
+
+    monkeypatch.setattr(HandlerMetricsMiddleware, '_check_budget', record)
+    return counts
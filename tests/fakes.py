@@ -0,0 +1,166 @@
+"""
+Fakes shared by the tests and the benchmarks: a Bot session that answers
+every API call locally, Telegram updates and a seeded database.
+"""
+import asyncio
+from dataclasses import dataclass
+from datetime import datetime, UTC
+from itertools import count
+from typing import Any
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import (
+    TelegramMethod, GetMe, SendMessage, SendPhoto, EditMessageText, EditMessageMedia, EditMessageCaption,
+    EditMessageReplyMarkup
+)
+from aiogram.types import Update, Message, CallbackQuery, InlineQuery, Chat, PhotoSize, User as TgUser
+
+from database import models
+from database import requests as rq
+
+BOT_ID = 42
+
+# Methods whose result the handlers read as a Message
+MESSAGE_METHODS = (SendMessage, SendPhoto, EditMessageText, EditMessageMedia, EditMessageCaption,
+                   EditMessageReplyMarkup)
+
+
+class FakeSession(BaseSession):
+    """Answers every Bot API call locally, optionally after `latency` seconds"""
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__()
+        self.latency = latency
+        self.requests = 0
+        self._message_ids = count(1_000_000)
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout: int | None = None) -> Any:
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if isinstance(method, GetMe):
+            return TgUser(id=BOT_ID, is_bot=True, first_name='bot', username='benchmark_bot')
+        if isinstance(method, MESSAGE_METHODS):
+            chat_id = getattr(method, 'chat_id', None) or 1
+            return Message(
+                message_id=getattr(method, 'message_id', None) or next(self._message_ids),
+                date=datetime.now(UTC),
+                chat=Chat(id=chat_id, type='private'),
+                from_user=TgUser(id=BOT_ID, is_bot=True, first_name='bot'),
+                text='benchmark'
+            ).as_(bot)
+        return True
+
+    async def close(self) -> None:
+        pass
+
+    async def stream_content(self, *args, **kwargs):
+        yield b''
+
+
+@dataclass
+class SeededWishlist:
+    id: int
+    access_uuid: str
+    owner_telegram_id: int
+    item_ids: list[int]
+
+
+class RecordingSession(FakeSession):
+    """FakeSession that keeps every Bot API call"""
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__(latency)
+        self.methods: list[TelegramMethod] = []
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout: int | None = None) -> Any:
+        self.methods.append(method)
+        return await super().make_request(bot, method, timeout)
+
+    def sent(self, method_type: type[TelegramMethod]) -> list[TelegramMethod]:
+        return [method for method in self.methods if isinstance(method, method_type)]
+
+
+class UpdateFactory:
+    """Builds updates with unique ids, as Telegram would send them"""
+
+    def __init__(self):
+        self._ids = count(1)
+
+    @staticmethod
+    def username(telegram_id: int) -> str:
+        return f'user{telegram_id}'
+
+    @classmethod
+    def _user(cls, telegram_id: int) -> TgUser:
+        return TgUser(id=telegram_id, is_bot=False, first_name='user', username=cls.username(telegram_id),
+                      language_code='en')
+
+    def message(self, telegram_id: int, text: str) -> Update:
+        update_id = next(self._ids)
+        return Update(update_id=update_id, message=Message(
+            message_id=update_id,
+            date=datetime.now(UTC),
+            chat=Chat(id=telegram_id, type='private'),
+            from_user=self._user(telegram_id),
+            text=text
+        ))
+
+    def photo(self, telegram_id: int, file_id: str) -> Update:
+        update_id = next(self._ids)
+        return Update(update_id=update_id, message=Message(
+            message_id=update_id,
+            date=datetime.now(UTC),
+            chat=Chat(id=telegram_id, type='private'),
+            from_user=self._user(telegram_id),
+            photo=[PhotoSize(file_id=file_id, file_unique_id=file_id, width=640, height=480)]
+        ))
+
+    def callback(self, telegram_id: int, data: str, message_id: int | None = None) -> Update:
+        # Unless `message_id` is given, every press comes from its own message, so carousel
+        # presses are not coalesced by NavigationThrottleMiddleware and every one reaches a handler
+        update_id = next(self._ids)
+        return Update(update_id=update_id, callback_query=CallbackQuery(
+            id=str(update_id),
+            chat_instance='benchmark',
+            data=data,
+            from_user=self._user(telegram_id),
+            message=Message(
+                message_id=message_id or update_id,
+                date=datetime.now(UTC),
+                chat=Chat(id=telegram_id, type='private'),
+                from_user=TgUser(id=BOT_ID, is_bot=True, first_name='bot'),
+                text='benchmark'
+            )
+        ))
+
+    def inline_query(self, telegram_id: int, query: str, offset: str = '') -> Update:
+        update_id = next(self._ids)
+        return Update(update_id=update_id, inline_query=InlineQuery(
+            id=str(update_id),
+            from_user=self._user(telegram_id),
+            query=query,
+            offset=offset
+        ))
+
+
+async def seed(wishlists: int, items: int) -> list[SeededWishlist]:
+    """Creates `wishlists` public wishlists of different owners with `items` items each"""
+    seeded = []
+    async with models.async_session() as session:
+        for owner in range(1, wishlists + 1):
+            telegram_id = 1_000_000 + owner
+            # The username of UpdateFactory's updates, so handlers find the identity unchanged
+            await rq.get_or_create_user(session, telegram_id, UpdateFactory.username(telegram_id), 'en')
+            wishlist = await rq.create_or_update_wishlist(
+                session, user_id=telegram_id, title=f'Wishlist {owner}', is_private=False)
+            item_ids = []
+            for item in range(1, items + 1):
+                created = await rq.create_or_update_item(session, wishlist_id=wishlist.id, name=f'Item {item}',
+                                                         price=item * 10.0, link='https://example.com/item')
+                item_ids.append(created.id)
+            seeded.append(SeededWishlist(wishlist.id, str(wishlist.access_uuid), telegram_id, item_ids))
+        await session.commit()
+    rq.user_cache.clear()
+    return seeded
@@ -0,0 +1,172 @@
+import asyncio
+import logging
+
+import pytest
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import CopyMessage
+from sqlalchemy import select
+
+from tests.fakes import FakeSession
+from database import models
+from database.models import Broadcast, BroadcastStatus
+from database.requests import get_or_create_user, create_broadcast
+from external_services import broadcast as broadcasting
+from external_services.broadcast import start_broadcast
+from lexicon.lexicon_en import LEXICON_EN
+
+pytestmark = pytest.mark.anyio
+
+
+class RecordingSession(FakeSession):
+    """
+    Records (time, chat id) of every copied message; `retry_after` maps chat ids to a
+    flood-wait, `error` is raised for the chats in `error_chat_ids`, or for every chat
+    """
+
+    def __init__(self, retry_after: dict[int, int] | None = None, error: Exception | None = None,
+                 error_chat_ids: set[int] | None = None):
+        super().__init__()
+        self.sent: list[tuple[float, int]] = []
+        self.retry_after = dict(retry_after or {})
+        self.error = error
+        self.error_chat_ids = error_chat_ids
+
+    async def make_request(self, bot, method, timeout=None):
+        if isinstance(method, CopyMessage):
+            if self.error is not None and (self.error_chat_ids is None or method.chat_id in self.error_chat_ids):
+                raise self.error
+            if method.chat_id in self.retry_after:
+                raise TelegramRetryAfter(method=method, message='Flood control',
+                                         retry_after=self.retry_after.pop(method.chat_id))
+            self.sent.append((asyncio.get_running_loop().time(), method.chat_id))
+        return await super().make_request(bot, method, timeout)
+
+
+async def new_broadcast(users: int) -> tuple[Broadcast, list[int]]:
+    async with models.async_session() as session:
+        ids = [(await get_or_create_user(session, 1000 + n)).id for n in range(users)]
+        # Every user is in the audience, whatever the status message language
+        broadcast = await create_broadcast(session, from_chat_id=1, message_id=1, status_chat_id=1,
+                                           status_message_id=2, language='en')
+        await session.commit()
+    return broadcast, ids
+
+
+async def run(session: RecordingSession, broadcast: Broadcast, **kwargs) -> tuple[int, int]:
+    bot = Bot(token='42:TEST', session=session)
+    kwargs = {'per_chat_interval': 0, 'progress_interval': 3600, **kwargs}
+    return await start_broadcast(bot, broadcast, LEXICON_EN, **kwargs)
+
+
+async def stored(broadcast_id: int) -> Broadcast:
+    async with models.async_session() as session:
+        return await session.get(Broadcast, broadcast_id)
+
+
+async def test_sends_are_rate_limited(db):
+    broadcast, _ = await new_broadcast(30)
+    session = RecordingSession()
+
+    assert await run(session, broadcast, rate=20.0, chunk_size=10) == (30, 0)
+
+    # The bucket starts full: 20 messages at once, the other 10 at 20 per second
+    times = sorted(sent for sent, _ in session.sent)
+    assert times[-1] - times[0] >= 10 / 20 * 0.9
+    assert all(later - earlier >= 1 / 20 * 0.9 for earlier, later in zip(times[20:], times[21:]))
+
+
+async def test_retry_after_pauses_sending_and_retries(db):
+    broadcast, _ = await new_broadcast(5)
+    session = RecordingSession(retry_after={1002: 1})
+    start = asyncio.get_running_loop().time()
+
+    assert await run(session, broadcast, rate=100.0, concurrency=1) == (5, 0)
+
+    assert sorted(chat_id for _, chat_id in session.sent) == [1000, 1001, 1002, 1003, 1004]
+    retried = next(sent for sent, chat_id in session.sent if chat_id == 1002)
+    assert retried - start >= 1
+    assert (await stored(broadcast.id)).status == BroadcastStatus.FINISHED
+
+
+async def test_resumes_after_last_user_id(db):
+    broadcast, ids = await new_broadcast(6)
+    broadcast.last_user_id = ids[3]
+    broadcast.success = 4
+    session = RecordingSession()
+
+    assert await run(session, broadcast, chunk_size=1) == (6, 0)
+
+    assert [chat_id for _, chat_id in session.sent] == [1004, 1005]
+    saved = await stored(broadcast.id)
+    assert (saved.last_user_id, saved.success, saved.status) == (ids[-1], 6, BroadcastStatus.FINISHED)
+
+
+async def test_failed_task_is_logged(db, caplog):
+    broadcast, _ = await new_broadcast(1)
+
+    with caplog.at_level(logging.ERROR, logger=broadcasting.__name__):
+        with pytest.raises(RuntimeError):
+            await run(RecordingSession(error=RuntimeError('boom')), broadcast)
+        await asyncio.sleep(0)
+
+    assert 'failed' in caplog.text and 'boom' in caplog.text
+    assert not broadcasting._tasks
+
+
+async def test_crash_mid_chunk_resumes_from_the_last_saved_send(db):
+    broadcast, ids = await new_broadcast(10)
+    crashing = RecordingSession(error=RuntimeError('crash'), error_chat_ids={1007})
+
+    with pytest.raises(RuntimeError):
+        await run(crashing, broadcast, concurrency=1, chunk_size=500, save_every=3)
+
+    # 1000..1006 got the message before the crash, progress was saved after 1002 and 1005
+    assert [chat_id for _, chat_id in crashing.sent][:7] == list(range(1000, 1007))
+    saved = await stored(broadcast.id)
+    assert (saved.last_user_id, saved.success, saved.status) == (ids[5], 6, BroadcastStatus.RUNNING)
+
+    resumed = RecordingSession()
+    assert await run(resumed, saved, concurrency=1, save_every=3) == (10, 0)
+
+    # Only 1006 gets it twice, not the whole chunk
+    assert [chat_id for _, chat_id in resumed.sent] == list(range(1006, 1010))
+
+
+async def test_total_counts_the_audience_filters(db):
+    async with models.async_session() as session:
+        for n, language in enumerate(['en', 'en', 'ru']):
+            await get_or_create_user(session, 1000 + n, language=language)
+        everyone = await create_broadcast(session, from_chat_id=1, message_id=1, status_chat_id=1,
+                                          status_message_id=2, language='en')
+        russian = await create_broadcast(session, from_chat_id=1, message_id=1, status_chat_id=1,
+                                         status_message_id=2, language='en', audience_language='ru')
+        await session.commit()
+
+    assert (everyone.total, russian.total) == (3, 1)
+
+
+async def test_admin_newsletter_goes_to_every_user(db, dispatcher, updates):
+    admin = 1
+    async with models.async_session() as session:
+        for n, language in enumerate(['en', 'ru', 'de']):
+            await get_or_create_user(session, 1000 + n, language=language)
+        await session.commit()
+    session = RecordingSession()
+    bot = Bot(token='42:TEST', session=session)
+
+    for update in (
+        updates.message(admin, '/start'),
+        updates.callback(admin, 'admin_newsletter'),
+        updates.message(admin, 'Hello everyone'),
+        updates.callback(admin, 'confirm_newsletter'),
+    ):
+        await dispatcher.feed_update(bot, update)
+    await asyncio.gather(*broadcasting._tasks)
+
+    async with models.async_session() as db_session:
+        broadcast = (await db_session.execute(select(Broadcast))).scalar_one()
+    # The admin's language only picks the status message language
+    assert (broadcast.language, broadcast.audience_language) == ('en', None)
+    assert broadcast.total == 4
+    assert sorted(chat_id for _, chat_id in session.sent) == [admin, 1000, 1001, 1002]
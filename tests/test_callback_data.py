@@ -0,0 +1,110 @@
+import uuid
+
+import pytest
+
+from keyboards.callback_data import _schemas, MAX_CALLBACK_DATA, find_schema, callback_decoder, \
+    ViewWishlist, NextItem, ReserveItem, EditItem
+
+SCHEMAS = sorted(_schemas.values(), key=lambda schema: schema.tag)
+# Varint boundaries: the largest ints of one, two and three bytes and the first ones of the next size
+BOUNDARY_INTS = (0, 1, 127, 128, 2 ** 14 - 1, 2 ** 14, 2 ** 21 - 1, 2 ** 21, 2 ** 31 - 1)
+UUID = uuid.UUID('12345678-9abc-def0-1234-56789abcdef0')
+
+
+def values_of(schema, number: int, flag: bool = True) -> dict:
+    samples = {int: number, bool: flag, uuid.UUID: UUID}
+    return {field: samples[kind] for field, kind in schema.fields.items()}
+
+
+def unpack(data: str):
+    schema = find_schema(data)
+    assert schema is not None
+    return schema.unpack(data[len(schema.prefix):])
+
+
+@pytest.mark.parametrize('schema', SCHEMAS, ids=lambda schema: schema.name)
+@pytest.mark.parametrize('number', BOUNDARY_INTS)
+def test_round_trip(schema, number):
+    for flag in (False, True):
+        values = values_of(schema, number, flag)
+        data = schema.pack(**values)
+
+        assert len(data) <= MAX_CALLBACK_DATA
+        assert data.startswith(schema.prefix)
+        assert unpack(data)._asdict() == values
+        assert callback_decoder(schema.prefix)(data[len(schema.prefix):]) == unpack(data)
+
+
+def test_uuid_may_be_given_as_string():
+    assert ViewWishlist.pack(str(UUID)) == ViewWishlist.pack(UUID)
+    assert unpack(ViewWishlist.pack(str(UUID))).access_uuid == UUID
+
+
+def test_defaults_may_be_omitted():
+    assert NextItem.pack(12, 3) == NextItem.pack(12, 3, 0, False, 0)
+    assert unpack(NextItem.pack(12, 3)) == (12, 3, 0, False, 0)
+
+
+def test_data_longer_than_telegram_allows_is_rejected():
+    big = 2 ** 63
+    with pytest.raises(ValueError, match=f'{MAX_CALLBACK_DATA}'):
+        ReserveItem.pack(big, big, big, big, True, big)
+
+
+def test_invalid_values_are_rejected():
+    with pytest.raises(ValueError):
+        NextItem.pack(-1, 1)
+    with pytest.raises(ValueError):
+        ViewWishlist.pack('not-a-uuid')
+
+
+@pytest.mark.parametrize('schema', SCHEMAS, ids=lambda schema: schema.name)
+def test_truncated_and_extended_payloads_are_rejected(schema):
+    payload = schema.pack(**values_of(schema, 2 ** 21))[len(schema.prefix):]
+
+    for end in range(len(payload)):
+        with pytest.raises(ValueError):
+            schema.unpack(payload[:end])
+    for extra in ('A', 'AA', 'AAA', 'AAAA'):
+        with pytest.raises(ValueError):
+            schema.unpack(payload + extra)
+
+
+@pytest.mark.parametrize('payload', [
+    'DA=',  # padding
+    'D A',  # not base64
+    'D',  # impossible length
+    'DB',  # padding bits set: decodes to the same byte as 'DA'
+    '+AE',  # standard alphabet instead of the url-safe '-AE'
+])
+def test_malformed_payloads_are_rejected(payload):
+    assert EditItem.unpack('DA') == (12,)
+    assert EditItem.unpack('-AE') == (248,)
+    with pytest.raises(ValueError):
+        EditItem.unpack(payload)
+
+
+def test_non_canonical_values_are_rejected():
+    # 12 as a two-byte varint
+    with pytest.raises(ValueError, match='Overlong'):
+        NextItem.unpack('jAAD')
+    # only_unreserved = 2
+    with pytest.raises(ValueError, match='bool'):
+        NextItem.unpack('DAMAAgA')
+
+
+@pytest.mark.parametrize('prefix, rest, expected', [
+    ('next_item_', '12_3', (12, 3, 0, False, 0)),
+    ('next_item_', '12_3_1_1_500', (12, 3, 1, True, 500)),
+    ('approve_sub_', '7_12', (7, 12)),
+    ('view_wishlist_', str(UUID), (UUID,)),
+])
+def test_legacy_data_is_parsed(prefix, rest, expected):
+    assert callback_decoder(prefix)(rest) == expected
+
+
+@pytest.mark.parametrize('rest', ['', '12', '12_3_1_1_500_9', '12_x', '-12_3', '12_3_0_2', '１２_3', ' 12_3'])
+def test_malformed_legacy_data_is_rejected(rest):
+    with pytest.raises(ValueError):
+        NextItem.unpack_legacy(rest)
+
@@ -0,0 +1,77 @@
+import itertools
+
+import pytest
+
+from database import models
+from database.models import Item, PriorityLevel
+from database.requests import get_or_create_user, create_or_update_wishlist, create_or_update_item, reserve_item, \
+    get_carousel_item, get_item_position, ItemOrder
+
+pytestmark = pytest.mark.anyio
+
+OWNER, VIEWER = 1, 2
+# (price, priority, reserved): equal prices, equal priorities and missing prices, so every
+# ordering has ties that only the id breaks
+ITEMS = [
+    (30.0, PriorityLevel.LOW, False),
+    (None, PriorityLevel.HIGH, True),
+    (10.0, PriorityLevel.MEDIUM, False),
+    (30.0, PriorityLevel.HIGH, False),
+    (None, PriorityLevel.MEDIUM, False),
+    (10.0, PriorityLevel.HIGH, True),
+    (20.0, PriorityLevel.LOW, False),
+    (30.0, PriorityLevel.MEDIUM, True),
+]
+VIEWS = list(itertools.product(ItemOrder, (False, True), (None, 10, 30)))
+
+
+@pytest.fixture
+async def wishlist(db) -> tuple[int, list[int]]:
+    """Id of the wishlist and the ids of ITEMS"""
+    async with models.async_session() as session:
+        await get_or_create_user(session, OWNER)
+        viewer = await get_or_create_user(session, VIEWER)
+        wishlist = await create_or_update_wishlist(session, user_id=OWNER, title='Birthday', is_private=False)
+        item_ids = []
+        for n, (price, priority, reserved) in enumerate(ITEMS):
+            item = await create_or_update_item(session, wishlist_id=wishlist.id, name=f'Item {n}', price=price,
+                                               priority=priority)
+            item_ids.append(item.id)
+            if reserved:
+                assert await reserve_item(session, viewer.id, wishlist.id, item.id)
+        await session.commit()
+        return wishlist.id, item_ids
+
+
+async def carousel(session, wishlist_id: int, order, only_unreserved, max_price) -> list[int]:
+    """Item ids of the view in carousel order, read position by position"""
+    ids = []
+    while True:
+        item = await get_carousel_item(session, wishlist_id, len(ids) + 1, VIEWER, order, only_unreserved, max_price)
+        if item is None:
+            return ids
+        ids.append(item.item.id)
+
+
+@pytest.mark.parametrize('order, only_unreserved, max_price', VIEWS)
+async def test_position_matches_the_carousel(wishlist, order, only_unreserved, max_price):
+    wishlist_id, item_ids = wishlist
+    async with models.async_session() as session:
+        ids = await carousel(session, wishlist_id, order, only_unreserved, max_price)
+        assert ids
+
+        for item_id in item_ids:
+            item = Item(id=item_id, wishlist_id=wishlist_id)
+            expected = ids.index(item_id) + 1 if item_id in ids else None
+            assert await get_item_position(session, item, order, only_unreserved, max_price) == expected
+
+
+async def test_orderings_differ(wishlist):
+    wishlist_id, item_ids = wishlist
+    async with models.async_session() as session:
+        views = {order: await carousel(session, wishlist_id, order, False, None) for order in ItemOrder}
+
+    assert views[ItemOrder.ADDED] == item_ids
+    assert len(set(map(tuple, views.values()))) == len(ItemOrder)
+    # Without a price last, ties by id
+    assert views[ItemOrder.PRICE] == [item_ids[n] for n in (2, 5, 6, 0, 3, 7, 1, 4)]
@@ -0,0 +1,72 @@
+import pytest
+from aiogram import Bot
+from sqlalchemy import select
+
+from tests.fakes import FakeSession
+from database import models
+from database.models import User
+from database.requests import get_or_create_user
+from middlewares.database import DatabaseMiddleware
+
+pytestmark = pytest.mark.anyio
+
+
+class ProbeSession(FakeSession):
+    """Records which users another connection can see at the time of each API call"""
+
+    def __init__(self):
+        super().__init__()
+        self.visible: list[list[int]] = []
+
+    async def make_request(self, bot, method, timeout=None):
+        async with models.async_session() as other:
+            self.visible.append(list(await other.scalars(select(User.telegram_id))))
+        return await super().make_request(bot, method, timeout)
+
+
+@pytest.fixture
+def bot():
+    return Bot(token='42:TEST', session=ProbeSession())
+
+
+async def committed_users() -> list[int]:
+    async with models.async_session() as session:
+        return list(await session.scalars(select(User.telegram_id)))
+
+
+async def test_update_is_committed_as_one_transaction(db, bot):
+    async def handler(event, data):
+        await get_or_create_user(data['session'], 7)
+        await bot.send_message(7, 'hello')
+        await get_or_create_user(data['session'], 8)
+
+    await DatabaseMiddleware(models.async_session)(handler, None, {})
+
+    # Nothing is committed behind the handler's back while it talks to Telegram
+    assert bot.session.visible == [[]]
+    assert await committed_users() == [7, 8]
+
+
+async def test_error_after_an_api_call_rolls_back_the_whole_update(db, bot):
+    async def handler(event, data):
+        await get_or_create_user(data['session'], 7)
+        await bot.send_message(7, 'hello')
+        await get_or_create_user(data['session'], 8)
+        raise RuntimeError
+
+    with pytest.raises(RuntimeError):
+        await DatabaseMiddleware(models.async_session)(handler, None, {})
+
+    assert await committed_users() == []
+
+
+async def test_handler_commits_its_writes_before_calling_the_api(db, bot):
+    async def handler(event, data):
+        await get_or_create_user(data['session'], 7)
+        await data['session'].commit()
+        await bot.send_message(7, 'hello')
+
+    await DatabaseMiddleware(models.async_session)(handler, None, {})
+
+    assert bot.session.visible == [[7]]
+    assert await committed_users() == [7]
@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+from aiogram import Bot, Dispatcher
+from aiogram.methods import AnswerCallbackQuery
+
+from tests.fakes import FakeSession, RecordingSession
+from middlewares.executor import OrderedExecutorMiddleware, BackpressureRequestHandler
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeRequest:
+    headers: dict[str, str] = {}
+
+    def __init__(self, update_id: int):
+        self.update = {
+            'update_id': update_id,
+            'message': {
+                'message_id': update_id,
+                'date': 0,
+                'chat': {'id': update_id, 'type': 'private'},
+                'from': {'id': update_id, 'is_bot': False, 'first_name': 'user'},
+                'text': 'hello',
+            },
+        }
+
+    async def json(self, loads=None):
+        return self.update
+
+
+async def test_burst_does_not_overshoot_max_pending():
+    executor = OrderedExecutorMiddleware(max_concurrency=10, max_pending=2)
+    release = asyncio.Event()
+    seen_pending = []
+
+    dp = Dispatcher()
+    dp.update.outer_middleware(executor)
+
+    @dp.message()
+    async def handler(message):
+        seen_pending.append(executor.pending)
+        await release.wait()
+
+    bot = Bot('42:TEST', session=FakeSession())
+    webhook = BackpressureRequestHandler(dispatcher=dp, bot=bot, handle_in_background=True, executor=executor)
+    requests = [asyncio.create_task(webhook.handle(FakeRequest(n))) for n in range(1, 6)]
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+    # Two updates hold the slots, the other three requests are not answered yet
+    assert executor.pending == 2
+    assert sum(request.done() for request in requests) == 2
+
+    release.set()
+    await asyncio.gather(*requests)
+    await webhook.drain()
+
+    assert len(seen_pending) == 5
+    assert max(seen_pending) <= 2
+    assert executor.pending == 0
+    assert executor.stats()['processed'] == 5
+
+
+async def test_one_user_cannot_queue_more_than_max_user_pending(updates):
+    executor = OrderedExecutorMiddleware(max_concurrency=10, max_pending=100, max_user_pending=2)
+    release = asyncio.Event()
+    handled = []
+
+    dp = Dispatcher()
+    dp.update.outer_middleware(executor)
+
+    @dp.callback_query()
+    async def handler(callback):
+        handled.append(callback.from_user.id)
+        await release.wait()
+
+    bot = Bot('42:TEST', session=RecordingSession())
+    feeds = [asyncio.create_task(dp.feed_update(bot, updates.callback(7, 'help_button'))) for _ in range(5)]
+    feeds.append(asyncio.create_task(dp.feed_update(bot, updates.callback(8, 'help_button'))))
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+    # User 7 holds two slots, the other three presses are dropped and answered; user 8 isn't affected
+    assert executor.stats()['dropped'] == 3
+    assert len(bot.session.sent(AnswerCallbackQuery)) == 3
+    assert executor.stats()['max_user_depth'] == 2
+
+    release.set()
+    await asyncio.gather(*feeds)
+
+    assert sorted(handled) == [7, 7, 8]
+    assert executor.pending == 0
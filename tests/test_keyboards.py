@@ -0,0 +1,42 @@
+import uuid
+
+import pytest
+
+from keyboards.cache import keyboard_cache, FrozenInlineKeyboardMarkup
+from keyboards.callback_data import ViewWishlist
+from keyboards.keyboard_utils import create_inline_kb, create_static_inline_kb
+from lexicon.lexicon_en import LEXICON_EN
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    keyboard_cache.clear()
+    yield
+    keyboard_cache.clear()
+
+
+def test_static_keyboards_are_cached_and_frozen():
+    first = create_static_inline_kb(1, LEXICON_EN, 'btn_my_wishlists', start_message='back_button')
+    second = create_static_inline_kb(1, LEXICON_EN, 'btn_my_wishlists', start_message='back_button')
+
+    assert first is second
+    assert isinstance(first, FrozenInlineKeyboardMarkup)
+    assert keyboard_cache.stats()['size'] == 1
+
+
+def test_dynamic_keyboards_are_not_cached():
+    data = [ViewWishlist.pack(uuid.uuid4()) for _ in range(3)]
+    markups = [create_inline_kb(1, LEXICON_EN, **{packed: 'view_wishlist'}, start_message='back_button')
+               for packed in data]
+
+    assert [markup.inline_keyboard[0][0].callback_data for markup in markups] == data
+    assert keyboard_cache.stats()['size'] == 0
+    # Not shared, so a handler may change it
+    markups[0].inline_keyboard[0][0].text = 'changed'
+
+
+def test_both_build_the_same_layout():
+    args = (2, LEXICON_EN, 'btn_my_wishlists', 'friends_wishlist_buttons')
+    kwargs = {'help_button': 'help_button', 'start_message': 'back_button'}
+
+    assert create_inline_kb(*args, **kwargs).model_dump() == create_static_inline_kb(*args, **kwargs).model_dump()
@@ -0,0 +1,127 @@
+import asyncio
+import json
+import logging
+import queue
+
+import pytest
+from aiogram import Bot, Dispatcher
+
+from config.log import JsonFormatter, PlainFormatter, DroppingQueueHandler
+from external_services.metrics import metrics
+from middlewares.logging import LoggerMiddleware
+from tests.fakes import FakeSession
+
+pytestmark = pytest.mark.anyio
+
+SLOW_MS = 20.0
+
+
+def dispatcher_with(middleware: LoggerMiddleware) -> Dispatcher:
+    dp = Dispatcher()
+    dp.update.middleware(middleware)
+
+    @dp.message(lambda message: message.text == 'fast')
+    async def fast(message):
+        pass
+
+    @dp.message(lambda message: message.text == 'slow')
+    async def slow(message):
+        await asyncio.sleep(SLOW_MS * 2 / 1000)
+
+    @dp.message(lambda message: message.text == 'fail')
+    async def fail(message):
+        raise RuntimeError('boom')
+
+    return dp
+
+
+async def feed(dp: Dispatcher, updates, text: str) -> None:
+    bot = Bot('42:TEST', session=FakeSession())
+    try:
+        await dp.feed_update(bot, updates.message(7, text))
+    except RuntimeError:
+        pass
+
+
+def logged(caplog) -> list[logging.LogRecord]:
+    return [record for record in caplog.records if record.name == 'update_logger']
+
+
+@pytest.fixture(autouse=True)
+def capture(caplog):
+    caplog.set_level(logging.INFO, logger='update_logger')
+
+
+async def test_fast_successful_updates_are_sampled(updates, caplog):
+    draws = iter([0.05, 0.5, 0.09, 0.95])
+    dp = dispatcher_with(LoggerMiddleware(sample_rate=0.1, slow_ms=SLOW_MS, sample=lambda: next(draws)))
+
+    for _ in range(4):
+        await feed(dp, updates, 'fast')
+
+    assert [record.getMessage() for record in logged(caplog)] == ['Update handled', 'Update handled']
+
+
+@pytest.mark.parametrize('text, message', [('slow', 'Slow update'), ('fail', 'Update failed')])
+async def test_slow_and_failed_updates_are_always_logged(updates, caplog, text, message):
+    dp = dispatcher_with(LoggerMiddleware(sample_rate=0.0, slow_ms=SLOW_MS, sample=lambda: 1.0))
+
+    for _ in range(3):
+        await feed(dp, updates, text)
+
+    records = logged(caplog)
+    assert [record.getMessage() for record in records] == [message] * 3
+    assert all(record.levelno == logging.WARNING for record in records)
+    assert all(record.fields['message_text'] == text for record in records)
+
+
+async def test_failed_update_records_the_error(updates, caplog):
+    dp = dispatcher_with(LoggerMiddleware(sample_rate=0.0, slow_ms=SLOW_MS))
+
+    await feed(dp, updates, 'fail')
+
+    record, = logged(caplog)
+    assert record.fields['error'] == repr(RuntimeError('boom'))
+    assert record.fields['handled'] is False
+
+
+def record_with(fields: dict, msg: str = 'Update handled') -> logging.LogRecord:
+    record = logging.LogRecord('update_logger', logging.INFO, __file__, 1, msg, None, None)
+    record.fields = fields
+    return record
+
+
+def test_json_formatter_caps_long_fields():
+    formatter = JsonFormatter(max_field_length=10)
+
+    payload = json.loads(formatter.format(record_with({'message_text': 'x' * 100, 'user_id': 7}, msg='m' * 100)))
+
+    assert payload['message_text'] == 'x' * 10 + '…'
+    assert payload['user_id'] == 7
+    # The message itself gets a larger allowance
+    assert payload['msg'] == 'm' * 40 + '…'
+
+
+def test_plain_formatter_caps_long_fields():
+    formatter = PlainFormatter(max_field_length=10)
+
+    line = formatter.format(record_with({'message_text': 'x' * 100, 'chat_id': 7}))
+
+    assert line.endswith(f"message_text={'x' * 10 + '…'!r} chat_id=7")
+
+
+def test_full_queue_drops_records_instead_of_blocking():
+    handler = DroppingQueueHandler(queue.Queue(2))
+
+    for _ in range(5):
+        handler.handle(record_with({}))
+
+    assert handler.queue.qsize() == 2
+    assert handler.dropped == 3
+
+
+def test_dropped_records_are_exported_as_a_counter(dispatcher):
+    lines = metrics.render().splitlines()
+
+    assert '# TYPE log_records_dropped_total counter' in lines
+    assert 'log_records_dropped_total 0' in lines
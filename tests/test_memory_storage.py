@@ -0,0 +1,91 @@
+import pytest
+from aiogram.fsm.storage.base import StorageKey
+
+from states.storage import BoundedMemoryStorage
+
+pytestmark = pytest.mark.anyio
+
+STATE_TTL = 600
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+
+def key(user_id: int) -> StorageKey:
+    return StorageKey(bot_id=42, chat_id=user_id, user_id=user_id)
+
+
+@pytest.fixture
+def clock() -> FakeClock:
+    return FakeClock()
+
+
+@pytest.fixture
+def storage(clock) -> BoundedMemoryStorage:
+    return BoundedMemoryStorage(state_ttl=STATE_TTL, max_states=3, clock=clock)
+
+
+async def test_state_expires_after_ttl_without_access(storage, clock):
+    await storage.set_state(key(1), 'form:name')
+
+    clock.advance(STATE_TTL - 1)
+    assert await storage.get_state(key(1)) == 'form:name'
+
+    # The read renewed the TTL
+    clock.advance(STATE_TTL - 1)
+    assert await storage.get_state(key(1)) == 'form:name'
+
+    clock.advance(STATE_TTL + 1)
+    assert await storage.get_state(key(1)) is None
+    assert await storage.get_data(key(1)) == {}
+    assert storage.stats() == {'size': 0, 'bytes': 0, 'evicted': 1}
+
+
+async def test_expired_states_are_dropped_on_the_next_write(storage, clock):
+    await storage.set_state(key(1), 'form:name')
+    await storage.set_state(key(2), 'form:name')
+    clock.advance(STATE_TTL + 1)
+
+    await storage.set_state(key(3), 'form:name')
+
+    assert storage.stats()['size'] == 1
+    assert storage.stats()['evicted'] == 2
+
+
+async def test_least_recently_used_state_is_evicted_at_max_states(storage):
+    for user_id in (1, 2, 3):
+        await storage.set_state(key(user_id), f'state:{user_id}')
+    # 1 is used again, so 2 is now the least recently used
+    await storage.get_data(key(1))
+
+    await storage.set_state(key(4), 'state:4')
+
+    assert [await storage.get_state(key(user_id)) for user_id in (1, 2, 3, 4)] == \
+        ['state:1', None, 'state:3', 'state:4']
+    assert storage.stats()['size'] == 3
+    assert storage.stats()['evicted'] == 1
+
+
+async def test_stats_track_size_and_bytes(storage):
+    assert storage.stats() == {'size': 0, 'bytes': 0, 'evicted': 0}
+
+    await storage.set_data(key(1), {'name': 'Book'})
+    small = storage.stats()
+    await storage.set_data(key(2), {'name': 'Book', 'description': 'x' * 1000})
+    large = storage.stats()
+
+    assert small['size'] == 1 and small['bytes'] > 0
+    assert large['size'] == 2 and large['bytes'] - small['bytes'] > 1000
+
+    # A key without state and data is not kept
+    await storage.set_data(key(2), {})
+    await storage.set_data(key(1), {})
+    assert storage.stats() == {'size': 0, 'bytes': 0, 'evicted': 0}
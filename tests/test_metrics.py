@@ -0,0 +1,44 @@
+from external_services.metrics import Histogram, MetricsRegistry, _format_labels, metrics
+from keyboards.callback_data import NextItem
+from middlewares.metrics import callback_prefix, OTHER_CALLBACK
+
+
+def test_label_values_are_escaped():
+    assert _format_labels(('handler', 'prefix'), ('a\\b', 'say "hi"\nbye')) == \
+        '{handler="a\\\\b",prefix="say \\"hi\\"\\nbye"}'
+
+
+def test_histogram_renders_escaped_labels():
+    histogram = Histogram('test_seconds', 'Test', labels=('prefix',), buckets=(1.0,))
+    histogram.observe(0.5, 'x"y')
+
+    lines = histogram.render()
+
+    assert 'test_seconds_bucket{prefix="x\\"y",le="1.0"} 1' in lines
+    assert 'test_seconds_count{prefix="x\\"y"} 1' in lines
+
+
+def test_callback_counter_renders_as_counter():
+    registry = MetricsRegistry()
+    registry.counter('test_total', 'Test', lambda: 3)
+
+    assert registry.render().splitlines()[-2:] == ['# TYPE test_total counter', 'test_total 3']
+
+
+def test_user_cache_lookups_are_exported_as_counters(dispatcher):
+    lines = metrics.render().splitlines()
+
+    assert '# TYPE user_cache_hits_total counter' in lines
+    assert '# TYPE user_cache_misses_total counter' in lines
+
+
+def test_callback_prefix_of_schema_data_is_the_schema_name():
+    assert callback_prefix(NextItem.pack(wishlist_id=12, position=3)) == NextItem.name
+
+
+def test_callback_prefix_of_other_data_is_fixed():
+    assert callback_prefix('help_button') == OTHER_CALLBACK
+    assert callback_prefix('next_item_12_3') == OTHER_CALLBACK
+    assert callback_prefix('anything "the client\nsends"') == OTHER_CALLBACK
+    assert callback_prefix('zz:1') == OTHER_CALLBACK
+    assert callback_prefix(None) == ''
@@ -0,0 +1,179 @@
+import pytest
+from aiogram import Router
+
+from database import models
+from database import requests as rq
+from database.requests import ItemOrder
+from handlers import user, items_forms
+from keyboards.callback_data import ViewWishlist, NextItem, PrevItem, ItemView, AddItem, EditItem, ReserveItem, \
+    UnreserveItem, Subscribe, Unsubscribe, ApproveSubscription, RejectSubscription, DeleteWishlist
+from middlewares.metrics import QUERY_BUDGETS
+from tests.fakes import SeededWishlist, seed
+
+pytestmark = pytest.mark.anyio
+
+ITEMS = 5
+
+VIEWER = 2_000_000
+
+# Handlers every test below replays; test_every_handler_is_budgeted_and_replayed checks
+# that together they cover handlers/user.py and handlers/items_forms.py
+START = ('process_start_message', 'process_help_button', 'process_help_command')
+LISTS = ('show_my_wishlist', 'process_friends_wishlist_buttons', 'delete_wishlist')
+SUBSCRIPTIONS = ('subscribe_to_wishlist', 'unsubscribe_from_wishlist', 'approve_subscription', 'reject_subscription')
+CAROUSEL = ('view_wishlist', 'next_item', 'prev_item', 'switch_item_view')
+RESERVATIONS = ('reserve_gift', 'unreserve_gift', 'already_reserved')
+ITEM_FORM = (
+    'start_add_item', 'start_edit_item', 'start_editing_item_field', 'set_item_priority', 'process_item_name',
+    'process_item_description', 'process_item_link', 'process_item_price', 'process_item_photo',
+    'remove_item_photo', 'confirm_item', 'cancel_item_creation'
+)
+
+
+@pytest.fixture
+async def wishlists(db) -> list[SeededWishlist]:
+    return await seed(2, ITEMS)
+
+
+@pytest.fixture
+async def private_wishlist(wishlists) -> SeededWishlist:
+    """A private wishlist of the first owner, without items"""
+    owner = wishlists[0].owner_telegram_id
+    async with models.async_session() as session:
+        wishlist = await rq.create_or_update_wishlist(session, user_id=owner, title='Private', is_private=True)
+        await session.commit()
+    return SeededWishlist(wishlist.id, str(wishlist.access_uuid), owner, [])
+
+
+async def user_id(telegram_id: int) -> int:
+    async with models.async_session() as session:
+        return (await rq.get_user_identity(session, telegram_id)).id
+
+
+async def replay(dispatcher, bot, updates) -> None:
+    for update in updates:
+        await dispatcher.feed_update(bot, update)
+
+
+def assert_within_budgets(handler_queries: dict[str, list[int]], handlers: tuple[str, ...]) -> None:
+    for name in handlers:
+        assert handler_queries[name], f'{name} was not called'
+        assert max(handler_queries[name]) <= QUERY_BUDGETS[name], f'{name}: {handler_queries[name]}'
+
+
+def handler_names(router: Router) -> set[str]:
+    return {handler.callback.__name__ for observer in router.observers.values() for handler in observer.handlers}
+
+
+def test_every_handler_is_budgeted_and_replayed():
+    handlers = handler_names(user.router) | handler_names(items_forms.router)
+    replayed = {*START, *LISTS, *SUBSCRIPTIONS, *CAROUSEL, *RESERVATIONS, *ITEM_FORM}
+
+    assert handlers - QUERY_BUDGETS.keys() == set(), 'handlers without a query budget'
+    assert handlers - replayed == set(), 'handlers no test replays'
+
+
+async def test_start(dispatcher, bot, updates, wishlists, handler_queries):
+    await replay(dispatcher, bot, [
+        updates.message(VIEWER, '/start'),
+        updates.message(VIEWER + 1, f'/start {wishlists[0].access_uuid}'),
+        updates.message(wishlists[0].owner_telegram_id, f'/start {wishlists[0].access_uuid}'),
+        updates.callback(VIEWER, 'help_button'),
+        updates.callback(VIEWER, 'start_message'),
+        updates.message(VIEWER, '/help'),
+    ])
+
+    assert_within_budgets(handler_queries, START)
+    assert len(handler_queries['process_start_message']) == 4
+
+
+async def test_lists(dispatcher, bot, updates, wishlists, handler_queries):
+    owner = wishlists[0].owner_telegram_id
+    await replay(dispatcher, bot, [
+        updates.callback(VIEWER, Subscribe.pack(wishlists[0].id)),
+        updates.callback(VIEWER, Subscribe.pack(wishlists[1].id)),
+        updates.callback(owner, 'btn_my_wishlists'),
+        updates.callback(VIEWER, 'friends_wishlist_buttons'),
+        updates.callback(owner, DeleteWishlist.pack(wishlists[0].id)),
+        # Not the owner: access denied
+        updates.callback(VIEWER, DeleteWishlist.pack(wishlists[1].id)),
+        updates.callback(owner, 'btn_my_wishlists'),
+    ])
+
+    assert_within_budgets(handler_queries, LISTS)
+
+
+async def test_subscriptions(dispatcher, bot, updates, wishlists, private_wishlist, handler_queries):
+    approved, rejected = VIEWER + 1, VIEWER + 2
+    await replay(dispatcher, bot, [
+        updates.callback(VIEWER, Subscribe.pack(wishlists[0].id)),
+        # Subscribed already
+        updates.callback(VIEWER, Subscribe.pack(wishlists[0].id)),
+        updates.callback(VIEWER, Unsubscribe.pack(wishlists[0].id)),
+        updates.callback(approved, Subscribe.pack(private_wishlist.id)),
+        updates.callback(rejected, Subscribe.pack(private_wishlist.id)),
+    ])
+    owner = private_wishlist.owner_telegram_id
+    await replay(dispatcher, bot, [
+        updates.callback(owner, ApproveSubscription.pack(await user_id(approved), private_wishlist.id)),
+        updates.callback(owner, RejectSubscription.pack(await user_id(rejected), private_wishlist.id)),
+    ])
+
+    assert_within_budgets(handler_queries, SUBSCRIPTIONS)
+    assert len(handler_queries['subscribe_to_wishlist']) == 4
+
+
+async def test_carousel(dispatcher, bot, updates, wishlists, handler_queries):
+    wishlist = wishlists[0]
+    await replay(dispatcher, bot, [
+        updates.callback(VIEWER, ViewWishlist.pack(wishlist.access_uuid)),
+        *(updates.callback(VIEWER, NextItem.pack(wishlist.id, position)) for position in range(1, ITEMS)),
+        *(updates.callback(VIEWER, PrevItem.pack(wishlist.id, position)) for position in range(ITEMS, 1, -1)),
+        updates.callback(VIEWER, ItemView.pack(wishlist.id, ItemOrder.PRIORITY)),
+    ])
+
+    assert_within_budgets(handler_queries, CAROUSEL)
+    assert len(handler_queries['next_item']) == ITEMS - 1
+
+
+async def test_reserve(dispatcher, bot, updates, wishlists, handler_queries):
+    wishlist = wishlists[0]
+    viewer = VIEWER + 1
+    await replay(dispatcher, bot, [
+        updates.callback(viewer, ReserveItem.pack(wishlist.id, wishlist.item_ids[0], 1)),
+        # Reserved already: the conditional update matches no row
+        updates.callback(viewer + 1, ReserveItem.pack(wishlist.id, wishlist.item_ids[0], 1)),
+        updates.callback(viewer + 1, 'already_reserved'),
+        updates.callback(viewer, UnreserveItem.pack(wishlist.id, wishlist.item_ids[0], 1)),
+    ])
+
+    assert_within_budgets(handler_queries, RESERVATIONS)
+
+
+async def test_item_form(dispatcher, bot, updates, wishlists, handler_queries):
+    wishlist = wishlists[0]
+    owner = wishlist.owner_telegram_id
+    await replay(dispatcher, bot, [
+        updates.callback(owner, AddItem.pack(wishlist.id)),
+        updates.callback(owner, 'edit_name'),
+        updates.message(owner, 'Gift'),
+        updates.callback(owner, 'edit_photo'),
+        updates.photo(owner, 'photo-1'),
+        updates.callback(owner, 'remove_photo'),
+        updates.callback(owner, 'confirm_item'),
+        updates.callback(owner, EditItem.pack(wishlist.item_ids[0])),
+        updates.callback(owner, 'edit_description'),
+        updates.message(owner, 'Hardcover'),
+        updates.callback(owner, 'edit_link'),
+        updates.message(owner, 'https://example.com/book'),
+        updates.callback(owner, 'edit_price'),
+        updates.message(owner, '25'),
+        updates.callback(owner, 'edit_priority'),
+        updates.callback(owner, 'set_priority_high'),
+        updates.callback(owner, 'confirm_item'),
+        updates.callback(owner, EditItem.pack(wishlist.item_ids[1])),
+        updates.callback(owner, 'cancel'),
+    ])
+
+    assert_within_budgets(handler_queries, ITEM_FORM)
+    assert len(handler_queries['confirm_item']) == 2
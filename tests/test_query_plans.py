@@ -0,0 +1,142 @@
+"""
+Runs EXPLAIN QUERY PLAN on every statement issued by database/requests.py and
+fails if one of them falls back to a full table scan.
+"""
+import inspect
+import re
+import uuid
+from datetime import datetime
+from typing import AsyncIterator, Awaitable, Callable
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import models
+from database import requests as rq
+from database.models import SubscriptionStatus, Item, Base, SEARCH_TABLES
+
+pytestmark = pytest.mark.anyio
+
+# Functions that read whole tables on purpose (admin statistics, newsletter, counters repair)
+ALLOWED_FULL_SCANS = {'get_stats', 'get_users_count', 'repair_wishlist_counters'}
+
+# A virtual table scan with an index string is a lookup: FTS5 encodes its MATCH and rowid
+# constraints there, a full scan of it has an empty one
+FULL_SCAN_RE = re.compile(r'\bSCAN (?!CONSTANT ROW)(\w+)\b(?! VIRTUAL TABLE INDEX \d+:\S)')
+# Scans of anything else (materialized CTEs and subqueries) read rows computed by the statement
+TABLES = set(Base.metadata.tables) | set(SEARCH_TABLES)
+
+
+async def _drain(chunks: AsyncIterator) -> None:
+    async for _ in chunks:
+        pass
+
+
+def _checks() -> dict[str, Callable[[AsyncSession], Awaitable]]:
+    """One representative call per function of database/requests.py"""
+    return {
+        'get_or_create_user': lambda s: rq.get_or_create_user(s, 1, 'owner'),
+        'get_user_identity': lambda s: rq.get_user_identity(s, 2, 'friend'),
+        'find_user_identity': lambda s: rq.find_user_identity(s, 2),
+        'get_wishlists': lambda s: rq.get_wishlists(s, 1),
+        'get_friends_wishlists': lambda s: rq.get_friends_wishlists(s, 2),
+        'create_or_update_wishlist': lambda s: rq.create_or_update_wishlist(
+            s, wishlist_id=1, user_id=1, title='Birthday', is_private=False),
+        'get_wishlist': lambda s: rq.get_wishlist(s, 1, with_owner=True, with_items=True, with_subscriptions=True),
+        'get_wishlist_by_uuid': lambda s: rq.get_wishlist(s, uuid.uuid4()),
+        'get_wishlist_view': lambda s: rq.get_wishlist_view(s, 1, 2),
+        'get_stats': lambda s: rq.get_stats(s),
+        'get_or_create_subscription': lambda s: rq.get_or_create_subscription(
+            s, 2, 1, 1, SubscriptionStatus.APPROVED),
+        'get_subscription': lambda s: rq.get_subscription(s, 2, 1),
+        'update_subscription_status': lambda s: rq.update_subscription_status(s, 1, SubscriptionStatus.APPROVED),
+        'get_subscription_with_details': lambda s: rq.get_subscription_with_details(s, 2, 1),
+        'get_subscribers_count': lambda s: rq.get_subscribers_count(s, 1),
+        'get_user_language': lambda s: rq.get_user_language(s, 1),
+        'create_or_update_item': lambda s: rq.create_or_update_item(s, item_id=1, wishlist_id=1, name='Book'),
+        'get_item': lambda s: rq.get_item(s, 1, with_wishlist=True),
+        'get_carousel_item': lambda s: rq.get_carousel_item(s, 1, 1, 2),
+        'get_carousel_item_priority': lambda s: rq.get_carousel_item(s, 1, 1, 2, rq.ItemOrder.PRIORITY),
+        'get_carousel_item_price_limit': lambda s: rq.get_carousel_item(s, 1, 1, 2, rq.ItemOrder.PRICE, max_price=100),
+        'get_carousel_item_unreserved': lambda s: rq.get_carousel_item(
+            s, 1, 1, 2, rq.ItemOrder.UNRESERVED, only_unreserved=True),
+        'get_item_position': lambda s: rq.get_item_position(s, Item(id=1, wishlist_id=1)),
+        'get_item_position_priority': lambda s: rq.get_item_position(s, Item(id=1, wishlist_id=1),
+                                                                     rq.ItemOrder.PRIORITY),
+        'get_item_position_price_limit': lambda s: rq.get_item_position(s, Item(id=1, wishlist_id=1),
+                                                                        rq.ItemOrder.PRICE, max_price=100),
+        'get_item_position_unreserved': lambda s: rq.get_item_position(s, Item(id=1, wishlist_id=1),
+                                                                       rq.ItemOrder.UNRESERVED, only_unreserved=True),
+        'reserve_item': lambda s: rq.reserve_item(s, 2, 1, 1),
+        'unreserve_item': lambda s: rq.unreserve_item(s, 2, 1, 1),
+        'search': lambda s: rq.search(s, 2, 'bo'),
+        'get_found_item': lambda s: rq.get_found_item(s, 1, 2),
+        'repair_wishlist_counters': lambda s: rq.repair_wishlist_counters(s),
+        'repair_wishlist_counters_one': lambda s: rq.repair_wishlist_counters(s, 1),
+        'get_users_count': lambda s: rq.get_users_count(s),
+        'get_users_count_filtered': lambda s: rq.get_users_count(s, language='en', active_since=datetime(2025, 1, 1)),
+        'iter_audience': lambda s: _drain(rq.iter_audience(s, chunk_size=1)),
+        'iter_audience_language': lambda s: _drain(rq.iter_audience(s, language='en')),
+        'iter_audience_active_since': lambda s: _drain(rq.iter_audience(s, active_since=datetime(2025, 1, 1))),
+        'create_broadcast': lambda s: rq.create_broadcast(
+            s, from_chat_id=1, message_id=1, status_chat_id=1, status_message_id=2, language='en', total=2),
+        'get_running_broadcasts': lambda s: rq.get_running_broadcasts(s),
+        'save_broadcast_progress': lambda s: rq.save_broadcast_progress(s, 1, last_user_id=2, success=2, failed=0),
+        'delete_subscription': lambda s: rq.delete_subscription(s, 1),
+        'delete_wishlist_db': lambda s: rq.delete_wishlist_db(s, 1),
+    }
+
+
+async def _seed(session: AsyncSession) -> None:
+    owner = await rq.get_or_create_user(session, 1, 'owner')
+    await rq.get_or_create_user(session, 2, 'friend')
+    wishlist = await rq.create_or_update_wishlist(session, user_id=owner.telegram_id, title='Birthday', is_private=False)
+    await rq.create_or_update_item(session, wishlist_id=wishlist.id, name='Book')
+    await rq.get_or_create_subscription(session, 2, wishlist.id, owner.id)
+    await session.commit()
+
+
+def _public_requests() -> set[str]:
+    return {
+        name for name, function in vars(rq).items()
+        if not name.startswith('_') and getattr(function, '__module__', None) == rq.__name__
+        and (inspect.iscoroutinefunction(function) or inspect.isasyncgenfunction(function))
+    }
+
+
+def test_every_request_has_a_check():
+    assert _public_requests() - set(_checks()) == set()
+
+
+@pytest.mark.parametrize('name', sorted(set(_checks()) - ALLOWED_FULL_SCANS))
+async def test_no_full_table_scans(db, name):
+    statements: list[tuple[str, tuple]] = []
+
+    @event.listens_for(db.sync_engine, 'before_cursor_execute')
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(('SELECT', 'WITH', 'UPDATE', 'DELETE')):
+            statements.append((statement, parameters))
+
+    async with models.async_session() as session:
+        await _seed(session)
+        rq.user_cache.clear()
+
+        statements.clear()
+        await _checks()[name](session)
+        await session.flush()
+        captured = list(statements)
+
+        connection = await session.connection()
+        problems = []
+        for statement, parameters in captured:
+            plan = await connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+            for row in plan:
+                detail = row[-1]
+                match = FULL_SCAN_RE.search(detail)
+                if match and match.group(1) in TABLES:
+                    problems.append(f"{detail}\n    {' '.join(statement.split())}")
+
+        await session.rollback()
+
+    assert not problems, '\n'.join(problems)
@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+from aiogram import Bot
+from aiogram.methods import AnswerCallbackQuery
+from sqlalchemy import select
+
+from database import models
+from database.models import Item, User
+from database.requests import get_or_create_user, create_or_update_wishlist, create_or_update_item, reserve_item, \
+    unreserve_item
+from keyboards.callback_data import ReserveItem, UnreserveItem
+from tests.fakes import FakeSession
+
+pytestmark = pytest.mark.anyio
+
+CONTENDERS = 8
+
+
+@pytest.fixture
+async def item(db) -> Item:
+    async with models.async_session() as session:
+        await get_or_create_user(session, 1)
+        wishlist = await create_or_update_wishlist(session, user_id=1, title='Birthday', is_private=False)
+        item = await create_or_update_item(session, wishlist_id=wishlist.id, name='Book')
+        await session.commit()
+    return item
+
+
+async def users(count: int) -> list[int]:
+    async with models.async_session() as session:
+        ids = [(await get_or_create_user(session, 100 + n)).id for n in range(count)]
+        await session.commit()
+    return ids
+
+
+async def reserve(user_id: int, item: Item) -> bool:
+    # A session, and so a connection, of its own, like concurrent updates
+    async with models.async_session() as session:
+        reserved = await reserve_item(session, user_id, item.wishlist_id, item.id)
+        await session.commit()
+        return reserved
+
+
+async def reserved_by(item: Item) -> int | None:
+    async with models.async_session() as session:
+        return await session.scalar(select(Item.reserved_by_id).where(Item.id == item.id))
+
+
+async def test_concurrent_reservations_have_one_winner(item):
+    user_ids = await users(CONTENDERS)
+
+    results = await asyncio.gather(*(reserve(user_id, item) for user_id in user_ids))
+
+    assert results.count(True) == 1
+    assert await reserved_by(item) == user_ids[results.index(True)]
+
+
+async def test_only_the_holder_can_unreserve(item):
+    holder, other = await users(2)
+    assert await reserve(holder, item)
+
+    async with models.async_session() as session:
+        assert not await unreserve_item(session, other, item.wishlist_id, item.id)
+        assert await unreserve_item(session, holder, item.wishlist_id, item.id)
+        await session.commit()
+
+    assert await reserved_by(item) is None
+    assert await reserve(other, item)
+
+
+class ProbeSession(FakeSession):
+    """Records who holds the item, as another connection sees it, when the callback is answered"""
+
+    def __init__(self, item_id: int):
+        super().__init__()
+        self.item_id = item_id
+        self.holders: list[int | None] = []
+
+    async def make_request(self, bot, method, timeout=None):
+        if isinstance(method, AnswerCallbackQuery):
+            async with models.async_session() as other:
+                self.holders.append(await other.scalar(select(Item.reserved_by_id).where(Item.id == self.item_id)))
+        return await super().make_request(bot, method, timeout)
+
+
+async def test_reservation_is_committed_before_the_callback_is_answered(dispatcher, updates, item):
+    bot = Bot(token='42:TEST', session=ProbeSession(item.id))
+    await dispatcher.feed_update(bot, updates.callback(200, ReserveItem.pack(item.wishlist_id, item.id, 1)))
+    await dispatcher.feed_update(bot, updates.callback(200, UnreserveItem.pack(item.wishlist_id, item.id, 1)))
+
+    async with models.async_session() as session:
+        holder = await session.scalar(select(User.id).where(User.telegram_id == 200))
+    assert bot.session.holders == [holder, None]
@@ -0,0 +1,85 @@
+import pytest
+from aiogram import Bot
+from aiogram.methods import AnswerCallbackQuery, AnswerInlineQuery
+from sqlalchemy import func, select
+
+from database import models
+from database.models import User, SubscriptionStatus
+from database.requests import get_or_create_user, create_or_update_wishlist, create_or_update_item, \
+    get_or_create_subscription, delete_wishlist_db, get_found_item
+from keyboards.callback_data import OpenItem
+from lexicon.lexicon_en import LEXICON_EN
+from tests.fakes import RecordingSession
+
+pytestmark = pytest.mark.anyio
+
+OWNER, SUBSCRIBER, PENDING, STRANGER = 10, 11, 12, 13
+
+
+@pytest.fixture
+def recording_bot() -> Bot:
+    return Bot(token='42:TEST', session=RecordingSession())
+
+
+@pytest.fixture
+async def users(db) -> dict[int, int]:
+    """Database ids by Telegram id; the wishlist of OWNER has one item, 'Book'"""
+    async with models.async_session() as session:
+        ids = {telegram_id: (await get_or_create_user(session, telegram_id)).id
+               for telegram_id in (OWNER, SUBSCRIBER, PENDING, STRANGER)}
+        wishlist = await create_or_update_wishlist(session, user_id=OWNER, title='Birthday', is_private=True)
+        await create_or_update_item(session, wishlist_id=wishlist.id, name='Book')
+        await get_or_create_subscription(session, ids[SUBSCRIBER], wishlist.id, ids[OWNER],
+                                         status=SubscriptionStatus.APPROVED)
+        await get_or_create_subscription(session, ids[PENDING], wishlist.id, ids[OWNER])
+        await session.commit()
+    return ids
+
+
+async def found_item_id(user_id: int) -> int | None:
+    async with models.async_session() as session:
+        item = await get_found_item(session, 1, user_id)
+        return item.id if item else None
+
+
+async def test_found_item_is_open_to_owner_and_approved_subscribers(users):
+    assert await found_item_id(users[OWNER]) == 1
+    assert await found_item_id(users[SUBSCRIBER]) == 1
+    assert await found_item_id(users[PENDING]) is None
+    assert await found_item_id(users[STRANGER]) is None
+
+
+async def test_found_item_of_deleted_wishlist_is_hidden(users):
+    async with models.async_session() as session:
+        await delete_wishlist_db(session, 1)
+        await session.commit()
+
+    assert await found_item_id(users[OWNER]) is None
+    assert await found_item_id(users[SUBSCRIBER]) is None
+
+
+@pytest.mark.parametrize('telegram_id, allowed', [(SUBSCRIBER, True), (STRANGER, False), (99, False)])
+async def test_open_found_item_checks_scope(dispatcher, recording_bot, updates, users, telegram_id, allowed):
+    await dispatcher.feed_update(recording_bot, updates.callback(telegram_id, OpenItem.pack(1)))
+
+    answer = recording_bot.session.sent(AnswerCallbackQuery)[0]
+    if allowed:
+        assert answer.text is None
+    else:
+        assert answer.text == LEXICON_EN['item_not_found'] and answer.show_alert
+
+
+async def test_inline_search_of_unknown_user_creates_nobody(dispatcher, recording_bot, updates, users):
+    await dispatcher.feed_update(recording_bot, updates.inline_query(99, 'Book'))
+
+    answer = recording_bot.session.sent(AnswerInlineQuery)[0]
+    assert answer.results == []
+    async with models.async_session() as session:
+        assert await session.scalar(select(func.count()).select_from(User)) == len(users)
+
+
+async def test_inline_search_finds_subscribed_items(dispatcher, recording_bot, updates, users):
+    await dispatcher.feed_update(recording_bot, updates.inline_query(SUBSCRIBER, 'Book'))
+
+    answer = recording_bot.session.sent(AnswerInlineQuery)[0]
+    assert [result.id for result in answer.results] == ['item_1']
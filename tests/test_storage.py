@@ -0,0 +1,71 @@
+from dataclasses import replace
+
+import pytest
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.redis import RedisStorage
+from fakeredis import FakeServer
+from fakeredis.aioredis import FakeRedis
+
+from handlers import user  # noqa: F401  handlers.user imports main, so it goes first
+import main
+from config.config import load_config
+
+pytestmark = pytest.mark.anyio
+
+STATE_TTL = 600
+
+
+class FakeConnectionPool:
+    """Stands in for redis.asyncio.ConnectionPool in main.create_storage"""
+    server = FakeServer()
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs):
+        return FakeRedis(server=cls.server, **kwargs).connection_pool
+
+
+@pytest.fixture
+async def storage(monkeypatch):
+    monkeypatch.setattr(main, 'ConnectionPool', FakeConnectionPool)
+    config = load_config()
+    config = replace(config, bot=replace(config.bot, use_redis=True),
+                     redis=replace(config.redis, key_prefix='test_bot'),
+                     fsm=replace(config.fsm, state_ttl=STATE_TTL))
+    storage = main.create_storage(config)
+    await storage.redis.flushall()
+    yield storage
+    await storage.close()
+
+
+async def test_redis_storage_is_used(storage):
+    assert isinstance(storage, RedisStorage)
+
+
+async def test_state_and_data_round_trip(storage):
+    key = StorageKey(bot_id=42, chat_id=7, user_id=7)
+
+    await storage.set_state(key, 'ItemForm:name')
+    await storage.set_data(key, {'wishlist_id': 3, 'item_msg': [7, 100]})
+
+    assert await storage.get_state(key) == 'ItemForm:name'
+    assert await storage.get_data(key) == {'wishlist_id': 3, 'item_msg': [7, 100]}
+
+    await storage.set_state(key, None)
+    await storage.set_data(key, {})
+    assert await storage.get_state(key) is None
+    assert await storage.get_data(key) == {}
+
+
+async def test_keys_have_prefix_destiny_and_ttl(storage):
+    key = StorageKey(bot_id=42, chat_id=7, user_id=8)
+
+    await storage.set_state(key, 'ItemForm:name')
+    await storage.set_data(key, {'wishlist_id': 3})
+
+    await storage.set_state(replace(key, destiny='search'), 'SearchForm:query')
+
+    # The prefix is per bot, so the bot id is not part of the key
+    keys = sorted(k.decode() for k in await storage.redis.keys('*'))
+    assert keys == ['test_bot:7:8:default:data', 'test_bot:7:8:default:state', 'test_bot:7:8:search:state']
+    for name in keys:
+        assert 0 < await storage.redis.ttl(name) <= STATE_TTL
@@ -0,0 +1,98 @@
+import asyncio
+
+import pytest
+from aiogram import Bot, Dispatcher
+from aiogram.methods import AnswerCallbackQuery, EditMessageMedia
+
+from keyboards.callback_data import NextItem
+from middlewares.throttling import NavigationThrottleMiddleware
+from tests.fakes import RecordingSession, seed
+
+pytestmark = pytest.mark.anyio
+
+WINDOW = 0.05
+USER = 7
+ITEMS = 6
+
+
+@pytest.fixture
+def throttle() -> NavigationThrottleMiddleware:
+    return NavigationThrottleMiddleware(window=WINDOW)
+
+
+@pytest.fixture
+def rendered(throttle) -> tuple[Dispatcher, list[str]]:
+    """Dispatcher whose navigation handler records the callback data it renders"""
+    dp = Dispatcher()
+    dp.update.outer_middleware(throttle)
+    positions = []
+
+    @dp.callback_query(NextItem.filter())
+    async def next_item(callback):
+        positions.append(callback.data)
+        await callback.answer()
+
+    return dp, positions
+
+
+@pytest.fixture
+def bot() -> Bot:
+    return Bot('42:TEST', session=RecordingSession())
+
+
+def press(updates, position: int, message_id: int):
+    return updates.callback(USER, NextItem.pack(1, position), message_id=message_id)
+
+
+async def test_burst_renders_only_the_final_position(rendered, throttle, bot, updates):
+    dp, positions = rendered
+    await dp.feed_update(bot, press(updates, 1, message_id=500))
+
+    # Within the window of the first press: 2, 3 and 4 are superseded by 5
+    await asyncio.gather(*(dp.feed_update(bot, press(updates, position, message_id=500))
+                           for position in range(2, 6)))
+
+    assert positions == [NextItem.pack(1, 1), NextItem.pack(1, 5)]
+    assert throttle.dropped == 3
+    # Every press is answered: the dropped ones by the middleware, the rendered ones by the handler
+    assert len(bot.session.sent(AnswerCallbackQuery)) == 5
+
+
+async def test_presses_on_other_messages_are_not_coalesced(rendered, throttle, bot, updates):
+    dp, positions = rendered
+
+    await asyncio.gather(*(dp.feed_update(bot, press(updates, 1, message_id=message_id))
+                           for message_id in (500, 501, 502)))
+
+    assert len(positions) == 3
+    assert throttle.dropped == 0
+
+
+async def test_press_after_the_window_is_rendered_right_away(rendered, throttle, bot, updates):
+    dp, positions = rendered
+    await dp.feed_update(bot, press(updates, 1, message_id=500))
+    await asyncio.sleep(WINDOW * 2)
+
+    await dp.feed_update(bot, press(updates, 2, message_id=500))
+
+    assert positions == [NextItem.pack(1, 1), NextItem.pack(1, 2)]
+    assert throttle.dropped == 0
+
+
+async def test_carousel_burst_edits_the_message_once_per_window(dispatcher, db, updates):
+    wishlist, = await seed(1, ITEMS)
+    bot = Bot('42:TEST', session=RecordingSession())
+    await dispatcher.feed_update(bot, updates.callback(USER, NextItem.pack(wishlist.id, 1), message_id=500))
+
+    burst = range(2, ITEMS)
+    await asyncio.gather(*(
+        dispatcher.feed_update(bot, updates.callback(USER, NextItem.pack(wishlist.id, position), message_id=500))
+        for position in burst
+    ))
+
+    edits = bot.session.sent(EditMessageMedia)
+    # The first press and the last one of the burst, which moves to the last item
+    assert len(edits) == 2
+    assert edits[-1].media.caption.endswith(f'{ITEMS}/{ITEMS}')
+    # Every superseded press is answered
+    assert len(bot.session.sent(AnswerCallbackQuery)) == len(burst) - 1
@@ -0,0 +1,84 @@
+import asyncio
+import json
+from dataclasses import replace
+from pathlib import Path
+
+import pytest
+from aiogram import Bot
+from aiogram.methods import AnswerCallbackQuery, SendMessage
+from aiohttp.test_utils import TestClient, TestServer
+
+from config.config import WebhookConfig, load_config
+from main import check_webhook_config, create_webhook_app
+from tests.fakes import RecordingSession
+
+pytestmark = pytest.mark.anyio
+
+# Updates as Telegram POSTs them: a /start message and a press of the help button
+UPDATES = json.loads((Path(__file__).parent / 'data' / 'webhook_updates.json').read_text())
+
+WEBHOOK = WebhookConfig(enabled=True, url='https://bot.example.com', path='/webhook', secret='s3cret_token-1')
+
+
+@pytest.fixture
+def recording_bot() -> Bot:
+    return Bot(token='42:TEST', session=RecordingSession())
+
+
+@pytest.fixture
+async def client(dispatcher, recording_bot, db):
+    async with TestClient(TestServer(create_webhook_app(dispatcher, recording_bot, WEBHOOK))) as client:
+        yield client
+
+
+async def drain(dispatcher) -> None:
+    """Waits for the updates the webhook handler scheduled in the background"""
+    executor = dispatcher['update_executor']
+    for _ in range(1000):
+        if executor.pending == 0:
+            return
+        await asyncio.sleep(0.01)
+    raise TimeoutError(executor.stats())
+
+
+async def post(client: TestClient, update: dict, secret: str | None):
+    headers = {'X-Telegram-Bot-Api-Secret-Token': secret} if secret is not None else {}
+    return await client.post(WEBHOOK.path, json=update, headers=headers)
+
+
+async def test_recorded_updates_are_handled(client, dispatcher, recording_bot):
+    for update in UPDATES:
+        response = await post(client, update, WEBHOOK.secret)
+        assert response.status == 200
+        await drain(dispatcher)
+
+    session = recording_bot.session
+    assert [method.chat_id for method in session.sent(SendMessage)] == [5550001]
+    assert [method.callback_query_id for method in session.sent(AnswerCallbackQuery)] == ['4378550934287310001']
+
+
+@pytest.mark.parametrize('secret', ['wrong', None])
+async def test_updates_without_the_secret_are_rejected(client, dispatcher, recording_bot, secret):
+    for update in UPDATES:
+        response = await post(client, update, secret)
+        assert response.status == 401
+    await drain(dispatcher)
+
+    assert recording_bot.session.methods == []
+
+
+@pytest.mark.parametrize('webhook', [
+    replace(WEBHOOK, url=''),
+    replace(WEBHOOK, url='http://bot.example.com'),
+    replace(WEBHOOK, secret=None),
+    replace(WEBHOOK, secret=''),
+    replace(WEBHOOK, secret='not allowed!'),
+    replace(WEBHOOK, workers=2),
+])
+def test_webhook_mode_refuses_incomplete_config(webhook):
+    with pytest.raises(ValueError):
+        check_webhook_config(replace(load_config(), webhook=webhook))
+
+
+def test_webhook_config_with_url_and_secret_is_accepted():
+    check_webhook_config(replace(load_config(), webhook=WEBHOOK))
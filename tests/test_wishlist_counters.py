@@ -0,0 +1,176 @@
+import pytest
+from sqlalchemy import select, update, delete
+
+from database import models
+from database import requests as rq
+from database.models import Item, Wishlist, SubscriptionStatus
+
+pytestmark = pytest.mark.anyio
+
+OWNER = 1
+
+
+@pytest.fixture
+async def wishlist(db) -> Wishlist:
+    async with models.async_session() as session:
+        wishlist = await rq.create_or_update_wishlist(session, user_id=OWNER, title='Birthday', is_private=True)
+        await session.commit()
+    return wishlist
+
+
+async def other_wishlist() -> int:
+    """A public wishlist of another owner"""
+    async with models.async_session() as session:
+        wishlist = await rq.create_or_update_wishlist(session, user_id=OWNER + 1, title='Other', is_private=False)
+        await session.commit()
+    return wishlist.id
+
+
+async def users(count: int) -> list[int]:
+    async with models.async_session() as session:
+        ids = [(await rq.get_or_create_user(session, 100 + n)).id for n in range(count)]
+        await session.commit()
+    return ids
+
+
+async def counters(wishlist_id: int) -> tuple[int, int, int]:
+    async with models.async_session() as session:
+        row = (await session.execute(
+            select(Wishlist.items_count, Wishlist.reserved_count, Wishlist.subscribers_count)
+            .where(Wishlist.id == wishlist_id)
+        )).one()
+    return tuple(row)
+
+
+async def assert_counters(wishlist_id: int, items: int, reserved: int, subscribers: int) -> None:
+    assert await counters(wishlist_id) == (items, reserved, subscribers)
+    # The maintained counters agree with a recount from items and subscriptions
+    async with models.async_session() as session:
+        assert await rq.repair_wishlist_counters(session, wishlist_id) == 0
+        await session.rollback()
+
+
+async def add_items(wishlist_id: int, count: int) -> list[int]:
+    async with models.async_session() as session:
+        ids = [(await rq.create_or_update_item(session, wishlist_id=wishlist_id, name=f'Item {n}')).id
+               for n in range(count)]
+        await session.commit()
+    return ids
+
+
+async def subscribe(subscriber_id: int, wishlist: Wishlist, status=SubscriptionStatus.PENDING) -> int:
+    async with models.async_session() as session:
+        subscription = await rq.get_or_create_subscription(
+            session, subscriber_id, wishlist.id, wishlist.owner_id, status)
+        await session.commit()
+    return subscription.id
+
+
+async def set_status(subscription_id: int, status: SubscriptionStatus) -> None:
+    async with models.async_session() as session:
+        await rq.update_subscription_status(session, subscription_id, status)
+        await session.commit()
+
+
+async def test_new_wishlist_has_zero_counters(wishlist):
+    await assert_counters(wishlist.id, items=0, reserved=0, subscribers=0)
+
+
+async def test_creating_items_counts_them_and_editing_does_not(wishlist):
+    item_ids = await add_items(wishlist.id, 3)
+    async with models.async_session() as session:
+        await rq.create_or_update_item(session, item_id=item_ids[0], wishlist_id=wishlist.id, name='Renamed')
+        await session.commit()
+
+    await assert_counters(wishlist.id, items=3, reserved=0, subscribers=0)
+
+
+async def test_approve_reject_and_delete_subscriptions(wishlist):
+    first, second, third = await users(3)
+    pending = await subscribe(first, wishlist)
+    rejected = await subscribe(second, wishlist)
+    approved = await subscribe(third, wishlist, SubscriptionStatus.APPROVED)
+    await assert_counters(wishlist.id, items=0, reserved=0, subscribers=1)
+
+    await set_status(pending, SubscriptionStatus.APPROVED)
+    await set_status(rejected, SubscriptionStatus.REJECTED)
+    await assert_counters(wishlist.id, items=0, reserved=0, subscribers=2)
+
+    # Approving twice doesn't count the subscriber twice
+    await set_status(pending, SubscriptionStatus.APPROVED)
+    await assert_counters(wishlist.id, items=0, reserved=0, subscribers=2)
+
+    await set_status(approved, SubscriptionStatus.REJECTED)
+    await assert_counters(wishlist.id, items=0, reserved=0, subscribers=1)
+
+    async with models.async_session() as session:
+        await rq.delete_subscription(session, rejected)
+        await rq.delete_subscription(session, pending)
+        await session.commit()
+    await assert_counters(wishlist.id, items=0, reserved=0, subscribers=0)
+
+
+async def test_reserve_and_unreserve(wishlist):
+    subscriber, other = await users(2)
+    await subscribe(subscriber, wishlist, SubscriptionStatus.APPROVED)
+    item_ids = await add_items(wishlist.id, 3)
+
+    async with models.async_session() as session:
+        assert await rq.reserve_item(session, subscriber, wishlist.id, item_ids[0])
+        assert await rq.reserve_item(session, subscriber, wishlist.id, item_ids[1])
+        # Already reserved, and a user the private wishlist isn't visible to: nothing changes
+        assert not await rq.reserve_item(session, subscriber, wishlist.id, item_ids[0])
+        assert not await rq.reserve_item(session, other, wishlist.id, item_ids[2])
+        await session.commit()
+    await assert_counters(wishlist.id, items=3, reserved=2, subscribers=1)
+
+    async with models.async_session() as session:
+        assert await rq.unreserve_item(session, subscriber, wishlist.id, item_ids[0])
+        # Not the holder, and not reserved
+        assert not await rq.unreserve_item(session, other, wishlist.id, item_ids[1])
+        assert not await rq.unreserve_item(session, subscriber, wishlist.id, item_ids[2])
+        await session.commit()
+    await assert_counters(wishlist.id, items=3, reserved=1, subscribers=1)
+
+
+async def test_rolled_back_writes_leave_counters_unchanged(wishlist):
+    async with models.async_session() as session:
+        await rq.create_or_update_item(session, wishlist_id=wishlist.id, name='Book')
+        await session.rollback()
+
+    await assert_counters(wishlist.id, items=0, reserved=0, subscribers=0)
+
+
+async def test_repair_fixes_drifted_counters(wishlist):
+    subscriber, = await users(1)
+    await subscribe(subscriber, wishlist, SubscriptionStatus.APPROVED)
+    item_ids = await add_items(wishlist.id, 3)
+    async with models.async_session() as session:
+        await rq.reserve_item(session, subscriber, wishlist.id, item_ids[0])
+        await session.commit()
+    untouched = await other_wishlist()
+
+    # Writes that bypass the request functions, e.g. manual fixes in the database
+    async with models.async_session() as session:
+        await session.execute(delete(Item).where(Item.id == item_ids[2]))
+        await session.execute(update(Wishlist).where(Wishlist.id == wishlist.id)
+                              .values(reserved_count=5, subscribers_count=0))
+        await session.commit()
+
+    async with models.async_session() as session:
+        assert await rq.repair_wishlist_counters(session) == 1
+        await session.commit()
+
+    await assert_counters(wishlist.id, items=2, reserved=1, subscribers=1)
+    await assert_counters(untouched, items=0, reserved=0, subscribers=0)
+
+
+async def test_repair_of_one_wishlist_leaves_the_others(wishlist):
+    other = await other_wishlist()
+    async with models.async_session() as session:
+        await session.execute(update(Wishlist).values(items_count=7))
+        assert await rq.repair_wishlist_counters(session, wishlist.id) == 1
+        await session.commit()
+
+    assert await counters(wishlist.id) == (0, 0, 0)
+    assert await counters(other) == (7, 0, 0)